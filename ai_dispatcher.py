@@ -7,6 +7,7 @@ from openai import OpenAI
 from dotenv import load_dotenv
 from typing import Dict, List, Optional, Tuple
 import numpy as np
+import pandas as pd
 import traceback
 
 from tools.asset_mapper import AssetMapper
@@ -28,6 +29,9 @@ class NumpyJSONEncoder(json.JSONEncoder):
             return float(obj)
         elif isinstance(obj, np.ndarray):
             return obj.tolist()
+        elif isinstance(obj, (pd.DataFrame, pd.Series)):
+            # Velas e indicadores completos del análisis (data["series"]): son para el gráfico, no para la IA
+            return None
         return super(NumpyJSONEncoder, self).default(obj)
 
 load_dotenv()
@@ -1,9 +1,10 @@
 import os
 import json
 import re
-from openai import OpenAI
+import asyncio
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from typing import Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 import numpy as np
 import traceback
 import pandas as pd
@@ -11,14 +12,29 @@ from datetime import datetime, timedelta
 
 from tools.onchain_tools import analyze_whale_activity
 from tools.asset_mapper import AssetMapper
-from tools.analysis_tools import advanced_technical_analysis, get_historical_data_extended
-from tools.information_tools import get_comprehensive_market_briefing_data, get_news, get_tweets, get_facebook_posts
-from tools.strategy_tools import generate_advanced_trading_strategy
+from tools.intent_router import IntentRouter
+from tools.analysis_tools import advanced_technical_analysis_async, get_historical_data_extended_async
+from tools.information_tools import (
+    get_comprehensive_market_briefing_data_async, get_news_async, get_tweets_async, get_facebook_posts_async
+)
+from tools.strategy_tools import generate_advanced_trading_strategy, CachedStrategy
 from tools.bybit_tools import get_top_traded, get_top_gainers
-from tools.general_web_query import handle_general_web_query, enrich_with_general_context
+from tools.general_web_query import handle_general_web_query_async, enrich_with_general_context_async
 from tools.ecosystem_tools import analyze_ecosystem
 from tools.yahoo_finance_tools import get_market_data_yf, get_multiple_indices_summary
-from tools.chart_tools import generate_candlestick_chart
+from tools.chart_tools import generate_chart_from_series_async, generate_timeframe_album_async
+from tools.grid_simulator import simulate_grid
+from tools.cache_tools import (
+    TieredCache, llm_cache_key, seconds_until_candle_close, seconds_until_news_refresh, news_window
+)
+from tools.async_tools import run_cpu, run_blocking
+from tools.prompt_compactor import compact_payload, get_prompt_size_stats
+from tools.model_hedging import LatencyTracker, hedged_race
+from tools.llm_metrics import llm_metrics, instrumented_completion, instrumented_stream
+from tools.prefetch import SpeculativePrefetcher
+from tools.llm_scheduler import llm_scheduler, set_llm_context, LLMOverloadedError, INTERACTIVE, ALERTS
+from tools.chat_queue import checkpoint
+from tools.quant_scorer import compute_scores
 from memory import set_state, get_state, store_data, retrieve_data
 
 
@@ -34,12 +50,17 @@ class NumpyJSONEncoder(json.JSONEncoder):
 
 load_dotenv()
 
-ai_client = OpenAI(
+# Cliente asíncrono: las llamadas a la IA se esperan en el event loop del bot sin ocupar hilos
+ai_client = AsyncOpenAI(
     api_key=os.getenv("DEEPSEEK_API_KEY"), 
     base_url=os.getenv("OPENROUTER_BASE_URL")
 )
 
 asset_mapper = AssetMapper()
+intent_router = IntentRouter(asset_mapper)
+
+# Velas de 1h usadas para simular un grid (un año)
+GRID_BACKTEST_CANDLES = 24 * 365
 
 # Para tareas rápidas, interactivas o de bajo coste
 FAST_MODEL = "google/gemini-flash-1.5"
@@ -48,6 +69,40 @@ FAST_MODEL = "google/gemini-flash-1.5"
 # Para tareas complejas que requieren la máxima calidad y razonamiento
 SMART_MODEL = "nvidia/llama-3.1-nemotron-ultra-253b-v1:free"
 
+# Caché de respuestas de la IA: entradas en memoria y carpeta opcional para el nivel en disco
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")
+LLM_CACHE_DISK_MAX_MB = float(os.getenv("LLM_CACHE_DISK_MAX_MB", "256"))
+# Las clasificaciones del router solo dependen del texto del mensaje
+ROUTER_CACHE_TTL = int(os.getenv("ROUTER_CACHE_TTL", "86400"))
+
+llm_cache = TieredCache(
+    "llm", max_entries=LLM_CACHE_MAX_ENTRIES, disk_dir=LLM_CACHE_DIR or None,
+    max_disk_bytes=int(LLM_CACHE_DISK_MAX_MB * 1024 * 1024)
+)
+
+# Plazo común (segundos) para reunir los datos de un handler: lo que no llegue a tiempo se omite
+DATA_FANOUT_DEADLINE = float(os.getenv("DATA_FANOUT_DEADLINE", "12"))
+
+# Plazo total (segundos) de una síntesis cubierta con el modelo rápido (ver hedged_completion)
+MODEL_CALL_DEADLINE = float(os.getenv("MODEL_CALL_DEADLINE", "60"))
+# Latencias observadas de cada modelo: de ellas sale cuándo lanzar el de respaldo. En streaming
+# cuenta el tiempo hasta el primer token, que es lo que espera el usuario
+model_latency = LatencyTracker()
+first_token_latency = LatencyTracker()
+
+# Puntuación de la estrategia: "local" (tools/quant_scorer, sin IA) o "llm" (prompt quant_interpreter_advanced)
+STRATEGY_SCORER = os.getenv("STRATEGY_SCORER", "local").lower()
+
+# Trabajo adelantado para los botones de acción de cada chat (ver prefetch_button_targets)
+prefetcher = SpeculativePrefetcher()
+
+# Respuesta cuando el planificador de la IA no admite la petición (colas llenas o demasiada espera)
+LLM_BUSY_TEXT = "⏳ La IA está saturada en este momento. Vuelve a intentarlo en unos segundos."
+
+# Callback con el texto acumulado de una respuesta en streaming (lo usa el bot para editar el mensaje)
+PartialCallback = Optional[Callable[[str], Awaitable[None]]]
+
 # Archivo: ai_dispatcher_v2.py
 
 SYSTEM_PROMPTS = {
@@ -57,17 +112,18 @@ SYSTEM_PROMPTS = {
     REGLAS DE DECISIÓN, EN ORDEN DE PRIORIDAD:
 
     1.  **Análisis de Ballenas (On-Chain)**: Si el usuario pide `ballenas`, `whales`, `on-chain`, `flujos`, `actividad de billeteras`, o `whale analysis`, usa `intention: whale_analysis`. Esta es la más importante.
-    2.  **Estrategia Específica para Cripto**: Si pide `estrategia`, `plan`, `trade`, `operación` PARA un activo cripto, y menciona capital o riesgo, usa `intention: strategy_full`.
-    3.  **Análisis Específico de un Activo**: Si menciona un activo (cripto o tradicional) y pide `análisis`, `gráfico`, `AT`, `cómo está`, `qué hace`, usa `intention: specific_asset_analysis`.
-    4.  **Informe de Mercado Global**: Si el usuario pide un resumen general del día, `noticias`, `informe`, `cómo está el mercado`, SIN un activo específico, usa `intention: global_market_report`.
-    5.  **Análisis de Ecosistema Cripto**: Si pregunta por `ecosistema`, `relaciones`, `conexiones` de un token, usa `intention: ecosystem_analysis`.
-    6.  **Búsqueda de Candidatos Cripto**: Si pide `candidatos`, `sugerencias`, `qué operar`, `qué está caliente` SIN un activo, usa `intention: top_gainers` (si menciona "subiendo" o "ganando") o `top_traded` (si menciona "volumen" o "negociado").
-    7.  **Comparar Listas Cripto**: Si pide `comparar listas`, `en común`, `coinciden`, usa `intention: cross_reference_lists`.
-    8.  **Sentimiento de un Activo**: Si pide `sentimiento`, `noticias` o `rumores` de un activo específico, usa `intention: sentiment_check`.
-    9.  **Preguntas Generales**: Para todo lo demás (qué es bitcoin, política, ciencia, etc.), usa `intention: general_web_query`.
-    10. **Conversación Casual**: Saludos, agradecimientos, bromas, etc., usa `intention: conversation`.
-
-    Usa la herramienta 'classify_advanced_request'. `asset_name` es crucial. Extrae siempre que sea posible el `capital`, `risk_level` y `timeframe` si se mencionan.
+    2.  **Grid Trading**: Si pide un `grid`, `rejilla` o `bot de grid` PARA un activo cripto, usa `intention: grid_setup`.
+    3.  **Estrategia Específica para Cripto**: Si pide `estrategia`, `plan`, `trade`, `operación` PARA un activo cripto, y menciona capital o riesgo, usa `intention: strategy_full`.
+    4.  **Análisis Específico de un Activo**: Si menciona un activo (cripto o tradicional) y pide `análisis`, `gráfico`, `AT`, `cómo está`, `qué hace`, usa `intention: specific_asset_analysis`.
+    5.  **Informe de Mercado Global**: Si el usuario pide un resumen general del día, `noticias`, `informe`, `cómo está el mercado`, SIN un activo específico, usa `intention: global_market_report`.
+    6.  **Análisis de Ecosistema Cripto**: Si pregunta por `ecosistema`, `relaciones`, `conexiones` de un token, usa `intention: ecosystem_analysis`.
+    7.  **Búsqueda de Candidatos Cripto**: Si pide `candidatos`, `sugerencias`, `qué operar`, `qué está caliente` SIN un activo, usa `intention: top_gainers` (si menciona "subiendo" o "ganando") o `top_traded` (si menciona "volumen" o "negociado").
+    8.  **Comparar Listas Cripto**: Si pide `comparar listas`, `en común`, `coinciden`, usa `intention: cross_reference_lists`.
+    9.  **Sentimiento de un Activo**: Si pide `sentimiento`, `noticias` o `rumores` de un activo específico, usa `intention: sentiment_check`.
+    10. **Preguntas Generales**: Para todo lo demás (qué es bitcoin, política, ciencia, etc.), usa `intention: general_web_query`.
+    11. **Conversación Casual**: Saludos, agradecimientos, bromas, etc., usa `intention: conversation`.
+
+    Usa la herramienta 'classify_advanced_request'. `asset_name` es crucial. Extrae siempre que sea posible el `capital`, `risk_level`, `timeframe`, `strategy_type` y `seed` si se mencionan.
     """,
     "whale_analysis_json_synthesizer": """
     Eres un Analista On-Chain de élite. Basado en los DATOS CLAVE, escribe un párrafo de análisis y un plan de acción. Sé directo y profesional. No uses formato Markdown. Solo texto.
@@ -190,7 +246,7 @@ advanced_router_tool = {
                 "intention": {
                     "type": "string",
                     "enum": [
-                        "specific_asset_analysis", "strategy_full", "global_market_report",
+                        "specific_asset_analysis", "strategy_full", "grid_setup", "global_market_report",
                         "ecosystem_analysis", "whale_analysis", "sentiment_check",
                         "top_traded", "top_gainers", "cross_reference_lists",
                         "general_web_query", "conversation"
@@ -199,57 +255,286 @@ advanced_router_tool = {
                 "asset_name": {"type": "string", "description": "El nombre o ticker del activo. Ejemplo: 'Bitcoin', 'ETH', 'S&P 500'. Default a 'NONE'.", "default": "NONE"},
                 "timeframe": {"type": "string", "description": "El timeframe para el análisis. Ejemplo: '1h', '4h', '1d'. Default a '1h'.", "default": "1h"},
                 "capital": {"type": "number", "description": "El capital disponible del usuario. Default a 100.", "default": 100},
-                "risk_level": {"type": "string", "enum": ["low", "medium", "high", "degen"], "description": "El nivel de riesgo del usuario.", "default": "medium"}
+                "risk_level": {"type": "string", "enum": ["low", "medium", "high", "degen"], "description": "El nivel de riesgo del usuario.", "default": "medium"},
+                "strategy_type": {"type": "string", "enum": ["directional", "dca", "martingale", "grid", "mixed"], "description": "Tipo de estrategia si el usuario lo pide (p. ej. 'estrategia DCA', 'martingala'). Default a 'directional'.", "default": "directional"},
+                "seed": {"type": "integer", "description": "Semilla de la simulación Monte Carlo, solo si el usuario la indica (p. ej. 'semilla 42')."}
             },
             "required": ["intention"]
         }
     }
 }
 
-def handle_global_market_report(chat_id: int) -> str:
+def llm_request_key(kwargs: dict, snapshot=None) -> str:
+    """
+    Clave de caché de una llamada a la IA: modelo, prompt de sistema y datos. Si se da
+    `snapshot` (p. ej. símbolo, timeframe y vela), sustituye a los mensajes del usuario.
+    """
+    messages = kwargs.get("messages", [])
+    system_prompt = "\n".join(m["content"] for m in messages if m.get("role") == "system")
+    payload = snapshot if snapshot is not None else [m for m in messages if m.get("role") != "system"]
+    options = {k: v for k, v in kwargs.items() if k not in ("model", "messages")}
+    return llm_cache_key(kwargs.get("model"), system_prompt, payload, options)
+
+async def cached_completion(handler: str, ttl: Optional[float], snapshot=None, **kwargs):
+    """
+    Envoltorio de ai_client.chat.completions.create que reutiliza respuestas idénticas
+    mientras los datos de origen sigan vigentes (`ttl`). Sin ttl, llama siempre a la IA.
+    """
+    checkpoint()
+    if not ttl or ttl <= 0:
+        return await instrumented_completion(ai_client, handler, **kwargs)
+
+    key = llm_request_key(kwargs, snapshot)
+    cached = await llm_cache.aget(key, handler)
+    if cached is not None:
+        print(f"-> Caché IA [{handler}]: respuesta reutilizada (tasa de acierto {llm_cache.hit_rate(handler):.0f}%).")
+        llm_metrics.record(handler, kwargs.get("model"), cache="hit")
+        return cached
+
+    response = await instrumented_completion(ai_client, handler, cache="miss", **kwargs)
+    if response and response.choices and (response.choices[0].message.content or response.choices[0].message.tool_calls):
+        llm_cache.set(key, response, ttl, handler)
+    return response
+
+def _completion_text(value) -> Optional[str]:
+    """Texto de una respuesta cacheada (texto de un streaming o respuesta completa)."""
+    if isinstance(value, str):
+        return value
+    if value is not None and getattr(value, "choices", None):
+        return value.choices[0].message.content
+    return None
+
+async def stream_completion(handler: str, ttl: Optional[float], snapshot=None,
+                            on_partial: PartialCallback = None, **kwargs) -> Optional[str]:
+    """
+    Como cached_completion, pero devuelve el texto y, si se da `on_partial`, pide la
+    respuesta en streaming y le pasa el texto acumulado tras cada fragmento. En caché
+    se guarda el texto final.
+    """
+    key = llm_request_key(kwargs, snapshot) if ttl and ttl > 0 else None
+    if key:
+        cached = _completion_text(await llm_cache.aget(key, handler))
+        if cached:
+            print(f"-> Caché IA [{handler}]: respuesta reutilizada (tasa de acierto {llm_cache.hit_rate(handler):.0f}%).")
+            llm_metrics.record(handler, kwargs.get("model"), cache="hit")
+            return cached
+
+    cache_status = "miss" if key else "off"
+    if on_partial is None:
+        response = await instrumented_completion(ai_client, handler, cache=cache_status, **kwargs)
+        text = response.choices[0].message.content if response and response.choices else None
+    else:
+        text = ""
+        async for chunk in instrumented_stream(ai_client, handler, cache=cache_status, **kwargs):
+            if chunk.choices and (delta := chunk.choices[0].delta.content):
+                text += delta
+                await on_partial(text)
+
+    if key and text:
+        llm_cache.set(key, text, ttl, handler)
+    return text or None
+
+async def hedged_completion(handler: str, ttl: Optional[float], snapshot=None,
+                            on_partial: PartialCallback = None, **kwargs) -> Optional[str]:
+    """
+    Como stream_completion con SMART_MODEL, pero si este tarda más que su percentil de
+    latencia habitual (o falla) lanza también FAST_MODEL y se queda con la primera respuesta,
+    cancelando la otra. El texto se cachea con la clave de SMART_MODEL. Solo el primer modelo
+    que empiece a escribir envía texto parcial a `on_partial`.
+    """
+    checkpoint()
+    key = llm_request_key({"model": SMART_MODEL, **kwargs}, snapshot) if ttl and ttl > 0 else None
+    if key:
+        cached = _completion_text(await llm_cache.aget(key, handler))
+        if cached:
+            print(f"-> Caché IA [{handler}]: respuesta reutilizada (tasa de acierto {llm_cache.hit_rate(handler):.0f}%).")
+            llm_metrics.record(handler, SMART_MODEL, cache="hit")
+            return cached
+
+    streaming_model = []
+    first_token = {SMART_MODEL: asyncio.Event(), FAST_MODEL: asyncio.Event()} if on_partial else None
+    tracker = first_token_latency if first_token else model_latency
+
+    def relay(model: str) -> PartialCallback:
+        if on_partial is None:
+            return None
+
+        async def forward(text: str) -> None:
+            first_token[model].set()
+            if not streaming_model:
+                streaming_model.append(model)
+            if streaming_model[0] == model:
+                await on_partial(text)
+        return forward
+
+    def contender(model: str):
+        return model, lambda: stream_completion(handler, None, on_partial=relay(model), model=model, **kwargs)
+
+    winner, text = await hedged_race(contender(SMART_MODEL), contender(FAST_MODEL),
+                                     hedge_after=tracker.hedge_delay(SMART_MODEL),
+                                     deadline=MODEL_CALL_DEADLINE, tracker=tracker, first_token=first_token)
+    if winner:
+        print(f"-> Síntesis [{handler}] resuelta por {winner}.")
+    if key and text:
+        llm_cache.set(key, text, ttl, handler)
+    return text
+
+def get_model_latency_stats() -> dict:
+    """Percentiles de latencia de cada modelo en las síntesis cubiertas (total y hasta el primer token)."""
+    return {"completion": model_latency.stats(), "first_token": first_token_latency.stats()}
+
+def get_llm_stats() -> dict:
+    """Todas las métricas de la IA: llamadas por handler y modelo, caché, latencias y tamaño de prompts."""
+    return {
+        "llm_calls": llm_metrics.snapshot(),
+        "llm_cache": get_llm_cache_stats(),
+        "model_latency": get_model_latency_stats(),
+        "prompt_size": get_prompt_size_stats(),
+        "prefetch": prefetcher.stats(),
+        "scheduler": llm_scheduler.stats(),
+    }
+
+def get_llm_cache_stats() -> dict:
+    """Aciertos/fallos de la caché de la IA por handler."""
+    return llm_cache.stats()
+
+# --- DEPENDENCIAS DE DATOS DE CADA HANDLER ---
+# Cada fuente es {"fetch": f(params, results) -> awaitable, "after": [fuentes previas]}.
+# Las fuentes sin "after" arrancan a la vez; las demás en cuanto terminan aquellas de las que dependen.
+HANDLER_DATA_SOURCES = {
+    "strategy_full": {
+        "technical": {"fetch": lambda p, r: advanced_technical_analysis_async(p["asset_name"], interval=p.get("timeframe", "1h"))},
+        "news": {"fetch": lambda p, r: get_news_async(p["asset_name"])},
+        "tweets": {"fetch": lambda p, r: get_tweets_async(f"${p['asset_name']}")},
+    },
+    "sentiment_check": {
+        "news": {"fetch": lambda p, r: get_news_async(p["asset_name"])},
+        "tweets": {"fetch": lambda p, r: get_tweets_async(f"${p['asset_name']}")},
+        "facebook": {"fetch": lambda p, r: get_facebook_posts_async(p["asset_name"])},
+    },
+    "global_market_report": {
+        "indices": {"fetch": lambda p, r: run_blocking(get_multiple_indices_summary)},
+        "news": {"fetch": lambda p, r: get_comprehensive_market_briefing_data_async()},
+        "web_context": {"fetch": lambda p, r: enrich_with_general_context_async(topic="sentimiento del mercado financiero global hoy", ai_client=ai_client)},
+    },
+    "traditional_market_analysis": {
+        "market_data": {"fetch": lambda p, r: run_blocking(get_market_data_yf, p["asset_ticker"])},
+        "web_context": {"fetch": lambda p, r: enrich_with_general_context_async(
+            topic=f"análisis y noticias de mercado para {p['asset_label']}", ai_client=ai_client,
+            keywords=[p["asset_label"], "mercado", "economía", "noticias"])},
+    },
+    "ecosystem_analysis": {
+        "ecosystem": {"fetch": lambda p, r: run_cpu(analyze_ecosystem, p["asset_name"], analysis_type="map")},
+        # Las palabras clave de la búsqueda salen de las relaciones del ecosistema
+        "web_context": {"after": ["ecosystem"], "fetch": lambda p, r: enrich_with_general_context_async(
+            topic=f"ecosistema cripto de {p['asset_name']}", ai_client=ai_client,
+            keywords=[p["asset_name"]] + r["ecosystem"].get("data", {}).get("related", []))},
+    },
+}
+
+# Resultado que reciben los handlers para una fuente que no respondió a tiempo o falló
+MISSING_SOURCE = {"success": False, "message": "La fuente no respondió dentro del plazo."}
+
+async def gather_handler_data(handler: str, params: dict, deadline: float = DATA_FANOUT_DEADLINE) -> Dict[str, Any]:
+    """
+    Obtiene las fuentes declaradas para `handler` en HANDLER_DATA_SOURCES: las independientes
+    en paralelo y las dependientes en cuanto pueden empezar, todas con un plazo común. Al
+    vencer el plazo se cancela lo pendiente; devuelve {fuente: resultado} de lo que terminó.
+    """
+    sources = HANDLER_DATA_SOURCES[handler]
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    deadline_at = started_at + deadline
+    results, timings, tasks = {}, {}, {}
+    waiting = set(sources)
+
+    def launch_ready():
+        for name in [n for n in waiting if all(dep in results for dep in sources[n].get("after", []))]:
+            waiting.discard(name)
+            tasks[asyncio.ensure_future(sources[name]["fetch"](params, results))] = name
+
+    launch_ready()
+    try:
+        while tasks:
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = tasks.pop(task)
+                timings[name] = f"{loop.time() - started_at:.1f}s"
+                if task.cancelled():
+                    print(f"  ⚠️ Fuente '{name}' de {handler} cancelada.")
+                elif task.exception() is not None:
+                    print(f"  ⚠️ Fuente '{name}' de {handler} falló: {task.exception()}")
+                else:
+                    results[name] = task.result()
+            launch_ready()
+    finally:
+        # Por plazo vencido o porque se cancela la propia petición: no quedan fuentes huérfanas
+        for task, name in tasks.items():
+            task.cancel()
+            timings[name] = "fuera de plazo"
+    for name in waiting:
+        timings[name] = "omitida (falló una dependencia)"
+    print(f"-> Datos de {handler} en {loop.time() - started_at:.1f}s: " + ", ".join(f"{n} {t}" for n, t in timings.items()))
+    # Si la petición se ha sustituido mientras llegaban los datos, no se pasa a la síntesis
+    checkpoint()
+    return results
+
+async def handle_global_market_report(chat_id: int, on_partial: PartialCallback = None) -> str:
     print("\n=== HANDLER: Informe de Mercado Global ===")
-    indices_summary = get_multiple_indices_summary()
-    market_news = get_comprehensive_market_briefing_data()
-    web_context = enrich_with_general_context(topic="sentimiento del mercado financiero global hoy", ai_client=ai_client)
-    
     # Formatear la fecha actual para el título
     current_date = datetime.now().strftime("%d de %B de %Y")
     
     prompt = SYSTEM_PROMPTS["global_report_synthesizer"].format(current_date=current_date)
     
+    # El informe es el mismo para todos los chats mientras no se refresquen las noticias:
+    # si ya está en caché, ni siquiera se vuelven a descargar los datos
+    snapshot = {"report": "global", "date": current_date, "news_window": news_window()}
+    request = {"model": SMART_MODEL, "messages": [{"role": "system", "content": prompt}]}
+    cached = _completion_text(await llm_cache.aget(llm_request_key(request, snapshot), "global_market_report"))
+    if cached:
+        print("-> Caché IA [global_market_report]: informe reutilizado.")
+        return cached
+    
+    data = await gather_handler_data("global_market_report", {})
+    
     combined_data = {
-        "Global Indices": indices_summary, "Market News": market_news,
-        "Web Context": web_context.get("context", "N/A")
+        "Global Indices": data.get("indices"), "Market News": data.get("news", MISSING_SOURCE),
+        "Web Context": data.get("web_context", {}).get("context", "N/A")
     }
-    user_content = f"Genera el Informe Macro Global con estos datos:\n{json.dumps(combined_data, cls=NumpyJSONEncoder, indent=2)}"
-    response = ai_client.chat.completions.create(model=SMART_MODEL, messages=[{"role": "system", "content": prompt}, {"role": "user", "content": user_content}])
-    return response.choices[0].message.content
+    user_content = f"Genera el Informe Macro Global con estos datos:\n{compact_payload('global_market_report', combined_data)}"
+    return await stream_completion("global_market_report", seconds_until_news_refresh(), snapshot=snapshot, on_partial=on_partial, model=SMART_MODEL, messages=[{"role": "system", "content": prompt}, {"role": "user", "content": user_content}])
 
-def handle_ecosystem_analysis(params: dict, chat_id: int) -> str:
+async def handle_ecosystem_analysis(params: dict, chat_id: int) -> str:
     asset = params.get("asset_name")
     if not asset or asset == "NONE":
         return "Claro, ¿de qué activo te gustaría un análisis de ecosistema y relaciones? Por ejemplo: <code>ecosistema de Solana</code>"
     
-    ecosystem_data = analyze_ecosystem(asset, analysis_type="map")
+    data = await gather_handler_data("ecosystem_analysis", params)
+    ecosystem_data = data.get("ecosystem", MISSING_SOURCE)
     if not ecosystem_data.get("success"):
         return f"No pude encontrar datos de ecosistema para {asset}. Es posible que no esté en mi base de datos de relaciones."
 
-    keywords = [asset] + ecosystem_data.get("data", {}).get("related", [])
-    web_context = enrich_with_general_context(topic=f"ecosistema cripto de {asset}", ai_client=ai_client, keywords=keywords)
+    web_context = data.get("web_context", {})
     prompt = SYSTEM_PROMPTS["ecosystem_synthesizer"].format(ASSET=asset.upper())
     combined_data = {"Ecosystem Data": ecosystem_data.get("data"), "Web Context": web_context.get("context", "N/A")}
-    user_content = f"Analiza los siguientes datos sobre {asset} y genera el informe.\n\nDATOS COMBINADOS:\n{json.dumps(combined_data, indent=2)}"
-    response = ai_client.chat.completions.create(model=SMART_MODEL, messages=[{"role": "system", "content": prompt}, {"role": "user", "content": user_content}])
+    user_content = f"Analiza los siguientes datos sobre {asset} y genera el informe.\n\nDATOS COMBINADOS:\n{compact_payload('ecosystem_analysis', combined_data)}"
+    response = await cached_completion("ecosystem_analysis", seconds_until_news_refresh(), model=SMART_MODEL, messages=[{"role": "system", "content": prompt}, {"role": "user", "content": user_content}])
     return response.choices[0].message.content
 
-def handle_traditional_market_analysis(params: dict, chat_id: int) -> str:
+async def handle_traditional_market_analysis(params: dict, chat_id: int) -> str:
     asset_ticker = params.get("asset_name")
     asset_info = asset_mapper.get_asset_info(asset_ticker)
     asset_name = asset_info.get("names", [asset_ticker])[0].title()
 
     print(f"\n=== ANÁLISIS DE MERCADO TRADICIONAL: {asset_name} ({asset_ticker}) ===")
 
-    df = get_market_data_yf(asset_ticker)
+    # yfinance es bloqueante: la descarga y la búsqueda web se solapan
+    data = await gather_handler_data("traditional_market_analysis", {"asset_ticker": asset_ticker, "asset_label": asset_name})
+    df = data.get("market_data")
+    web_context = data.get("web_context", {})
     if df is None or df.empty:
         return f"❌ No pude obtener datos de mercado para {asset_name} desde Yahoo Finance."
     
@@ -258,12 +543,6 @@ def handle_traditional_market_analysis(params: dict, chat_id: int) -> str:
     recent_low = df['low'][-30:].min()
     recent_high = df['high'][-30:].max()
     
-    web_context = enrich_with_general_context(
-        topic=f"análisis y noticias de mercado para {asset_name}",
-        ai_client=ai_client,
-        keywords=[asset_name, "mercado", "economía", "noticias"]
-    )
-    
     prompt = SYSTEM_PROMPTS["trad_market_analyzer"].format(ASSET_NAME=asset_name)
     
     summary_data = {
@@ -278,11 +557,11 @@ def handle_traditional_market_analysis(params: dict, chat_id: int) -> str:
         "Web Context": web_context.get("context", "No se encontró contexto externo.")
     }
 
-    user_content = f"Por favor, analiza los siguientes datos y genera el informe.\n\nDATOS:\n{json.dumps(summary_data, cls=NumpyJSONEncoder, indent=2)}"
-    response = ai_client.chat.completions.create(model=SMART_MODEL, messages=[{"role": "system", "content": prompt}, {"role": "user", "content": user_content}])
+    user_content = f"Por favor, analiza los siguientes datos y genera el informe.\n\nDATOS:\n{compact_payload('traditional_market_analysis', summary_data)}"
+    response = await cached_completion("traditional_market_analysis", seconds_until_news_refresh(), model=SMART_MODEL, messages=[{"role": "system", "content": prompt}, {"role": "user", "content": user_content}])
     return response.choices[0].message.content
 
-def handle_technical_analysis_v2(params: dict, chat_id: int) -> dict:
+async def handle_technical_analysis_v2(params: dict, chat_id: int, on_partial: PartialCallback = None) -> dict:
     """
     Handler para análisis técnico que ahora devuelve un diccionario completo
     para construir la respuesta y los botones de callback.
@@ -292,15 +571,16 @@ def handle_technical_analysis_v2(params: dict, chat_id: int) -> dict:
     timeframe = params.get("timeframe", "1h")
 
     if not asset or asset == "NONE":
-        return {"text": "Claro, ¿de qué activo te gustaría un análisis técnico?", "chart_path": None, "asset": None, "timeframe": None}
+        return {"text": "Claro, ¿de qué activo te gustaría un análisis técnico?", "chart": None, "asset": None, "timeframe": None}
     
     print(f"-> Analizando {asset} en timeframe {timeframe}...")
     
-    result = advanced_technical_analysis(asset, interval=timeframe)
+    result = await prefetcher.take(("technical", asset, timeframe),
+                                   lambda: advanced_technical_analysis_async(asset, interval=timeframe))
     if not result.get("success"):
         return {
             "text": f"No pude analizar {asset}. Verifica que el símbolo sea correcto. Causa: {result.get('message', 'Desconocida')}",
-            "chart_path": None, "asset": asset, "timeframe": timeframe
+            "chart": None, "asset": asset, "timeframe": timeframe
         }
     
     data = result.get("data", {})
@@ -310,12 +590,15 @@ def handle_technical_analysis_v2(params: dict, chat_id: int) -> dict:
     support_levels = [zone['center'] for zone in sr_zones.get("support_zones", [])]
     resistance_levels = [zone['center'] for zone in sr_zones.get("resistance_zones", [])]
     
-    chart_path = generate_candlestick_chart(
+    # El análisis ya trae las velas y las medias/bandas: el gráfico solo recorta y dibuja (en el pool),
+    # mientras la IA redacta el informe
+    chart_task = asyncio.create_task(generate_chart_from_series_async(
         symbol=asset,
         interval=timeframe,
+        series=data["series"],
         support_levels=support_levels,
         resistance_levels=resistance_levels
-    )
+    ))
     
     summary = {
         "símbolo": data.get("symbol"), "precio_actual": data.get("current_price"), "tendencia_general": signals.get("overall"),
@@ -332,7 +615,7 @@ def handle_technical_analysis_v2(params: dict, chat_id: int) -> dict:
     Eres un analista técnico de élite. Presenta un análisis claro y accionable para un trader en Telegram.
     Usa el siguiente resumen para {asset}.
 
-    Datos: {json.dumps(summary, cls=NumpyJSONEncoder, indent=2)}
+    Datos: {compact_payload("technical_analysis", summary)}
 
     **FORMATO HTML de Telegram (solo usa <b>, <i>, <code> y viñetas •):**
     <b>📊 Análisis Técnico: {asset} ({timeframe})</b>
@@ -359,144 +642,36 @@ def handle_technical_analysis_v2(params: dict, chat_id: int) -> dict:
     final_report = "❌ No se pudo generar el informe de análisis técnico. La IA no respondió."
     try:
         # --- INICIO DE LA CORRECCIÓN: LLAMADA A LA IA COMPLETA Y CORRECTA ---
-        print("-> Intentando síntesis de AT con SMART_MODEL...")
-        response = ai_client.chat.completions.create(
-            model=SMART_MODEL,
+        print("-> Intentando síntesis de AT con SMART_MODEL (cubierto con FAST_MODEL)...")
+        # Mismo activo, timeframe y vela => mismo informe para todos los chats hasta el cierre de la vela
+        text = await hedged_completion(
+            "technical_analysis", seconds_until_candle_close(timeframe),
+            snapshot={"symbol": asset, "timeframe": timeframe, "candle": data.get("timestamp")},
+            on_partial=on_partial,
             messages=[
                 {"role": "system", "content": "Eres un analista experto de criptomonedas para Telegram."},
                 {"role": "user", "content": analysis_prompt_text}
             ]
         )
-        if response and response.choices:
-            final_report = response.choices[0].message.content
+        if text:
+            final_report = text
         # --- FIN DE LA CORRECCIÓN ---
 
     except Exception as e:
         print(f"Error en la síntesis de la IA: {e}")
-        # (Opcional: podrías añadir aquí el fallback al FAST_MODEL si lo deseas)
+    except asyncio.CancelledError:
+        chart_task.cancel()
+        raise
 
+    chart = await chart_task
     return {
         "text": final_report, 
-        "chart_path": chart_path,
+        "chart": chart,
         "asset": asset,
         "timeframe": timeframe
     }
 
-def process_request_v2(user_message: str, history: list, chat_id: int) -> dict:
-    """
-    Procesa la solicitud del usuario usando un router que ahora considera el historial.
-    Devuelve un diccionario con el texto de la respuesta y una ruta opcional a un gráfico.
-    """
-    try:
-        # --- INICIO DE LA MEJORA: ROUTER CON CONTEXTO ---
-        # Formateamos el historial para que la IA lo entienda fácilmente.
-        formatted_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history[-4:]]) # Últimos 4 mensajes
-        
-        router_prompt = f"""
-        Analiza el 'NUEVO MENSAJE' del usuario teniendo en cuenta el 'HISTORIAL DE CONVERSACIÓN' para entender el contexto.
-        Tu tarea es clasificar la intención y extraer parámetros. Si el usuario dice "otra vez" o "y ahora en X timeframe",
-        usa el activo del historial para el parámetro 'asset_name'.
-
-        HISTORIAL DE CONVERSACIÓN:
-        {formatted_history}
-
-        NUEVO MENSAJE: '{user_message}'
-        """
-        
-        router_messages = [
-            {"role": "system", "content": SYSTEM_PROMPTS["router_advanced"]},
-            {"role": "user", "content": router_prompt}
-        ]
-        # --- FIN DE LA MEJORA ---
-
-        router_response = ai_client.chat.completions.create(
-            model=FAST_MODEL, 
-            messages=router_messages, 
-            tools=[advanced_router_tool], 
-            tool_choice="auto"
-        )
-
-        if not router_response.choices[0].message.tool_calls:
-            return {"text": handle_conversation_v2(user_message, history, chat_id)}
-
-        tool_call = router_response.choices[0].message.tool_calls[0]
-        params = json.loads(tool_call.function.arguments)
-
-        # Lógica de enriquecimiento de parámetros con fallback al historial
-        if params.get("asset_name") == "NONE":
-            last_asset_from_history = asset_mapper.extract_asset_from_history(history)
-            if last_asset_from_history:
-                params["asset_name"] = last_asset_from_history
-                print(f"-> Activo no encontrado en el mensaje, recuperado del historial: {last_asset_from_history}")
-        
-        if params.get("asset_name") == "NONE":
-             params["asset_name"] = asset_mapper.extract_asset_from_text(user_message)
-
-        intention = params["intention"]
-        asset_name = params.get("asset_name")
-        print(f"\n=== CLASIFICACIÓN FINAL ===\nIntención: {intention}\nActivo: {asset_name if asset_name and asset_name != 'NONE' else 'N/A'}")
-
-        # --- Enrutamiento a los Handlers ---
-        
-        # Handlers que devuelven un dict completo (con posible gráfico)
-        if intention == "specific_asset_analysis":
-            if not asset_name or asset_name == 'NONE': 
-                return {"text": "Por favor, especifica qué activo quieres analizar o pídeme un análisis primero."}
-            if asset_mapper.is_traditional_asset(asset_name):
-                # Los activos tradicionales usan un handler que solo devuelve texto
-                return {"text": handle_traditional_market_analysis(params, chat_id)}
-            else:
-                params["asset_name"] = asset_mapper.normalize_to_trading_pair(asset_name)
-                # Este handler devuelve un dict completo: {"text": ..., "chart_path": ...}
-                return handle_technical_analysis_v2(params, chat_id)
-        
-        # Handlers que siempre devuelven solo texto
-        response_text = ""
-        if intention == "global_market_report":
-            response_text = handle_global_market_report(chat_id)
-        elif intention == "strategy_full":
-            if not asset_name or asset_name == 'NONE' or asset_mapper.is_traditional_asset(asset_name):
-                response_text = "Para generar una estrategia, necesito un activo de criptomoneda. Ejemplo: `estrategia para SOL`."
-            else:
-                params["asset_name"] = asset_mapper.normalize_to_trading_pair(asset_name)
-                response_text = handle_advanced_strategy(params, chat_id)
-        elif intention == "ecosystem_analysis":
-            if not asset_name or asset_name == 'NONE':
-                response_text = "Por favor, dime de qué activo quieres analizar el ecosistema."
-            else:
-                response_text = handle_ecosystem_analysis(params, chat_id)
-        elif intention == "whale_analysis":
-            if not asset_name or asset_name == 'NONE':
-                response_text = "Claro, ¿de qué activo quieres el análisis de ballenas?"
-            else:
-                response_text = handle_whale_analysis(params, chat_id)
-        elif intention == "sentiment_check":
-            if not asset_name or asset_name == 'NONE':
-                response_text = "Por supuesto, ¿de qué activo quieres que analice el sentimiento?"
-            else:
-                response_text = handle_sentiment_analysis(params, chat_id)
-        elif intention == "top_traded":
-            response_text = handle_top_traded(chat_id)
-        elif intention == "top_gainers":
-            response_text = handle_top_gainers(chat_id)
-        elif intention == "cross_reference_lists":
-            response_text = handle_cross_reference(chat_id)
-        elif intention == "general_web_query":
-            response_text = handle_general_web_query(user_message, ai_client)
-        elif intention == "conversation":
-            response_text = handle_conversation_v2(user_message, history, chat_id)
-        else:
-            # Fallback si una intención no está mapeada
-            response_text = handle_conversation_v2(user_message, history, chat_id)
-            
-        return {"text": response_text}
-
-    except Exception as e:
-        print(f"Error CRÍTICO en process_request_v2: {e}")
-        traceback.print_exc()
-        return {"text": "❌ Ocurrió un error inesperado al procesar tu solicitud. El equipo técnico ha sido notificado."}
-
-def handle_advanced_strategy(params: dict, chat_id: int) -> str:
+async def handle_advanced_strategy(params: dict, chat_id: int, on_partial: PartialCallback = None) -> str:
     print("\n=== HANDLER: Estrategia Avanzada ===")
     asset = params.get("asset_name")
     if not asset or asset == "NONE":
@@ -506,69 +681,80 @@ def handle_advanced_strategy(params: dict, chat_id: int) -> str:
     risk_level = params.get("risk_level", "medium")
     timeframe = params.get("timeframe", "1h")
     
-    tech_analysis = advanced_technical_analysis(asset, interval=timeframe)
+    # Noticias y tweets son opcionales: si no llegan dentro del plazo la estrategia sigue sin ellos
+    data = await prefetcher.take(("data", "strategy_full", asset, timeframe),
+                                 lambda: gather_handler_data("strategy_full", params))
+    tech_analysis = data.get("technical", MISSING_SOURCE)
+    news = data.get("news", MISSING_SOURCE)
+    tweets = data.get("tweets", MISSING_SOURCE)
     if not tech_analysis.get("success"):
         return f"No se pudo generar la estrategia para {asset}: {tech_analysis.get('message')}"
     
-    news = get_news(asset)
-    tweets = get_tweets(f"${asset}")
-    
     analysis_data = {
         "technical": tech_analysis,
         "news": news,
         "social": {"twitter": tweets}
     }
     
-    interpreter_response = ai_client.chat.completions.create(model=SMART_MODEL, messages=[{"role": "system", "content": SYSTEM_PROMPTS["quant_interpreter_advanced"]}, {"role": "user", "content": json.dumps(analysis_data, cls=NumpyJSONEncoder)}], response_format={"type": "json_object"})
-    scores = json.loads(interpreter_response.choices[0].message.content)
+    if STRATEGY_SCORER == "llm":
+        interpreter_response = await cached_completion("strategy_interpreter", seconds_until_candle_close(timeframe), model=SMART_MODEL, messages=[{"role": "system", "content": SYSTEM_PROMPTS["quant_interpreter_advanced"]}, {"role": "user", "content": compact_payload("strategy_interpreter", analysis_data)}], response_format={"type": "json_object"})
+        scores = json.loads(interpreter_response.choices[0].message.content)
+    else:
+        # Determinista y sin ida y vuelta a la IA: mismas entradas, mismos scores
+        scores = compute_scores(analysis_data)
+    print(f"-> Scores ({STRATEGY_SCORER}): {scores}")
     
-    strategy = generate_advanced_trading_strategy(
+    strategy = await run_cpu(
+        generate_advanced_trading_strategy,
         scores=scores, 
         tech_data=tech_analysis.get("data", {}), 
         multi_tf_data=tech_analysis.get('data', {}).get('multi_timeframe', {}).get('timeframes', {}),
-        user_profile={"capital": capital, "risk_level": risk_level, "timeframe": timeframe}
+        user_profile={"capital": capital, "risk_level": risk_level, "timeframe": timeframe,
+                      "strategy_type": params.get("strategy_type") or "directional", "seed": params.get("seed")}
     )
     
+    # Se guarda la estrategia para re-escalarla al instante con /ajustar
+    store_data(chat_id, 'last_strategy', CachedStrategy(asset, strategy))
+    
     final_data = {"asset": asset, "scores": scores, "strategy": strategy, "profile": {"capital": capital, "risk": risk_level}}
-    response = ai_client.chat.completions.create(model=SMART_MODEL, messages=[{"role": "system", "content": SYSTEM_PROMPTS["strategy_presenter_degen"]}, {"role": "user", "content": f"Presenta esta estrategia: {json.dumps(final_data, cls=NumpyJSONEncoder)}"}])
+    presentation = await stream_completion("strategy_presenter", seconds_until_candle_close(timeframe), on_partial=on_partial, model=SMART_MODEL, messages=[{"role": "system", "content": SYSTEM_PROMPTS["strategy_presenter_degen"]}, {"role": "user", "content": f"Presenta esta estrategia: {compact_payload('strategy_presenter', final_data)}"}])
     
     set_state(chat_id, 'awaiting_followup')
-    return response.choices[0].message.content
+    return presentation
 
-def handle_sentiment_analysis(params: dict, chat_id: int) -> str:
+async def handle_sentiment_analysis(params: dict, chat_id: int) -> str:
     asset = params.get("asset_name")
     if not asset or asset.startswith("NONE"):
         return "Por supuesto, ¿de qué activo quieres que analice el sentimiento en redes y noticias?"
     
-    news = get_news(asset)
-    tweets = get_tweets(f"${asset}")
-    facebook = get_facebook_posts(asset)
+    data = await prefetcher.take(("data", "sentiment_check", asset),
+                                 lambda: gather_handler_data("sentiment_check", params))
+    news = data.get("news", MISSING_SOURCE)
+    tweets = data.get("tweets", MISSING_SOURCE)
+    facebook = data.get("facebook", MISSING_SOURCE)
     
     # --- PROMPT CORREGIDO ---
     summary_prompt = f"""
     Analiza el sentimiento general para {asset} basándote en: Noticias, Twitter y Facebook.
     Proporciona: Sentimiento general (Bullish/Bearish/Neutral), principales narrativas, nivel de consenso y señales de alerta.
     Formato HTML de Telegram, sé directo y específico, usando solo <b>, <i>, <code> y viñetas •.
-    Datos:
-    Noticias: {json.dumps(news, cls=NumpyJSONEncoder)}
-    Twitter: {json.dumps(tweets, cls=NumpyJSONEncoder)}
-    Facebook: {json.dumps(facebook, cls=NumpyJSONEncoder)}
+    Datos: {compact_payload("sentiment_check", {"noticias": news, "twitter": tweets, "facebook": facebook})}
     """
     
-    response = ai_client.chat.completions.create(model=SMART_MODEL, messages=[{"role": "system", "content": "Analizador de sentimiento de mercados crypto."}, {"role": "user", "content": summary_prompt}])
+    response = await cached_completion("sentiment_check", seconds_until_news_refresh(), model=SMART_MODEL, messages=[{"role": "system", "content": "Analizador de sentimiento de mercados crypto."}, {"role": "user", "content": summary_prompt}])
     return response.choices[0].message.content
 
-def handle_grid_setup(params: dict, chat_id: int) -> str:
+async def handle_grid_setup(params: dict, chat_id: int) -> str:
     asset = params.get("asset_name")
     if not asset or asset.startswith("NONE"):
         return "Para configurar un grid, necesito un activo. Ejemplo: `grid para ETH`."
     
     capital = params.get("capital", 100)
-    data = get_historical_data_extended(asset, interval="1h", limit=168)
+    data = await get_historical_data_extended_async(asset, interval="1h", limit=GRID_BACKTEST_CANDLES)
     if data is None: return f"No pude obtener datos para {asset}"
     
     current_price = float(data['close'].iloc[-1])
-    volatility = data['close'].pct_change().std() * 100
+    volatility = data['close'].tail(168).pct_change().std() * 100
     
     if volatility < 2: range_pct, grids = 5, 10
     elif volatility < 5: range_pct, grids = 10, 15
@@ -577,6 +763,21 @@ def handle_grid_setup(params: dict, chat_id: int) -> str:
     upper_price = current_price * (1 + range_pct/100)
     lower_price = current_price * (1 - range_pct/100)
     
+    # Backtest del mismo grid (rango relativo) sobre el último año de velas de 1h
+    first_price = float(data['close'].iloc[0])
+    backtest = await run_cpu(simulate_grid, data, lower=first_price * (1 - range_pct/100), upper=first_price * (1 + range_pct/100),
+                             num_grids=grids, capital=capital)
+    backtest_text = ""
+    if backtest.get("success"):
+        backtest_text = f"""
+<b>🧪 Simulación Histórica ({backtest['bars_simulated']} velas de 1h)</b>
+<b>Ciclos Completados:</b> <code>{backtest['round_trips']}</code>
+<b>Beneficio Neto del Grid:</b> <code>${backtest['net_grid_profit']:.2f}</code> (comisiones: <code>${backtest['fees_paid']:.2f}</code>)
+<b>PnL No Realizado:</b> <code>${backtest['unrealized_pnl']:.2f}</code>
+<b>Drawdown Máximo:</b> <code>{backtest['max_drawdown_pct']:.2f}%</code>
+<b>Tiempo en Rango:</b> <code>{backtest['time_in_range_pct']:.1f}%</code>
+"""
+    
     # --- RESPUESTA CORREGIDA ---
     return f"""
 <b>⚙️ GRID TRADING SETUP: {asset}</b>
@@ -589,15 +790,29 @@ def handle_grid_setup(params: dict, chat_id: int) -> str:
 <b>Rango:</b> <code>${lower_price:.4f} - ${upper_price:.4f}</code>
 <b>Número de Grids:</b> <code>{grids}</code>
 <b>Capital por Grid:</b> <code>${capital/grids:.2f}</code>
-
+<b>Beneficio Neto por Ciclo:</b> <code>{backtest.get('net_profit_per_round_trip_pct', 0):.3f}%</code>
+{backtest_text}
 <i>Grid Trading funciona mejor en mercados laterales.</i>
 """
 
-def handle_market_overview(params: dict, chat_id: int) -> str:
+async def handle_chart_album(params: dict, chat_id: int) -> dict:
+    """
+    Gráficos del activo en varios timeframes para enviarlos como un solo álbum: una descarga
+    (re-agrupada) y un dibujo en paralelo, sin análisis ni IA. El texto es el pie del álbum.
+    """
+    print("\n=== HANDLER: Álbum de Gráficos Multi-Timeframe ===")
+    asset = params.get("asset_name")
+    album = await generate_timeframe_album_async(asset)
+    if not album:
+        return {"text": f"No pude dibujar los gráficos de {asset}. Verifica que el símbolo sea correcto.", "chart": None}
+    return {"text": f"<b>🖼️ {asset}</b> · {' · '.join(timeframe for timeframe, _ in album)}",
+            "chart": None, "album": album}
+
+async def handle_market_overview(params: dict, chat_id: int) -> str:
     major_cryptos = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "BNBUSDT", "XRPUSDT"]
     overview = "<b>📈 Market Overview</b>\n\n"
-    for symbol in major_cryptos:
-        analysis = advanced_technical_analysis(symbol, interval="4h")
+    analyses = await asyncio.gather(*(advanced_technical_analysis_async(symbol, interval="4h") for symbol in major_cryptos))
+    for symbol, analysis in zip(major_cryptos, analyses):
         if analysis.get("success"):
             data = analysis["data"]
             outlook = data.get("signals", {}).get("overall", "NEUTRAL")
@@ -605,9 +820,9 @@ def handle_market_overview(params: dict, chat_id: int) -> str:
     overview += "\n<i>Para análisis detallado, solo pídemelo.</i>"
     return overview
 
-def handle_top_traded(chat_id: int) -> str:
+async def handle_top_traded(chat_id: int) -> str:
     print("\n=== HANDLER: Top Traded ===")
-    result = get_top_traded()
+    result = await run_blocking(get_top_traded)
     if not result["success"]: return f"❌ Error: {result['message']}"
     store_data(chat_id, 'top_traded', result['data'])
     response_text = "<b>📈 Top 10 Más Negociados (24h)</b>\n<i>Activos con mayor volumen. Buenos para estrategias estables.</i>\n\n"
@@ -616,9 +831,9 @@ def handle_top_traded(chat_id: int) -> str:
         response_text += f"<b>{i+1}. {ticker['symbol']}</b> (Vol: <code>{vol_m}</code>)\n"
     return response_text
 
-def handle_top_gainers(chat_id: int) -> str:
+async def handle_top_gainers(chat_id: int) -> str:
     print("\n=== HANDLER: Top Gainers ===")
-    result = get_top_gainers()
+    result = await run_blocking(get_top_gainers)
     if not result["success"]: return f"❌ Error: {result['message']}"
     store_data(chat_id, 'top_gainers', result['data'])
     response_text = "<b>🚀 Top 10 Ganadores (24h)</b>\n<i>Activos con mayor subida. Buenos para momentum trading (alto riesgo).</i>\n\n"
@@ -643,13 +858,13 @@ def handle_cross_reference(chat_id: int) -> str:
         response_text += f"<b>{i+1}. {symbol}</b>\n"
     return response_text
 
-def handle_conversation_v2(message: str, history: list, chat_id: int) -> str:
+async def handle_conversation_v2(message: str, history: list, chat_id: int) -> str:
     print("\n=== HANDLER: Conversación ===")
     conversation_prompt = "Eres un trader experto pero accesible. Responde de forma directa, con personalidad y humor. Siempre orientado a ayudar a ganar dinero."
-    response = ai_client.chat.completions.create(model=FAST_MODEL, messages=[{"role": "system", "content": conversation_prompt}, {"role": "user", "content": message}])
+    response = await instrumented_completion(ai_client, "conversation", model=FAST_MODEL, messages=[{"role": "system", "content": conversation_prompt}, {"role": "user", "content": message}])
     return response.choices[0].message.content
 
-def handle_whale_analysis(params: dict, chat_id: int) -> str:
+async def handle_whale_analysis(params: dict, chat_id: int, on_partial: PartialCallback = None) -> str:
     """
     Handler robusto para análisis de ballenas que pre-procesa datos, depura la respuesta de la IA
     y utiliza un modelo de fallback si es necesario.
@@ -666,7 +881,7 @@ def handle_whale_analysis(params: dict, chat_id: int) -> str:
     print(f"-> Activo para análisis on-chain: {asset_normalized.upper()}")
 
     try:
-        result = analyze_whale_activity(asset_normalized.lower())
+        result = await run_blocking(analyze_whale_activity, asset_normalized.lower())
         if not result.get("success"):
             return f"❌ No pude obtener datos on-chain para {asset_normalized}: {result.get('error', 'Error desconocido')}"
 
@@ -684,35 +899,17 @@ def handle_whale_analysis(params: dict, chat_id: int) -> str:
         
         # --- PROMPT CORREGIDO ---
         synthesizer_prompt = SYSTEM_PROMPTS["whale_analysis_final_synthesizer"].format(ASSET=asset_normalized.upper())
-        user_content_for_ai = f"Aquí está el RESUMEN de datos on-chain para {asset_normalized.upper()}.\nGenera el informe de analista de élite.\n\nRESUMEN DE DATOS:\n{json.dumps(data_summary, cls=NumpyJSONEncoder, indent=2)}"
+        user_content_for_ai = f"Aquí está el RESUMEN de datos on-chain para {asset_normalized.upper()}.\nGenera el informe de analista de élite.\n\nRESUMEN DE DATOS:\n{compact_payload('whale_analysis', data_summary)}"
         
-        final_report = None
-        try:
-            print(f"\n-> Intentando síntesis con el modelo inteligente: {SMART_MODEL}...")
-            synthesis_response = ai_client.chat.completions.create(
-                model=SMART_MODEL,
-                messages=[{"role": "system", "content": synthesizer_prompt}, {"role": "user", "content": user_content_for_ai}]
-            )
-            if synthesis_response and synthesis_response.choices:
-                final_report = synthesis_response.choices[0].message.content
-        except Exception as e:
-            print(f"Excepción al llamar a SMART_MODEL: {e}")
-
+        print(f"\n-> Síntesis con {SMART_MODEL} (cubierta con {FAST_MODEL})...")
+        final_report = await hedged_completion(
+            "whale_analysis", seconds_until_news_refresh(),
+            on_partial=on_partial,
+            messages=[{"role": "system", "content": synthesizer_prompt}, {"role": "user", "content": user_content_for_ai}]
+        )
         if not final_report:
-            try:
-                print(f"\n-> Fallback al modelo rápido: {FAST_MODEL}...")
-                synthesis_response = ai_client.chat.completions.create(
-                    model=FAST_MODEL,
-                    messages=[{"role": "system", "content": synthesizer_prompt}, {"role": "user", "content": user_content_for_ai}]
-                )
-                if synthesis_response and synthesis_response.choices:
-                    final_report = synthesis_response.choices[0].message.content
-                else:
-                    return "❌ Error: Ambos modelos de IA fallaron."
-            except Exception as e:
-                print(f"Excepción al llamar a FAST_MODEL: {e}")
-                return "❌ Error crítico al generar el informe con el modelo de respaldo."
-        
+            return "❌ Error: Ambos modelos de IA fallaron."
+
         if whale_activity.get("success") and (transfers := whale_activity.get("large_transfers")):
             final_report += "\n\n<b>🔍 Transacciones Relevantes</b>\n"
             for i, tx in enumerate(transfers[:5]):
@@ -729,281 +926,244 @@ def handle_whale_analysis(params: dict, chat_id: int) -> str:
         traceback.print_exc()
         return f"❌ Error al procesar el informe para {asset_normalized}."
 
-def process_request_v2(user_message: str, history: list, chat_id: int) -> dict:
+async def route_with_llm(user_message: str) -> Optional[dict]:
+    """Clasifica la intención con la IA (advanced_router_tool). None si no hay llamada a herramienta."""
+    router_messages = [{"role": "system", "content": SYSTEM_PROMPTS["router_advanced"]}, {"role": "user", "content": f"Mensaje del usuario: '{user_message}'"}]
+    router_response = await cached_completion("router", ROUTER_CACHE_TTL, model=FAST_MODEL, messages=router_messages, tools=[advanced_router_tool], tool_choice="auto")
+    if not router_response.choices[0].message.tool_calls:
+        return None
+    tool_call = router_response.choices[0].message.tool_calls[0]
+    params = json.loads(tool_call.function.arguments)
+    if params.get("asset_name") == "NONE":
+         params["asset_name"] = asset_mapper.extract_asset_from_text(user_message)
+    params["source"] = "llm"
+    return params
+
+def next_timeframe(timeframe: str) -> str:
+    """Timeframe que ofrece el botón "Analizar en..." tras un análisis en `timeframe`."""
+    return "4h" if timeframe == "1h" else "1d" if timeframe == "4h" else "1h"
+
+def prefetch_button_targets(chat_id: int, asset: str, timeframe: str) -> None:
+    """
+    Adelanta en segundo plano los datos de los botones de un análisis técnico (análisis en
+    el siguiente timeframe, datos de la estrategia y del sentimiento) con las mismas claves
+    que usan los handlers, de modo que al pulsar el botón solo quede la síntesis de la IA.
+    """
+    symbol = asset_mapper.normalize_to_trading_pair(asset)
+    next_tf = next_timeframe(timeframe)
+    prefetcher.schedule(chat_id, {
+        ("technical", symbol, next_tf): lambda: advanced_technical_analysis_async(symbol, interval=next_tf),
+        ("data", "strategy_full", symbol, timeframe): lambda: gather_handler_data("strategy_full", {"asset_name": symbol, "timeframe": timeframe}),
+        ("data", "sentiment_check", asset): lambda: gather_handler_data("sentiment_check", {"asset_name": asset}),
+    })
+
+def cancel_prefetch(chat_id: int) -> None:
+    """El usuario ha pasado a otra cosa: se descarta lo adelantado para sus botones."""
+    prefetcher.cancel(chat_id)
+
+async def dispatch_intent(params: dict, user_message: str, history: list, chat_id: int,
+                          on_partial: PartialCallback = None) -> dict:
+    """
+    Ejecuta el handler de una intención ya clasificada (por el router local, la IA o
+    un botón). Devuelve el texto, el gráfico opcional y el activo/timeframe para los botones.
+    `on_partial` recibe el texto parcial de los handlers de síntesis que hacen streaming.
+    """
+    set_llm_context(INTERACTIVE, chat_id)
+    intention = params["intention"]
+    asset_name = params.get("asset_name")
+    if asset_name == "NONE":
+        asset_name = None
+    print(f"\n=== CLASIFICACIÓN FINAL ({params.get('source', 'llm')}) ===\nIntención: {intention}\nActivo: {asset_name if asset_name else 'N/A'}")
+    response_text = ""
+    response_chart = None
+    if intention == "specific_asset_analysis":
+        if not asset_name:
+            response_text = "Por favor, especifica qué activo quieres analizar."
+        elif asset_mapper.is_traditional_asset(asset_name):
+            response_text = await handle_traditional_market_analysis(params, chat_id)
+        else:
+            params["asset_name"] = asset_mapper.normalize_to_trading_pair(asset_name)
+            result_dict = await handle_technical_analysis_v2(params, chat_id, on_partial)
+            return {"text": result_dict["text"], "chart": result_dict["chart"],
+                    "asset": result_dict.get("asset"), "timeframe": result_dict.get("timeframe")}
+    elif intention == "chart_album":
+        if not asset_name or asset_mapper.is_traditional_asset(asset_name):
+            response_text = "Lo siento, solo puedo dibujar gráficos de criptomonedas."
+        else:
+            params["asset_name"] = asset_mapper.normalize_to_trading_pair(asset_name)
+            return await handle_chart_album(params, chat_id)
+    elif intention == "global_market_report":
+        response_text = await handle_global_market_report(chat_id, on_partial)
+    elif intention == "strategy_full":
+        if not asset_name or asset_mapper.is_traditional_asset(asset_name):
+            response_text = "Lo siento, solo puedo generar estrategias de trading para criptomonedas."
+        else:
+            params["asset_name"] = asset_mapper.normalize_to_trading_pair(asset_name)
+            response_text = await handle_advanced_strategy(params, chat_id, on_partial)
+    elif intention == "grid_setup":
+        if not asset_name or asset_mapper.is_traditional_asset(asset_name):
+            response_text = "Lo siento, solo puedo configurar grids de criptomonedas."
+        else:
+            params["asset_name"] = asset_mapper.normalize_to_trading_pair(asset_name)
+            response_text = await handle_grid_setup(params, chat_id)
+    elif intention == "ecosystem_analysis":
+        if not asset_name: response_text = "Por favor, dime de qué activo quieres analizar el ecosistema."
+        else: response_text = await handle_ecosystem_analysis(params, chat_id)
+    elif intention == "whale_analysis":
+        response_text = await handle_whale_analysis(params, chat_id, on_partial)
+    elif intention == "sentiment_check":
+        if not asset_name: response_text = "Por favor, dime de qué activo quieres el análisis de sentimiento."
+        else: response_text = await handle_sentiment_analysis(params, chat_id)
+    elif intention == "top_traded":
+        response_text = await handle_top_traded(chat_id)
+    elif intention == "top_gainers":
+        response_text = await handle_top_gainers(chat_id)
+    elif intention == "cross_reference_lists":
+        response_text = handle_cross_reference(chat_id)
+    elif intention == "general_web_query":
+        response_text = await handle_general_web_query_async(user_message, ai_client)
+    elif intention == "conversation":
+        response_text = await handle_conversation_v2(user_message, history, chat_id)
+    else:
+        response_text = "No estoy seguro de cómo procesar esa solicitud. ¿Podrías reformularla?"
+    return {"text": response_text, "chart": response_chart}
+
+async def process_request_v2(user_message: str, history: list, chat_id: int,
+                             on_partial: PartialCallback = None) -> dict:
     """
     Procesa la solicitud del usuario y ahora devuelve un diccionario 
-    con el texto de la respuesta y una ruta opcional a un gráfico.
+    con el texto de la respuesta y un gráfico opcional (la imagen en bytes).
+    Las intenciones claras se resuelven con el router local; solo las ambiguas van a la IA.
     """
+    # Las llamadas a la IA de esta petición van en la cola interactiva, por turnos con los demás chats
+    set_llm_context(INTERACTIVE, chat_id)
     try:
-        router_messages = [{"role": "system", "content": SYSTEM_PROMPTS["router_advanced"]}, {"role": "user", "content": f"Mensaje del usuario: '{user_message}'"}]
-        router_response = ai_client.chat.completions.create(model=FAST_MODEL, messages=router_messages, tools=[advanced_router_tool], tool_choice="auto")
-        if not router_response.choices[0].message.tool_calls:
-            text_response = handle_conversation_v2(user_message, history, chat_id)
-            return {"text": text_response, "chart_path": None}
-        tool_call = router_response.choices[0].message.tool_calls[0]
-        params = json.loads(tool_call.function.arguments)
-        if params.get("asset_name") == "NONE":
-             params["asset_name"] = asset_mapper.extract_asset_from_text(user_message)
-        intention = params["intention"]
-        asset_name = params.get("asset_name")
-        print(f"\n=== CLASIFICACIÓN FINAL ===\nIntención: {intention}\nActivo: {asset_name if asset_name else 'N/A'}")
-        response_text = ""
-        response_chart = None
-        if intention == "specific_asset_analysis":
-            if not asset_name:
-                response_text = "Por favor, especifica qué activo quieres analizar."
-            elif asset_mapper.is_traditional_asset(asset_name):
-                response_text = handle_traditional_market_analysis(params, chat_id)
-            else:
-                params["asset_name"] = asset_mapper.normalize_to_trading_pair(asset_name)
-                result_dict = handle_technical_analysis_v2(params, chat_id)
-                response_text = result_dict["text"]
-                response_chart = result_dict["chart_path"]
-        elif intention == "global_market_report":
-            response_text = handle_global_market_report(chat_id)
-        elif intention == "strategy_full":
-            if not asset_name or asset_mapper.is_traditional_asset(asset_name):
-                response_text = "Lo siento, solo puedo generar estrategias de trading para criptomonedas."
-            else:
-                params["asset_name"] = asset_mapper.normalize_to_trading_pair(asset_name)
-                response_text = handle_advanced_strategy(params, chat_id)
-        elif intention == "ecosystem_analysis":
-            if not asset_name: response_text = "Por favor, dime de qué activo quieres analizar el ecosistema."
-            else: response_text = handle_ecosystem_analysis(params, chat_id)
-        elif intention == "whale_analysis":
-            response_text = handle_whale_analysis(params, chat_id)
-        elif intention == "sentiment_check":
-            if not asset_name: response_text = "Por favor, dime de qué activo quieres el análisis de sentimiento."
-            else: response_text = handle_sentiment_analysis(params, chat_id)
-        elif intention == "top_traded":
-            response_text = handle_top_traded(chat_id)
-        elif intention == "top_gainers":
-            response_text = handle_top_gainers(chat_id)
-        elif intention == "cross_reference_lists":
-            response_text = handle_cross_reference(chat_id)
-        elif intention == "general_web_query":
-            response_text = handle_general_web_query(user_message, ai_client)
-        elif intention == "conversation":
-            response_text = handle_conversation_v2(user_message, history, chat_id)
-        else:
-            response_text = "No estoy seguro de cómo procesar esa solicitud. ¿Podrías reformularla?"
-        return {"text": response_text, "chart_path": response_chart}
+        params = intent_router.classify(user_message, history)
+        if params is None:
+            params = await route_with_llm(user_message)
+        checkpoint()
+        if params is None:
+            text_response = await handle_conversation_v2(user_message, history, chat_id)
+            return {"text": text_response, "chart": None}
+        return await dispatch_intent(params, user_message, history, chat_id, on_partial)
+    except LLMOverloadedError:
+        return {"text": LLM_BUSY_TEXT, "chart": None}
     except Exception as e:
         print(f"Error CRÍTICO en process_request_v2: {e}")
         traceback.print_exc()
         error_text = "❌ Ocurrió un error inesperado al procesar tu solicitud. El equipo técnico ha sido notificado."
-        return {"text": error_text, "chart_path": None}
+        return {"text": error_text, "chart": None}
 
-def generate_proactive_strategy(event: dict, capital: float) -> dict:
+async def generate_proactive_strategy(event: dict, capital: float) -> dict:
     """
     Usa la IA para generar el análisis. El resto se construye en código.
     Versión robustecida para manejar la obtención de precios.
     """
     print(f"-> Generando análisis proactivo para {event['asset']}...")
-    
-    MAX_RETRIES = 3
-    retry_count = 0
-    models_to_try = [SMART_MODEL, FAST_MODEL]
-    
-    while retry_count < MAX_RETRIES:
-        try:
-            full_data = event["full_analysis_data"]
-            analysis_summary = {
-                "asset": full_data.get("asset"),
-                "capital_for_strategy": capital,
-                "overall_sentiment": full_data.get("overall_sentiment"),
-                "whale_analysis": event.get("analysis_summary", {})
-            }
-
-            synthesizer_prompt = SYSTEM_PROMPTS["whale_analysis_final_synthesizer"].format(
-                datos_clave=json.dumps(analysis_summary, cls=NumpyJSONEncoder, indent=2)
-            )
-            
-            current_model = models_to_try[min(retry_count, len(models_to_try)-1)]
-            
-            response = ai_client.chat.completions.create(
-                model=current_model,
-                messages=[{"role": "user", "content": synthesizer_prompt}]
-            )
-            
-            if not response or not response.choices:
-                raise ValueError("La respuesta de la API de IA está vacía.")
-                
-            analysis_text = response.choices[0].message.content
-            
-            # --- INICIO DE LA CORRECIÓN ---
-            # Obtener el precio de forma más segura
-            whale_activity_data = full_data.get("whale_activity", {})
-            current_price = whale_activity_data.get('price_used', 0) # La clave correcta es 'price_used'
-            
-            # Si la clave 'price_used' no está (versiones antiguas), intentamos con las específicas
-            if current_price == 0:
-                 current_price = whale_activity_data.get('btc_price_used', 0) or whale_activity_data.get('eth_price_used', 0)
-            
-            if current_price == 0: 
-                raise ValueError("Precio actual es 0 para cálculo de estrategia")
-            # --- FIN DE LA CORRECCIÓN ---
-
-            user_profile = {"capital": capital, "risk_level": "medium", "timeframe": "1h"}
-            tech_data_mock = {
-                "current_price": current_price,
-                "key_levels": {
-                    "support": [current_price * 0.97],
-                    "resistance": [current_price * 1.03]
-                }
-            }
-            
-            # Usamos una estructura de 'scores' simulada para la función de estrategia
-            sentiment = full_data.get("overall_sentiment", {})
-            sentiment_score = sentiment.get("sentiment_score", 50)
-            technical_score = 5 if sentiment.get("classification", "").endswith("Bullish") else -5 if sentiment.get("classification", "").endswith("Bearish") else 0
-            
-            mock_scores = { "technical_analysis": technical_score, "sentiment": (sentiment_score-50)/5 }
-
-            strategy_data = generate_advanced_trading_strategy(
-                scores=mock_scores, 
-                tech_data=tech_data_mock, 
-                multi_tf_data={}, 
-                user_profile=user_profile
-            )
-
-            return {
-                "analysis_text": analysis_text,
-                "risk_management": strategy_data.get("position_sizing")
-            }
-            
-        except Exception as e:
-            retry_count += 1
-            error_msg = f"Intento {retry_count}/{MAX_RETRIES} fallido: {str(e)}"
-            print(f"Error CRÍTICO al generar la estrategia: {error_msg}")
-            
-            if retry_count >= MAX_RETRIES:
-                return {"error": f"Fallo después de {MAX_RETRIES} intentos: {str(e)}"}
-            
-            import time
-            time.sleep(2)
-
-def re_evaluate_strategy(event: dict, new_capital: float) -> str:
-    """
-    Toma un evento de estrategia existente y la reajusta para un nuevo capital.
-    Retorna formato HTML de Telegram.
-    """
-    print(f"-> Re-evaluando estrategia para {event['asset']} con capital de ${new_capital}")
+    # Por debajo de los chats interactivos y por encima del trabajo en segundo plano
+    set_llm_context(ALERTS, f"whale:{event['asset']}")
     
     try:
         full_data = event["full_analysis_data"]
+        analysis_summary = {
+            "asset": full_data.get("asset"),
+            "capital_for_strategy": capital,
+            "overall_sentiment": full_data.get("overall_sentiment"),
+            "whale_analysis": event.get("analysis_summary", {})
+        }
+
+        synthesizer_prompt = SYSTEM_PROMPTS["whale_analysis_final_synthesizer"].format(
+            datos_clave=compact_payload("proactive_strategy", analysis_summary)
+        )
+
+        # SMART_MODEL cubierto con FAST_MODEL: si uno falla o se retrasa responde el otro
+        analysis_text = await hedged_completion(
+            "proactive_strategy", None,
+            messages=[{"role": "user", "content": synthesizer_prompt}]
+        )
+        if not analysis_text:
+            raise ValueError("La respuesta de la API de IA está vacía.")
+
+        # --- INICIO DE LA CORRECIÓN ---
+        # Obtener el precio de forma más segura
         whale_activity_data = full_data.get("whale_activity", {})
-        
-        current_price = (whale_activity_data.get('btc_price_used') or 
-                        whale_activity_data.get('eth_price_used') or 0)
-        
+        current_price = whale_activity_data.get('price_used', 0) # La clave correcta es 'price_used'
+
+        # Si la clave 'price_used' no está (versiones antiguas), intentamos con las específicas
         if current_price == 0:
-            return "❌ <b>Error:</b> No se pudo obtener el precio original para el re-cálculo."
-            
+             current_price = whale_activity_data.get('btc_price_used', 0) or whale_activity_data.get('eth_price_used', 0)
+
+        if current_price == 0:
+            raise ValueError("Precio actual es 0 para cálculo de estrategia")
+        # --- FIN DE LA CORRECCIÓN ---
+
+        user_profile = {"capital": capital, "risk_level": "medium", "timeframe": "1h"}
         tech_data_mock = {
-            "current_price": current_price, 
-            "key_levels": { "support": [current_price * 0.97], "resistance": [current_price * 1.03] }
+            "current_price": current_price,
+            "key_levels": {
+                "support": [current_price * 0.97],
+                "resistance": [current_price * 1.03]
+            }
         }
-        
-        user_profile = {"capital": new_capital, "risk_level": "medium", "timeframe": "1h"}
-        
-        strategy_data = generate_advanced_trading_strategy(
-            scores={}, 
-            tech_data=tech_data_mock, 
-            multi_tf_data={}, 
+
+        # Usamos una estructura de 'scores' simulada para la función de estrategia
+        sentiment = full_data.get("overall_sentiment", {})
+        sentiment_score = sentiment.get("sentiment_score", 50)
+        technical_score = 5 if sentiment.get("classification", "").endswith("Bullish") else -5 if sentiment.get("classification", "").endswith("Bearish") else 0
+
+        mock_scores = { "technical_analysis": technical_score, "sentiment": (sentiment_score-50)/5 }
+
+        strategy_data = await run_cpu(
+            generate_advanced_trading_strategy,
+            scores=mock_scores,
+            tech_data=tech_data_mock,
+            multi_tf_data={},
             user_profile=user_profile
         )
 
-        pos_sizing = strategy_data.get("position_sizing", {})
-        
+        return {
+            "analysis_text": analysis_text,
+            "risk_management": strategy_data.get("position_sizing"),
+            "cached_strategy": CachedStrategy(event['asset'], strategy_data)
+        }
+
+    except Exception as e:
+        print(f"Error CRÍTICO al generar la estrategia: {e}")
+        return {"error": f"Fallo al generar la estrategia: {e}"}
+
+def re_evaluate_strategy(cached: CachedStrategy, capitals: List[float]) -> str:
+    """
+    Re-escala la última estrategia del chat para uno o varios capitales sin volver a
+    llamar a la IA ni recalcular la estrategia: solo el dimensionamiento vectorizado.
+    Retorna formato HTML de Telegram.
+    """
+    print(f"-> Re-escalando estrategia de {cached.asset} para capitales {capitals}")
+
+    try:
+        rows = cached.rescale(capitals)
+        if not rows:
+            return "❌ <b>Error:</b> No se pudo re-calcular la estrategia."
+
+        tiers = "\n".join(
+            f"• <b>${row['capital']:,.0f}</b> → Posición <code>${row['position_size_usd']:,.2f}</code> | "
+            f"<code>{row['leverage']}x</code> | Riesgo <code>${row['risk_amount']:,.2f}</code> "
+            f"(<code>{row['risk_percentage']:.1f}%</code>)"
+            for row in rows
+        )
+        title = f"${rows[0]['capital']:,.0f}" if len(rows) == 1 else f"{len(rows)} niveles de capital"
+
         report = f"""
-<b>🔄 Estrategia Re-ajustada para ${new_capital:,.0f}</b>
+<b>🔄 Estrategia Re-ajustada para {title}</b>
+
+<b>🎯 {cached.asset}</b> | Entrada <code>${cached.entry:,.4f}</code> | Stop <code>${cached.stop_loss:,.4f}</code>
 
 <b>💰 Nueva Gestión de Riesgo</b>
-• <b>Tamaño de Posición:</b> <code>${pos_sizing.get('position_size_usd', 0):,.2f}</code>
-• <b>Apalancamiento Sugerido:</b> <code>{pos_sizing.get('leverage', 0)}x</code>
-• <b>Riesgo por Trade:</b> <code>${pos_sizing.get('risk_amount', 0):,.2f}</code>
-• <b>Porcentaje de Riesgo:</b> <code>{pos_sizing.get('risk_percentage', 0):.1f}%</code>
+{tiers}
 
-<i>📊 Estrategia ajustada automáticamente según su nuevo capital</i>
+<i>📊 Estrategia ajustada automáticamente según su nuevo capital (riesgo {cached.risk_level})</i>
 """
-        
         return report
-        
+
     except Exception as e:
         print(f"Error al re-evaluar estrategia: {e}")
         return f"❌ <b>Error:</b> No se pudo re-calcular la estrategia. {str(e)}"
-    """
-    Toma un evento de estrategia existente y la reajusta para un nuevo capital.
-    """
-    print(f"-> Re-evaluando estrategia para {event['asset']} con capital de ${new_capital}")
-    
-    full_data = event["full_analysis_data"]
-    whale_activity_data = full_data.get("whale_activity", {})
-    
-    # Aplicamos la misma lógica de construcción de tech_data
-    current_price = whale_activity_data.get('btc_price_used') or whale_activity_data.get('eth_price_used') or 0
-    if current_price == 0:
-        return "Error: No se pudo obtener el precio original para el re-cálculo."
-        
-    tech_data_mock = {"current_price": current_price, "key_levels": {"support": [current_price * 0.95], "resistance": [current_price * 1.05]}}
-    
-    user_profile = {"capital": new_capital, "risk_level": "medium", "timeframe": "1h"}
-    sentiment_score = full_data.get("overall_sentiment", {}).get("sentiment_score", 50)
-    quant_score = (sentiment_score - 50) / 5
-    mock_scores = {"technical_analysis": quant_score, "sentiment": quant_score, "market_regime": "trending"}
-
-    strategy_data = generate_advanced_trading_strategy(
-        scores=mock_scores, tech_data=tech_data_mock, multi_tf_data={}, user_profile=user_profile
-    )
-
-    pos_sizing = strategy_data.get("position_sizing", {})
-    pos_size_str = escape_markdown_v2(f"${pos_sizing.get('position_size_usd', 0):,.2f}")
-    leverage_str = escape_markdown_v2(f"{pos_sizing.get('leverage', 0)}x")
-    risk_amount_str = escape_markdown_v2(f"${pos_sizing.get('risk_amount', 0):,.2f}")
-    
-    report = (
-        f"*🔄 Estrategia Re-ajustada para ${escape_markdown_v2(str(new_capital))}*\n\n"
-        f"*💰 Nueva Gestión de Riesgo*\n"
-        f"\\- *Tamaño de Posición:* `{pos_size_str}`\n"
-        f"\\- *Apalancamiento Sugerido:* `{leverage_str}`\n"
-        f"\\- *Riesgo por Trade:* `{risk_amount_str}`"
-    )
-    return report
-    """
-    Toma un evento de estrategia existente y la reajusta para un nuevo capital.
-    """
-    print(f"-> Re-evaluando estrategia para {event['asset']} con capital de ${new_capital}")
-    
-    full_data = event["full_analysis_data"]
-    whale_activity_data = full_data.get("whale_activity", {})
-    
-    # Aplicamos la misma lógica de construcción de tech_data
-    current_price = whale_activity_data.get('btc_price_used') or whale_activity_data.get('eth_price_used') or 0
-    if current_price == 0:
-        return "Error: No se pudo obtener el precio original para el re-cálculo."
-        
-    tech_data_mock = {"current_price": current_price, "key_levels": {"support": [current_price * 0.95], "resistance": [current_price * 1.05]}}
-    
-    user_profile = {"capital": new_capital, "risk_level": "medium", "timeframe": "1h"}
-    sentiment_score = full_data.get("overall_sentiment", {}).get("sentiment_score", 50)
-    quant_score = (sentiment_score - 50) / 5
-    mock_scores = {"technical_analysis": quant_score, "sentiment": quant_score, "market_regime": "trending"}
-
-    strategy_data = generate_advanced_trading_strategy(
-        scores=mock_scores, tech_data=tech_data_mock, multi_tf_data={}, user_profile=user_profile
-    )
-
-    pos_sizing = strategy_data.get("position_sizing", {})
-    pos_size_str = escape_markdown_v2(f"${pos_sizing.get('position_size_usd', 0):,.2f}")
-    leverage_str = escape_markdown_v2(f"{pos_sizing.get('leverage', 0)}x")
-    risk_amount_str = escape_markdown_v2(f"${pos_sizing.get('risk_amount', 0):,.2f}")
-    
-    report = (
-        f"*🔄 Estrategia Re-ajustada para ${escape_markdown_v2(str(new_capital))}*\n\n"
-        f"*💰 Nueva Gestión de Riesgo*\n"
-        f"\\- *Tamaño de Posición:* `{pos_size_str}`\n"
-        f"\\- *Apalancamiento Sugerido:* `{leverage_str}`\n"
-        f"\\- *Riesgo por Trade:* `{risk_amount_str}`"
-    )
-    return report
@@ -0,0 +1,124 @@
+# Archivo: benchmarks/bench_chart_render.py
+#
+# Compara los dos motores de dibujo de tools/chart_render.py ("mplfinance" y "fast") con el
+# mismo payload sintético: sin red ni datos reales. Desde la raíz del repositorio:
+#
+#   python -m benchmarks.bench_chart_render
+#   python -m benchmarks.bench_chart_render --candles 200 --repeat 50 --save-dir /tmp/charts
+#
+# El tiempo de cada gráfico incluye la codificación de la imagen (CHART_FORMAT, CHART_DPI...),
+# que es la misma para los dos motores; se mide también por separado para ver el dibujo neto.
+
+import io
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from PIL import Image
+from typing import Dict, List
+
+from tools.chart_render import candles_payload, render_chart, chart_savefig_options, OHLCV_COLUMNS
+
+RENDERERS = ["mplfinance", "fast"]
+
+
+def synthetic_payload(candles: int, seed: int = 0) -> Dict:
+    """Velas con paseo aleatorio, SMA20/SMA50, Bandas de Bollinger y dos niveles S/R, como los del bot."""
+    rng = np.random.default_rng(seed)
+    total = candles + 50
+    close = 100 + np.cumsum(rng.normal(0, 1, total))
+    open_ = np.roll(close, 1)
+    open_[0] = close[0]
+    spread = np.abs(rng.normal(0, 0.6, total))
+    data = pd.DataFrame({
+        "open": open_, "high": np.maximum(open_, close) + spread, "low": np.minimum(open_, close) - spread,
+        "close": close, "volume": rng.uniform(500, 1500, total),
+    }, index=pd.date_range("2024-01-01", periods=total, freq="h"))[OHLCV_COLUMNS]
+
+    closes = data["close"]
+    sma20, sma50 = closes.rolling(20).mean(), closes.rolling(50).mean()
+    std20 = closes.rolling(20).std(ddof=0)
+    plot_data = data.tail(candles)
+    overlays = [
+        (sma20.tail(candles), 'cyan', 0.7, '-'), (sma50.tail(candles), 'yellow', 0.7, '-'),
+        ((sma20 + 2 * std20).tail(candles), 'gray', 0.6, '--'), ((sma20 - 2 * std20).tail(candles), 'gray', 0.6, '--'),
+    ]
+    levels = [(float(plot_data["low"].min()), '#3498DB'), (float(plot_data["high"].max()), '#F39C12')]
+    return candles_payload(plot_data, "\nAnálisis Técnico de BTCUSDT - 1h", overlays, levels)
+
+
+def encode_seconds(image: bytes, repeat: int) -> float:
+    """Mediana de lo que cuesta solo codificar una imagen de ese tamaño con las opciones configuradas."""
+    pixels = Image.open(io.BytesIO(image))
+    timings = []
+    for _ in range(repeat):
+        options = chart_savefig_options(io.BytesIO())
+        started = time.perf_counter()
+        pixels.save(options["fname"], format=options["format"], **options["pil_kwargs"])
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def run_benchmark(candles: int, repeat: int, warmup: int, save_dir: str = None) -> Dict:
+    payload = synthetic_payload(candles)
+    results: Dict[str, Dict] = {}
+    images: Dict[str, bytes] = {}
+    for renderer in RENDERERS:
+        for _ in range(warmup):
+            render_chart(payload, renderer)
+        timings: List[float] = []
+        for _ in range(repeat):
+            result = render_chart(payload, renderer)
+            timings.append(result["render_s"])
+        images[renderer] = result["image"]
+        results[renderer] = {
+            "p50_s": round(float(np.percentile(timings, 50)), 4),
+            "p95_s": round(float(np.percentile(timings, 95)), 4),
+            "kb": round(len(result["image"]) / 1024, 1),
+        }
+        print(f"{renderer:>11}: {results[renderer]['p50_s'] * 1000:7.1f} ms p50 "
+              f"{results[renderer]['p95_s'] * 1000:7.1f} ms p95  {results[renderer]['kb']} KB")
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+            extension = "jpg" if chart_savefig_options(io.BytesIO())["format"] == "jpeg" else "png"
+            with open(os.path.join(save_dir, f"chart_{renderer}.{extension}"), "wb") as f:
+                f.write(result["image"])
+
+    encode_s = encode_seconds(images["fast"], max(repeat // 4, 3))
+    slow, fast = results["mplfinance"]["p50_s"], results["fast"]["p50_s"]
+    return {
+        "candles": candles,
+        "repeat": repeat,
+        "renderers": results,
+        "encode_s": round(encode_s, 4),
+        "speedup": round(slow / fast, 2),
+        # Solo el dibujo (sin la codificación común a los dos motores)
+        "draw_speedup": round((slow - encode_s) / max(fast - encode_s, 1e-6), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de los motores de dibujo de gráficos")
+    parser.add_argument("--candles", type=int, default=100, help="Velas por gráfico (el bot dibuja 100)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2, help="Gráficos previos por motor que no se miden")
+    parser.add_argument("--save-dir", default=None, help="Guarda la imagen de cada motor para compararlas")
+    parser.add_argument("--output", default=None, help="Guarda los resultados en JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.candles, args.repeat, args.warmup, args.save_dir)
+
+    print("\n=== Resultados ===")
+    print(f"Codificación de la imagen: {results['encode_s'] * 1000:.1f} ms (común a los dos motores)")
+    print(f"fast frente a mplfinance: {results['speedup']:.1f}x por gráfico, "
+          f"{results['draw_speedup']:.1f}x solo en el dibujo")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Archivo: benchmarks/bench_dispatcher.py
+#
+# Mide process_request_v2 de principio a fin sin red, reproduciendo una grabación de los
+# servicios externos (tools/replay.py). Desde la raíz del repositorio:
+#
+#   python -m benchmarks.bench_dispatcher --cassette fixtures/dispatcher.jsonl --record
+#   python -m benchmarks.bench_dispatcher --cassette fixtures/dispatcher.jsonl --repeat 5
+#   python -m benchmarks.bench_dispatcher --cassette fixtures/dispatcher.jsonl --latency 0
+#   python -m benchmarks.bench_dispatcher --cassette fixtures/dispatcher.jsonl --latency openrouter.ai=3 default=0.2
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import importlib
+import numpy as np
+from typing import Dict, List
+
+from tools.replay import ServiceCassette, Latency
+
+DEFAULT_MESSAGES = [
+    "análisis técnico de BTC en 1h",
+    "estrategia para ETH con 500 dólares riesgo alto",
+    "sentimiento de solana",
+    "informe del mercado de hoy",
+    "ballenas de bitcoin",
+    "qué es el halving de bitcoin",
+]
+
+
+def parse_latency(values: List[str]) -> Latency:
+    """`--latency 0.5` (fija) o `--latency openrouter.ai=3 default=0.2` (por host)."""
+    if not values:
+        return None
+    if len(values) == 1 and "=" not in values[0]:
+        return float(values[0])
+    latency = {}
+    for value in values:
+        host, seconds = value.split("=", 1)
+        latency[host] = float(seconds)
+    return latency
+
+
+async def run_benchmark(messages: List[str], repeat: int, concurrency: int, warm: bool) -> Dict:
+    dispatcher = importlib.import_module("ai_dispatcher_v2")
+    analysis_tools = importlib.import_module("tools.analysis_tools")
+    async_tools = importlib.import_module("tools.async_tools")
+
+    timings: Dict[str, List[float]] = {message: [] for message in messages}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(message: str, chat_id: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await dispatcher.process_request_v2(message, [], chat_id)
+            timings[message].append(time.perf_counter() - started)
+
+    batch_times = []
+    for run in range(repeat):
+        if not warm:
+            dispatcher.llm_cache.clear()
+            analysis_tools.clear_candle_cache()
+        started = time.perf_counter()
+        await asyncio.gather(*(timed(message, 1000 + i) for i, message in enumerate(messages)))
+        batch_times.append(time.perf_counter() - started)
+        print(f"Ronda {run + 1}/{repeat}: {batch_times[-1]:.2f}s")
+
+    await async_tools.close_http_clients()
+    return {
+        "messages": {
+            message: {
+                "runs": len(values),
+                "min_s": round(min(values), 3),
+                "p50_s": round(float(np.percentile(values, 50)), 3),
+                "p95_s": round(float(np.percentile(values, 95)), 3),
+            }
+            for message, values in timings.items() if values
+        },
+        "batch_p50_s": round(float(np.percentile(batch_times, 50)), 3),
+        "llm_calls": dispatcher.get_llm_stats()["llm_calls"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de process_request_v2 con servicios grabados")
+    parser.add_argument("--cassette", required=True, help="Archivo JSONL de la grabación")
+    parser.add_argument("--record", action="store_true", help="Graba contra los servicios reales (necesita red y claves)")
+    parser.add_argument("--latency", nargs="+", default=None, help="Latencia inyectada: segundos o host=segundos")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Factor sobre la latencia grabada")
+    parser.add_argument("--messages", nargs="+", default=DEFAULT_MESSAGES)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1, help="Mensajes procesados a la vez")
+    parser.add_argument("--warm", action="store_true", help="No vaciar las cachés entre rondas")
+    parser.add_argument("--output", default=None, help="Guarda los resultados en JSON")
+    args = parser.parse_args()
+
+    # Las métricas de la ejecución se devuelven en el resultado; no se mezclan con las del bot
+    os.environ.setdefault("LLM_METRICS_FILE", "")
+    mode = "record" if args.record else "replay"
+    if mode == "replay":
+        ServiceCassette.apply_environment(args.cassette)
+        # Sin proveedor real detrás, el límite de ritmo del planificador solo falsearía la medida
+        os.environ.setdefault("LLM_FREE_MODEL_RPM", "100000")
+        os.environ.setdefault("LLM_MODEL_RPM", "100000")
+
+    with ServiceCassette(args.cassette, mode=mode, latency=parse_latency(args.latency),
+                         latency_scale=args.latency_scale) as cassette:
+        results = asyncio.run(run_benchmark(args.messages, 1 if args.record else args.repeat,
+                                            args.concurrency, args.warm))
+        results["cassette"] = cassette.stats()
+
+    print("\n=== Resultados ===")
+    for message, stats in results["messages"].items():
+        print(f"{stats['p50_s']:>8.2f}s p50 {stats['p95_s']:>8.2f}s p95  {message}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,26 +4,46 @@ import os
 import logging
 import asyncio
 import re
+import time
 import threading
 import traceback
 import html
 from dotenv import load_dotenv
 
 from watcher import start_watcher_thread
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
-from telegram.error import BadRequest
+from telegram.error import BadRequest, RetryAfter
 from telegram.constants import ParseMode
 
 from ai_dispatcher_v2 import (
     process_request_v2,
+    dispatch_intent,
     generate_proactive_strategy, 
-    re_evaluate_strategy
+    re_evaluate_strategy,
+    get_llm_stats,
+    next_timeframe,
+    prefetch_button_targets,
+    cancel_prefetch,
+    LLM_BUSY_TEXT
 )
-from memory import add_to_history, get_history
+from memory import add_to_history, get_history, store_data, retrieve_data
+from tools.async_tools import close_http_clients
+from tools.llm_metrics import start_metrics_server
+from tools.llm_scheduler import LLMOverloadedError
+from tools.chat_queue import ChatWorkQueue, ChatQueueFull, RequestSuperseded, checkpoint, is_superseded
+from tools.chart_pool import chart_pool
+from tools.chart_tools import get_chart_cache_stats
 
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_API_KEY")
+# Actualizaciones atendidas a la vez: el dispatcher es asíncrono y no ocupa hilos mientras espera
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "256"))
+# Segundos mínimos entre ediciones de un mensaje en streaming (Telegram limita ~1 edición/s por chat)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+# Margen para las etiquetas de cierre y el cursor que se añaden al texto parcial
+STREAM_PREVIEW_LENGTH = 4000
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -31,7 +51,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-generated_strategies = {}
+# Peticiones de cada chat en orden (CHAT_QUEUE_CONCURRENCY a la vez); los botones sustituyen a los anteriores del mismo tipo
+chat_queue = ChatWorkQueue()
 
 def escape_html_tags(text: str) -> str:
     """Función de ayuda para escapar HTML de forma segura, permitiendo etiquetas específicas."""
@@ -46,23 +67,126 @@ def escape_html_tags(text: str) -> str:
     # Limpia cualquier etiqueta HTML no soportada que pudiera haberse colado
     return re.sub(r'</?(ul|li|h[1-6])>', '', escaped_text)
 
+def close_open_html_tags(text: str) -> str:
+    """Cierra, en orden inverso, las etiquetas permitidas que un texto parcial deja abiertas."""
+    open_tags = []
+    for closing, tag in re.findall(r'<(/?)(b|i|code|pre)>', text):
+        if not closing:
+            open_tags.append(tag)
+        elif open_tags and open_tags[-1] == tag:
+            open_tags.pop()
+    return text + "".join(f"</{tag}>" for tag in reversed(open_tags))
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+class StreamingReply:
+    """
+    Mensaje de Telegram que se va editando con el texto parcial de la IA. Envía el
+    primer fragmento en cuanto llega, limita las ediciones a una cada
+    STREAM_EDIT_INTERVAL segundos y mantiene el HTML válido en cada envío.
+    """
+
+    def __init__(self, bot, chat_id: int, interval: float = STREAM_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.interval = interval
+        self.message_id = None
+        self.last_rendered = ""
+        self.next_edit_at = 0.0
+
+    @staticmethod
+    def render_partial(text: str) -> str:
+        text = text[:STREAM_PREVIEW_LENGTH]
+        # Una etiqueta a medio escribir ("<b" o "</i") se omite hasta que llegue completa
+        text = re.sub(r'<[^>]*$', '', text)
+        return close_open_html_tags(escape_html_tags(text)) + " ▌"
+
+    async def update(self, text: str) -> None:
+        """Callback on_partial del dispatcher: se descartan los fragmentos dentro del intervalo."""
+        if is_superseded():
+            return
+        now = time.monotonic()
+        if self.message_id is not None and now < self.next_edit_at:
+            return
+        rendered = self.render_partial(text)
+        if rendered == self.last_rendered or not re.sub(r'<[^>]+>', '', rendered)[:-2].strip():
+            return
+        self.next_edit_at = now + self.interval
+        try:
+            if self.message_id is None:
+                message = await self.bot.send_message(chat_id=self.chat_id, text=rendered, parse_mode=ParseMode.HTML)
+                self.message_id = message.message_id
+            else:
+                await self.bot.edit_message_text(chat_id=self.chat_id, message_id=self.message_id,
+                                                 text=rendered, parse_mode=ParseMode.HTML)
+            self.last_rendered = rendered
+        except RetryAfter as e:
+            self.next_edit_at = now + _retry_after_seconds(e)
+        except BadRequest as e:
+            logger.debug(f"Edición parcial descartada: {e}")
+
+    async def discard(self) -> None:
+        """Retira el borrador de una respuesta que ya no se va a terminar."""
+        if self.message_id is None:
+            return
+        try:
+            await self.bot.delete_message(chat_id=self.chat_id, message_id=self.message_id)
+        except BadRequest as e:
+            logger.debug(f"No se pudo retirar el borrador: {e}")
+        self.message_id = None
+
+    async def finalize(self, text: str, reply_markup=None) -> bool:
+        """
+        Sustituye el texto parcial por la respuesta final (con los botones). Devuelve False
+        si no llegó a enviarse ningún parcial y el mensaje debe mandarse de la forma habitual.
+        """
+        if self.message_id is None:
+            return False
+        if not text or len(text) > TELEGRAM_MAX_MESSAGE_LENGTH:
+            # No cabe en una edición: se retira el borrador y se envía como mensaje normal
+            await self.discard()
+            return False
+        for attempt in range(2):
+            try:
+                await self.bot.edit_message_text(chat_id=self.chat_id, message_id=self.message_id,
+                                                 text=escape_html_tags(text), parse_mode=ParseMode.HTML,
+                                                 reply_markup=reply_markup)
+                return True
+            except RetryAfter as e:
+                if attempt == 0:
+                    await asyncio.sleep(_retry_after_seconds(e))
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    return True
+                logger.error(f"Error de BadRequest al editar mensaje: {e}. Mensaje: {text}")
+                plain_text = re.sub(r'<[^>]+>', '', text)
+                await self.bot.edit_message_text(chat_id=self.chat_id, message_id=self.message_id,
+                                                 text=f"Error de formato. Mostrando en texto plano:\n\n{plain_text}",
+                                                 reply_markup=reply_markup)
+                return True
+        return True
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     welcome_message = "🚀 <b>Agente de Trading Proactivo v5.1</b>\n\nSoy tu asistente de IA para trading. Pídeme un análisis o una estrategia. Ahora con botones de acción rápida y envío de gráficos mejorado."
     await update.message.reply_html(welcome_message)
 
 async def adjust_strategy_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.effective_chat.id
-    if chat_id not in generated_strategies:
-        await update.message.reply_text("Primero debe generarse una alerta de ballenas para poder ajustar una estrategia.")
+    cached_strategy = retrieve_data(chat_id, 'last_strategy')
+    if cached_strategy is None:
+        await update.message.reply_text("Primero debe generarse una estrategia (o una alerta de ballenas) para poder ajustarla.")
         return
     try:
-        new_capital = float(context.args[0])
-    except (IndexError, ValueError):
-        await update.message.reply_text("Por favor, proporciona un capital válido. Ejemplo: /ajustar 500")
+        capitals = [float(arg.replace(',', '').replace('$', '')) for arg in context.args]
+        if not capitals or any(capital <= 0 for capital in capitals):
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("Por favor, proporciona uno o varios capitales válidos. Ejemplo: /ajustar 500 o /ajustar 100 500 1000")
         return
-    await update.message.reply_text(f"🔄 Re-ajustando la última estrategia para un capital de ${new_capital}...")
-    last_event = generated_strategies[chat_id]
-    adjusted_report = await asyncio.to_thread(re_evaluate_strategy, last_event, new_capital)
+    # El re-escalado es vectorizado y no llama a la IA: se responde al instante
+    adjusted_report = re_evaluate_strategy(cached_strategy, capitals)
     await context.bot.send_message(chat_id=chat_id, text=adjusted_report, parse_mode=ParseMode.HTML)
 
 async def get_id_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -70,31 +194,130 @@ async def get_id_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     message = f"El ID de este chat es: <code>{chat_id}</code>"
     await update.message.reply_html(message)
 
-async def handle_any_response(chat_id: int, context: ContextTypes.DEFAULT_TYPE, response_data: dict):
+def _fmt_seconds(value) -> str:
+    return f"{value:.1f}s" if value is not None else "-"
+
+def format_stats_report(stats: dict) -> str:
+    """Resumen en HTML de collect_stats() para el comando /stats."""
+    lines = ["<b>📊 Métricas de la IA</b>"]
+    total_calls, total_cost = 0, 0.0
+    for handler, models in stats.get("llm_calls", {}).items():
+        lines.append(f"\n<b>{html.escape(handler)}</b>")
+        for model, m in models.items():
+            total_calls += m["calls"]
+            total_cost += m["cost_usd"]
+            lines.append(
+                f"• <code>{html.escape(model.split('/')[-1])}</code>: {m['calls']} llamadas, caché {m['cache_hit_rate']:.0f}%, "
+                f"p50 {_fmt_seconds(m['wall_s']['p50'])} / p95 {_fmt_seconds(m['wall_s']['p95'])}, "
+                f"1er token {_fmt_seconds(m['ttft_s']['p50'])}, tokens {m['prompt_tokens']}/{m['completion_tokens']}, "
+                f"${m['cost_usd']:.4f}" + (f", {m['errors']} errores" if m["errors"] else "")
+            )
+    if total_calls == 0:
+        lines.append("\nAún no se ha llamado a la IA.")
+    else:
+        lines.append(f"\n<b>Total:</b> {total_calls} llamadas, ${total_cost:.4f}")
+
+    latency = stats.get("model_latency", {})
+    for kind, label in (("completion", "total"), ("first_token", "hasta el 1er token")):
+        if not latency.get(kind):
+            continue
+        lines.append(f"\n<b>Latencia por modelo (síntesis cubiertas, {label})</b>")
+        for model, m in latency[kind].items():
+            lines.append(f"• <code>{html.escape(model.split('/')[-1])}</code>: p50 {m['p50_s']}s, p90 {m['p90_s']}s "
+                         f"({m['samples']} muestras, {m['censored']} cortadas)")
+    if prompts := stats.get("prompt_size"):
+        lines.append("\n<b>Tamaño de los prompts (tokens)</b>")
+        for handler, p in prompts.items():
+            lines.append(f"• {html.escape(handler)}: {p['avg_tokens_before']} → {p['avg_tokens_after']} (-{p['reduction_pct']}%)")
+
+    if prefetch := stats.get("prefetch"):
+        lines.append(f"\n<b>Prefetch de botones:</b> {prefetch['used']} aprovechados de {prefetch['scheduled']} "
+                     f"({prefetch['cancelled']} cancelados, {prefetch['expired']} caducados, {prefetch['failed']} fallidos)")
+
+    if scheduler := stats.get("scheduler"):
+        lines.append("\n<b>Planificador de la IA</b>")
+        for model, s in scheduler.items():
+            granted = ", ".join(f"{p} {n}" for p, n in s["granted"].items() if n) or "sin turnos"
+            rejected = sum(s["rejected"].values())
+            wait = s["wait"].get("interactive", {}).get("p95_s")
+            lines.append(f"• <code>{html.escape(model.split('/')[-1])}</code> ({s['rpm']:g}/min): {granted}"
+                         + (f", espera interactiva p95 {_fmt_seconds(wait)}" if wait is not None else "")
+                         + (f", {rejected} rechazadas" if rejected else "")
+                         + (f", {s['rate_limited']} x 429" if s["rate_limited"] else ""))
+
+    if queue := stats.get("chat_queue"):
+        lines.append(f"\n<b>Cola por chat:</b> {queue['running']} en curso, {queue['queued']} en espera "
+                     f"(máx. {queue['max_depth_seen']} en un chat), espera p95 {_fmt_seconds(queue['wait_p95_s'])}, "
+                     f"{queue['superseded_queued'] + queue['superseded_running']} sustituidas, {queue['rejected']} rechazadas")
+
+    if charts := stats.get("chart_pool"):
+        lines.append(f"\n<b>Gráficos:</b> {charts['rendered']} en {charts['workers']} procesos, "
+                     f"dibujo p50 {_fmt_seconds(charts['render_s']['p50'])} / p95 {_fmt_seconds(charts['render_s']['p95'])}, "
+                     f"cola p95 {_fmt_seconds(charts['queue_s']['p95'])}"
+                     + (f", {charts['rejected']} omitidos por cola llena" if charts["rejected"] else "")
+                     + (f", {charts['timeouts'] + charts['failed']} fallidos" if charts["timeouts"] + charts["failed"] else ""))
+    if (chart_cache := stats.get("chart_cache")) and chart_cache.get("requests"):
+        lines.append(f"• Caché de gráficos: {chart_cache['hit_rate_pct']:.0f}% de aciertos, "
+                     f"{chart_cache['entries']} gráficos ({chart_cache['memory_mb']} MB)")
+
+    report = "\n".join(lines)
+    if len(report) > TELEGRAM_MAX_MESSAGE_LENGTH:
+        report = report[:TELEGRAM_MAX_MESSAGE_LENGTH - 20].rsplit("\n", 1)[0] + "\n…"
+    return report
+
+def collect_stats() -> dict:
+    """Métricas de la IA más la cola de peticiones por chat y el pool de gráficos (para /stats y el endpoint)."""
+    return {**get_llm_stats(), "chat_queue": chat_queue.stats(), "chart_pool": chart_pool.stats(),
+            "chart_cache": get_chart_cache_stats()}
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_html(format_stats_report(collect_stats()))
+
+async def handle_any_response(chat_id: int, context: ContextTypes.DEFAULT_TYPE, response_data: dict,
+                              stream: StreamingReply = None):
     """
     Función centralizada para enviar cualquier tipo de respuesta, manejando la lógica de mensajes separados.
+    Si la respuesta se mostró en streaming, el texto final se escribe sobre ese mensaje.
     """
     text_response = response_data.get("text")
-    chart_path = response_data.get("chart_path")
+    chart = response_data.get("chart")
+    album = response_data.get("album")
     asset = response_data.get("asset")
     timeframe = response_data.get("timeframe")
 
     try:
-        # 1. Enviar el gráfico primero, si existe.
-        if chart_path and os.path.exists(chart_path):
-            await context.bot.send_photo(chat_id=chat_id, photo=open(chart_path, 'rb'))
-            os.remove(chart_path)
+        # Varios gráficos (álbum multi-timeframe): una sola subida, con el texto como pie
+        if album:
+            caption = escape_html_tags(text_response) or None
+            if len(album) == 1:
+                await context.bot.send_photo(chat_id=chat_id, photo=album[0][1], caption=caption,
+                                             parse_mode=ParseMode.HTML)
+            else:
+                await context.bot.send_media_group(chat_id=chat_id, media=[
+                    InputMediaPhoto(media=image, caption=caption if i == 0 else None, parse_mode=ParseMode.HTML)
+                    for i, (_, image) in enumerate(album)
+                ])
+            return
+
+        keyboard = []
+        if asset:
+            next_tf = next_timeframe(timeframe)
+            keyboard.append([
+                InlineKeyboardButton(f"📊 Analizar en {next_tf}", callback_data=f"reanalyze:{asset}:{next_tf}"),
+                InlineKeyboardButton("💡 Generar Estrategia", callback_data=f"strategy:{asset}:{timeframe}"),
+                InlineKeyboardButton("📰 Ver Sentimiento", callback_data=f"sentiment:{asset}"),
+            ])
+            keyboard.append([InlineKeyboardButton("🖼️ Gráficos 15m · 1h · 4h · 1d", callback_data=f"album:{asset}")])
+        reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+
+        streamed = stream is not None and await stream.finalize(text_response, reply_markup)
+
+        # 1. Enviar el gráfico primero, si existe (tras el texto si este ya se mostró en streaming).
+        if chart:
+            await context.bot.send_photo(chat_id=chat_id, photo=chart)
 
         # 2. Enviar el texto después, si existe.
-        if text_response:
-            keyboard = []
-            if asset:
-                next_tf = "4h" if timeframe == "1h" else "1d" if timeframe == "4h" else "1h"
-                keyboard.append(InlineKeyboardButton(f"📊 Analizar en {next_tf}", callback_data=f"reanalyze:{asset}:{next_tf}"))
-                keyboard.append(InlineKeyboardButton("💡 Generar Estrategia", callback_data=f"strategy:{asset}:{timeframe}"))
-                keyboard.append(InlineKeyboardButton("📰 Ver Sentimiento", callback_data=f"sentiment:{asset}"))
-            reply_markup = InlineKeyboardMarkup([keyboard]) if keyboard else None
-            
+        if text_response and not streamed:
             clean_text = escape_html_tags(text_response)
             await context.bot.send_message(
                 chat_id=chat_id, 
@@ -102,6 +325,10 @@ async def handle_any_response(chat_id: int, context: ContextTypes.DEFAULT_TYPE,
                 parse_mode=ParseMode.HTML,
                 reply_markup=reply_markup
             )
+
+        # 3. Mientras el usuario lee, se adelantan los datos de los botones.
+        if asset:
+            prefetch_button_targets(chat_id, asset, timeframe)
     except BadRequest as e:
         logger.error(f"Error de BadRequest al enviar mensaje: {e}. Mensaje: {text_response}")
         plain_text = re.sub(r'<[^>]+>', '', text_response)
@@ -110,22 +337,80 @@ async def handle_any_response(chat_id: int, context: ContextTypes.DEFAULT_TYPE,
         logger.error(f"Error general al enviar mensaje: {e}")
         await context.bot.send_message(chat_id=chat_id, text="Ocurrió un error inesperado al enviar la respuesta.")
 
+async def run_in_chat_queue(context: ContextTypes.DEFAULT_TYPE, chat_id: int, kind: str, job,
+                            stream: StreamingReply, supersede: bool = False) -> None:
+    """Ejecuta `job` en la cola del chat; avisa si está llena y limpia lo que deja una petición sustituida."""
+    try:
+        await chat_queue.run(chat_id, kind, job, supersede=supersede)
+    except RequestSuperseded:
+        logger.info(f"Petición '{kind}' del chat {chat_id} sustituida por una más reciente.")
+        await stream.discard()
+    except ChatQueueFull:
+        await context.bot.send_message(chat_id=chat_id, text="⏳ Todavía estoy con tus peticiones anteriores. Espera a que termine alguna antes de pedir más.")
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Maneja los mensajes de texto del usuario."""
     chat_id = update.effective_chat.id
     user_message = update.message.text
     logger.info(f"Usuario '{update.effective_user.first_name}' ({chat_id}): {user_message}")
+    # Un mensaje nuevo deja sin uso lo adelantado para los botones anteriores
+    cancel_prefetch(chat_id)
     
     await context.bot.send_chat_action(chat_id=chat_id, action='typing')
     
-    history = get_history(chat_id)
-    response_data = await asyncio.to_thread(process_request_v2, user_message, history, chat_id)
-    
-    add_to_history(chat_id, "user", user_message)
-    if response_data.get("text"):
-        add_to_history(chat_id, "assistant", response_data["text"])
-    
-    await handle_any_response(chat_id, context, response_data)
+    stream = StreamingReply(context.bot, chat_id)
+
+    async def answer() -> None:
+        # El historial se lee al llegar el turno: incluye las respuestas anteriores de la cola
+        history = get_history(chat_id)
+        response_data = await process_request_v2(user_message, history, chat_id, on_partial=stream.update)
+        checkpoint()
+        
+        add_to_history(chat_id, "user", user_message)
+        if response_data.get("text"):
+            add_to_history(chat_id, "assistant", response_data["text"])
+        
+        await handle_any_response(chat_id, context, response_data, stream)
+
+    await run_in_chat_queue(context, chat_id, "message", answer, stream)
+
+async def run_intent(context: ContextTypes.DEFAULT_TYPE, chat_id: int, params: dict, user_message: str,
+                     kind: str) -> None:
+    """
+    Despacha una intención ya conocida (botón o comando, sin router) en la cola del chat.
+    Una petición nueva del mismo `kind` sustituye a la anterior.
+    """
+    stream = StreamingReply(context.bot, chat_id)
+
+    async def answer() -> None:
+        history = get_history(chat_id)
+        try:
+            response_data = await dispatch_intent(params, user_message, history, chat_id, on_partial=stream.update)
+        except LLMOverloadedError:
+            response_data = {"text": LLM_BUSY_TEXT}
+        except Exception as e:
+            logger.error(f"Error al despachar {kind}: {e}", exc_info=True)
+            response_data = {"text": "❌ Ocurrió un error inesperado al procesar tu solicitud. El equipo técnico ha sido notificado."}
+        checkpoint()
+        
+        add_to_history(chat_id, "user", user_message)
+        if response_data.get("text"):
+            add_to_history(chat_id, "assistant", response_data["text"])
+
+        await handle_any_response(chat_id, context, response_data, stream)
+
+    await run_in_chat_queue(context, chat_id, kind, answer, stream, supersede=True)
+
+async def album_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/graficos <activo>: el activo en 15m, 1h, 4h y 1d en un solo álbum."""
+    chat_id = update.effective_chat.id
+    if not context.args:
+        await update.message.reply_text("Indica el activo. Ejemplo: /graficos BTC")
+        return
+    asset = context.args[0]
+    await context.bot.send_chat_action(chat_id=chat_id, action='upload_photo')
+    params = {"intention": "chart_album", "asset_name": asset, "source": "command"}
+    await run_intent(context, chat_id, params, f"Gráficos de {asset}", "button:album")
 
 async def button_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Maneja las pulsaciones de los botones inline."""
@@ -142,26 +427,29 @@ async def button_callback_handler(update: Update, context: ContextTypes.DEFAULT_
     action = parts[0]
     asset = parts[1]
     
+    # Los botones ya traen la intención y los parámetros: se despachan directamente, sin router
     user_message = ""
+    params = {}
     if action == 'reanalyze':
         timeframe = parts[2]
         user_message = f"Análisis de {asset} en {timeframe}"
+        params = {"intention": "specific_asset_analysis", "asset_name": asset, "timeframe": timeframe}
     elif action == 'strategy':
         timeframe = parts[2]
         user_message = f"Estrategia para {asset} en {timeframe} con $1000"
+        params = {"intention": "strategy_full", "asset_name": asset, "timeframe": timeframe, "capital": 1000, "risk_level": "medium"}
     elif action == 'sentiment':
         user_message = f"Sentimiento de {asset}"
+        params = {"intention": "sentiment_check", "asset_name": asset}
+    elif action == 'album':
+        user_message = f"Gráficos de {asset}"
+        params = {"intention": "chart_album", "asset_name": asset}
     
     if not user_message: return
+    params["source"] = "button"
 
-    history = get_history(chat_id)
-    response_data = await asyncio.to_thread(process_request_v2, user_message, history, chat_id)
-    
-    add_to_history(chat_id, "user", user_message)
-    if response_data.get("text"):
-        add_to_history(chat_id, "assistant", response_data["text"])
-
-    await handle_any_response(chat_id, context, response_data)
+    # Pulsar de nuevo un botón del mismo tipo (p. ej. otro timeframe) sustituye a la pulsación anterior
+    await run_intent(context, chat_id, params, user_message, f"button:{action}")
         
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error(f"Excepción al manejar un update:", exc_info=context.error)
@@ -222,7 +510,7 @@ async def handle_whale_event(event: dict, context: ContextTypes.DEFAULT_TYPE):
         )
         await context.bot.send_message(chat_id=TARGET_CHAT_ID, text=alert_message, parse_mode=ParseMode.HTML)
         
-        report_data = await asyncio.to_thread(generate_proactive_strategy, event, 1000)
+        report_data = await generate_proactive_strategy(event, 1000)
         
         if "error" in report_data:
             error_msg = f"❌ No se pudo generar el informe estratégico para <b>{asset}</b>. Razón: {report_data['error']}"
@@ -233,14 +521,33 @@ async def handle_whale_event(event: dict, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_message(chat_id=TARGET_CHAT_ID, text=final_report_message, parse_mode=ParseMode.HTML)
         
         print("✅ ¡Informe final enviado con éxito!")
-        generated_strategies[TARGET_CHAT_ID] = event
+        store_data(TARGET_CHAT_ID, 'last_strategy', report_data["cached_strategy"])
     except Exception as e:
         print(f"Error CRÍTICO durante el manejo del evento de ballena: {e}")
         traceback.print_exc()
 
+async def start_services(application: Application) -> None:
+    application.bot_data["metrics_server"] = await start_metrics_server(collect_stats)
+    # Los procesos de gráficos se calientan antes de la primera petición
+    await chart_pool.start()
+
+async def shutdown_services(application: Application) -> None:
+    if server := application.bot_data.get("metrics_server"):
+        server.close()
+        await server.wait_closed()
+    await close_http_clients()
+    chart_pool.shutdown()
+
 def main() -> None:
     logger.info("🚀 Iniciando Agente de Trading Proactivo v5.1...")
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .post_init(start_services)
+        .post_shutdown(shutdown_services)
+        .build()
+    )
     
     loop = asyncio.get_event_loop()
     def thread_safe_callback(event: dict):
@@ -251,6 +558,8 @@ def main() -> None:
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("ajustar", adjust_strategy_command))
     application.add_handler(CommandHandler("id", get_id_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("graficos", album_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_handler(CallbackQueryHandler(button_callback_handler))
     application.add_error_handler(error_handler)
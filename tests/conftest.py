@@ -0,0 +1,7 @@
+# Archivo: tests/conftest.py
+
+import os
+import sys
+
+# Los módulos del bot se importan desde la raíz del repositorio (tools.*, ai_dispatcher_v2, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,104 @@
+# Archivo: tests/test_cache_tools.py
+
+import asyncio
+import os
+
+from tools import cache_tools
+from tools.cache_tools import TieredCache
+
+
+def test_entry_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_tools.time, "time", lambda: now[0])
+    cache = TieredCache("test")
+    cache.set("k", "v", ttl=10)
+    assert cache.get("k") == "v"
+    now[0] += 11
+    assert cache.get("k") is None
+
+
+def test_non_positive_ttl_is_not_stored():
+    cache = TieredCache("test")
+    cache.set("k", "v", ttl=0)
+    assert cache.get("k") is None
+
+
+def test_lru_evicts_least_recently_used_entry():
+    cache = TieredCache("test", max_entries=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_max_bytes_bounds_memory():
+    cache = TieredCache("test", max_bytes=2500)
+    for key in "abc":
+        cache.set(key, b"x" * 1000, ttl=60)
+    assert cache.memory_bytes() <= 2500
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+
+def test_disk_round_trip_through_aget(tmp_path):
+    cache = TieredCache("test", disk_dir=str(tmp_path))
+    cache.set("k", {"value": 42}, ttl=60)
+    cache.flush_disk()
+    cache.clear(disk=False)
+
+    assert asyncio.run(cache.aget("k", "ns")) == {"value": 42}
+    assert cache.stats()["ns"]["disk_hits"] == 1
+    # Tras leerlo del disco vuelve a la memoria
+    assert cache.get("k", "ns") == {"value": 42}
+    assert cache.stats()["ns"]["hits"] == 1
+
+
+def test_disk_index_is_rebuilt_on_start(tmp_path):
+    cache = TieredCache("test", disk_dir=str(tmp_path))
+    cache.set("k", "v", ttl=60)
+    cache.flush_disk()
+
+    reopened = TieredCache("test", disk_dir=str(tmp_path))
+    assert reopened.disk_bytes() == cache.disk_bytes() > 0
+    assert reopened.get("k") == "v"
+
+
+def test_disk_bound_evicts_oldest_files(tmp_path, monkeypatch):
+    def no_listdir(path):
+        raise AssertionError("no se debe listar la carpeta al escribir")
+
+    cache = TieredCache("test", disk_dir=str(tmp_path), max_disk_bytes=2500)
+    monkeypatch.setattr(cache_tools.os, "listdir", no_listdir)
+    for key in "abc":
+        cache.set(key, b"x" * 1000, ttl=60)
+    cache.flush_disk()
+
+    files = sorted(os.scandir(tmp_path), key=lambda entry: entry.name)
+    assert [entry.name for entry in files] == ["b.pkl", "c.pkl"]
+    assert cache.disk_bytes() == sum(entry.stat().st_size for entry in files) <= 2500
+
+
+def test_clear_empties_disk(tmp_path):
+    cache = TieredCache("test", disk_dir=str(tmp_path))
+    for key in "ab":
+        cache.set(key, key, ttl=60)
+    cache.clear()
+    assert os.listdir(tmp_path) == []
+    assert cache.disk_bytes() == 0
+    assert cache.get("a") is None
+
+
+def test_prune_disk_removes_expired_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_tools.time, "time", lambda: now[0])
+    cache = TieredCache("test", disk_dir=str(tmp_path))
+    cache.set("old", 1, ttl=10)
+    cache.set("new", 2, ttl=100)
+    cache.flush_disk()
+
+    now[0] += 50
+    assert cache.prune_disk() == 1
+    assert os.listdir(tmp_path) == ["new.pkl"]
@@ -0,0 +1,116 @@
+# Archivo: tests/test_chat_queue.py
+
+import asyncio
+
+import pytest
+
+from tools.chat_queue import ChatWorkQueue, ChatQueueFull, RequestSuperseded, checkpoint
+
+
+async def outcome(queue, chat_id, kind, factory, supersede=False):
+    """Resultado de la petición o el nombre de la excepción (las cancelaciones no salen de la tarea)."""
+    try:
+        return await queue.run(chat_id, kind, factory, supersede=supersede)
+    except (RequestSuperseded, ChatQueueFull) as e:
+        return type(e).__name__
+
+
+def test_requests_of_a_chat_run_in_arrival_order():
+    order = []
+
+    async def job(name):
+        order.append(f"{name}:start")
+        await asyncio.sleep(0.01)
+        order.append(f"{name}:end")
+        return name
+
+    async def main():
+        queue = ChatWorkQueue(concurrency=1, max_depth=5)
+        results = await asyncio.gather(*(outcome(queue, 1, "analysis", lambda n=n: job(n)) for n in "abc"))
+        return results, queue.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == ["a", "b", "c"]
+    assert order == ["a:start", "a:end", "b:start", "b:end", "c:start", "c:end"]
+    assert stats["completed"] == 3 and stats["active_chats"] == 0
+
+
+def test_supersede_drops_queued_and_stops_running_request():
+    async def main():
+        queue = ChatWorkQueue(concurrency=1, max_depth=5)
+        gate = asyncio.Event()
+        reached = []
+
+        async def slow():
+            await gate.wait()
+            reached.append("slow")
+            checkpoint()
+            return "slow"
+
+        async def fast(name):
+            return name
+
+        running = asyncio.create_task(outcome(queue, 1, "button", slow))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(outcome(queue, 1, "button", lambda: fast("queued")))
+        other = asyncio.create_task(outcome(queue, 1, "other", lambda: fast("other")))
+        await asyncio.sleep(0)
+        newest = asyncio.create_task(outcome(queue, 1, "button", lambda: fast("newest"), supersede=True))
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(running, queued, other, newest), reached, queue.stats()
+
+    results, reached, stats = asyncio.run(main())
+    assert results == ["RequestSuperseded", "RequestSuperseded", "other", "newest"]
+    # La que estaba en curso llegó a su checkpoint antes de detenerse
+    assert reached == ["slow"]
+    assert stats["superseded_queued"] == 1 and stats["superseded_running"] == 1
+
+
+def test_full_chat_rejects_new_requests_but_not_other_chats():
+    async def main():
+        queue = ChatWorkQueue(concurrency=1, max_depth=2)
+        gate = asyncio.Event()
+
+        async def wait():
+            await gate.wait()
+            return "ok"
+
+        first = [asyncio.create_task(outcome(queue, 1, "analysis", wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        rejected = await outcome(queue, 1, "analysis", wait)
+        other_chat = asyncio.create_task(outcome(queue, 2, "analysis", wait))
+        await asyncio.sleep(0)
+        gate.set()
+        return rejected, await asyncio.gather(*first, other_chat), queue.stats()
+
+    rejected, results, stats = asyncio.run(main())
+    assert rejected == "ChatQueueFull"
+    assert results == ["ok", "ok", "ok"]
+    assert stats["rejected"] == 1
+
+
+def test_checkpoint_outside_queue_is_a_no_op():
+    checkpoint()
+
+
+def test_cancelled_waiter_frees_its_slot():
+    async def main():
+        queue = ChatWorkQueue(concurrency=1, max_depth=2)
+        gate = asyncio.Event()
+
+        async def wait():
+            await gate.wait()
+            return "ok"
+
+        running = asyncio.create_task(outcome(queue, 1, "a", wait))
+        waiting = asyncio.create_task(outcome(queue, 1, "a", wait))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        depth = queue.depth(1)
+        gate.set()
+        return depth, await running
+
+    assert asyncio.run(main()) == (1, "ok")
@@ -0,0 +1,57 @@
+# Archivo: tests/test_grid_simulator.py
+
+import pandas as pd
+import pytest
+
+from tools.grid_simulator import simulate_grid
+
+
+def candles(rows):
+    """Velas (open, high, low, close) horarias a partir de tuplas."""
+    index = pd.date_range("2026-01-01", periods=len(rows), freq="h")
+    return pd.DataFrame(rows, columns=["open", "high", "low", "close"], index=index)
+
+
+# Grid 90-100-110 empezando en 100: el par alto arranca con inventario y el bajo esperando compra
+PATH = candles([
+    (100, 100, 100, 100),
+    (100, 111, 100.5, 108),  # vende el par alto en 110
+    (108, 99, 89, 95),       # compra en 90 y en 100
+    (95, 105, 95, 100),      # vende el par bajo en 100
+])
+
+
+def test_grid_counts_fills_and_profit_without_fees():
+    result = simulate_grid(PATH, lower=90, upper=110, num_grids=2, capital=200, fee_rate=0)
+
+    assert result["success"]
+    assert result["bars_simulated"] == 4
+    assert result["buy_fills"] == 2
+    assert result["round_trips"] == 2
+    # 1 unidad x 10 en el par alto + 100/90 unidades x 10 en el bajo
+    assert result["grid_profit"] == pytest.approx(10 + 100 / 90 * 10, abs=0.01)
+    assert result["total_pnl"] == pytest.approx(result["grid_profit"], abs=0.01)
+    assert result["unrealized_pnl"] == pytest.approx(0, abs=0.01)
+    assert result["final_inventory"] == pytest.approx(1.0)
+    assert not result["stopped_out"]
+
+
+def test_grid_fees_reduce_net_profit():
+    result = simulate_grid(PATH, lower=90, upper=110, num_grids=2, capital=200, fee_rate=0.001)
+    # Compra inicial 100, compras 100 + 100, ventas 110 + 111.11
+    assert result["fees_paid"] == pytest.approx((100 + 200 + 110 + 1000 / 9) * 0.001, abs=0.01)
+    assert result["net_grid_profit"] == pytest.approx(result["grid_profit"] - result["fees_paid"], abs=0.01)
+
+
+def test_grid_stop_loss_ends_simulation_and_liquidates():
+    result = simulate_grid(PATH, lower=90, upper=110, num_grids=2, capital=200, stop_loss=92, fee_rate=0)
+
+    assert result["stopped_out"]
+    assert result["bars_simulated"] == 3
+    # El inventario comprado en la vela del stop se liquida a 92
+    assert result["total_pnl"] == pytest.approx(10 + 100 / 90 * (92 - 90) + (92 - 100), abs=0.01)
+
+
+def test_grid_rejects_invalid_parameters():
+    assert not simulate_grid(PATH, lower=110, upper=90, num_grids=2, capital=200)["success"]
+    assert not simulate_grid(PATH.head(1), lower=90, upper=110, num_grids=2, capital=200)["success"]
@@ -0,0 +1,77 @@
+# Archivo: tests/test_intent_router.py
+
+import pytest
+
+from tools.asset_mapper import AssetMapper
+from tools.intent_router import IntentRouter, extract_capital, extract_timeframe
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter(AssetMapper())
+
+
+@pytest.mark.parametrize("message, asset", [
+    ("grid para ETH", "ETH"),
+    ("configura un grid de SOL con $500", "SOL"),
+])
+def test_grid_requests_route_to_grid_setup(router, message, asset):
+    params = router.classify(message)
+    assert params["intention"] == "grid_setup"
+    assert params["asset_name"] == asset
+
+
+def test_grid_without_asset_is_left_to_the_llm(router):
+    assert router.classify("grid") is None
+
+
+@pytest.mark.parametrize("text, capital", [
+    ("$500", 500),
+    ("1000 usdt", 1000),
+    ("2k$", 2000),
+    ("$1,500.50", 1500.5),
+    ("1.500,50 usdt", 1500.5),
+    ("$1.000", 1000),
+    ("con 250", 250),
+    ("con 15 minutos", None),
+    ("con 4 horas", None),
+    ("con 10 x", None),
+    ("con 20 velas", None),
+    ("con 4 horas y $2000", 2000),
+    ("eth", None),
+])
+def test_extract_capital(text, capital):
+    assert extract_capital(text) == capital
+
+
+@pytest.mark.parametrize("text, timeframe", [
+    ("btc 4h", "4h"),
+    ("15 minutos", "15m"),
+    ("1 semana", "1w"),
+    ("grafico diario", "1d"),
+    ("btc 3h", None),
+    ("ultimos 30d", None),
+    ("eth", None),
+])
+def test_extract_timeframe(text, timeframe):
+    assert extract_timeframe(text) == timeframe
+
+
+@pytest.mark.parametrize("message, timeframe, capital", [
+    ("estrategia para btc con 15 minutos", "15m", 100),
+    ("estrategia para eth con 4 horas y $2000", "4h", 2000),
+    ("estrategia para sol con $1,500.50", "1h", 1500.5),
+])
+def test_strategy_requests_keep_timeframe_and_capital_apart(router, message, timeframe, capital):
+    params = router.classify(message)
+    assert params["intention"] == "strategy_full"
+    assert params["timeframe"] == timeframe
+    assert params["capital"] == capital
+
+
+@pytest.mark.parametrize("message", [
+    "estrategia para btc con $1,5,0,0",  # importe ilegible
+    "analisis btc 3h",                   # timeframe sin velas en el exchange
+])
+def test_unparseable_parameters_go_to_the_llm(router, message):
+    assert router.classify(message) is None
@@ -0,0 +1,91 @@
+# Archivo: tests/test_llm_metrics.py
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tools import llm_metrics as metrics_module
+from tools.llm_metrics import instrumented_stream
+
+
+class FakeStream:
+    def __init__(self, pieces, fail_on_close=False, delay=0.0):
+        self.pieces = pieces
+        self.delay = delay
+        self.fail_on_close = fail_on_close
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for piece in self.pieces:
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    async def close(self):
+        self.closed = True
+        if self.fail_on_close:
+            raise RuntimeError("conexión rota")
+
+
+def fake_client(stream):
+    async def create(**kwargs):
+        return stream
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    async def acquire(model):
+        return 0.0
+
+    calls = []
+    monkeypatch.setattr(metrics_module.llm_scheduler, "acquire", acquire)
+    monkeypatch.setattr(metrics_module.llm_metrics, "record", lambda *args, **kwargs: calls.append(kwargs))
+    return calls
+
+
+def test_stream_is_closed_after_full_read(recorded):
+    stream = FakeStream(["ho", "la"])
+
+    async def consume():
+        return [chunk async for chunk in instrumented_stream(fake_client(stream), "test", model="m")]
+
+    assert len(asyncio.run(consume())) == 2
+    assert stream.closed
+    assert recorded[-1]["status"] == "ok"
+
+
+def test_stream_is_closed_when_consumer_stops_early(recorded):
+    stream = FakeStream(["a", "b", "c"])
+
+    async def consume():
+        generator = instrumented_stream(fake_client(stream), "test", model="m")
+        async for _ in generator:
+            break
+        await generator.aclose()
+
+    asyncio.run(consume())
+    assert stream.closed
+    assert recorded[-1]["status"] == "cancelled"
+
+
+def test_close_error_does_not_mask_cancellation(recorded):
+    stream = FakeStream(["a"] * 100, fail_on_close=True, delay=0.01)
+
+    async def consume():
+        async for _ in instrumented_stream(fake_client(stream), "test", model="m"):
+            pass
+
+    async def main():
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert stream.closed
+    assert recorded[-1]["status"] == "cancelled"
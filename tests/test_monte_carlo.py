@@ -0,0 +1,90 @@
+# Archivo: tests/test_monte_carlo.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools import monte_carlo, parameter_sweep
+from tools.asset_mapper import AssetMapper
+from tools.intent_router import IntentRouter
+from tools.monte_carlo import resolve_seed, simulate_dca_plan, simulate_price_paths
+from tools.strategy_tools import generate_advanced_trading_strategy
+
+
+def hourly_candles(n=500, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    index = pd.date_range("2026-01-01", periods=n, freq="h")
+    return pd.DataFrame({"open": close, "high": close * 1.005, "low": close * 0.995,
+                         "close": close, "volume": 1.0}, index=index)
+
+
+@pytest.fixture(autouse=True)
+def no_tuned_parameters(tmp_path, monkeypatch):
+    monkeypatch.setattr(parameter_sweep, "TUNED_PARAMS_PATH", str(tmp_path / "missing.json"))
+
+
+def test_price_paths_repeat_with_the_same_seed():
+    returns = np.diff(np.log(hourly_candles()["close"].to_numpy()))
+    first = simulate_price_paths(returns, 100.0, 30, n_paths=200, seed=42)
+    again = simulate_price_paths(returns, 100.0, 30, n_paths=200, seed=42)
+    other = simulate_price_paths(returns, 100.0, 30, n_paths=200, seed=43)
+
+    assert first.shape == (200, 31)
+    assert np.all(first[:, 0] == 100.0)
+    assert np.array_equal(first, again)
+    assert not np.array_equal(first, other)
+
+
+def test_dca_plan_on_known_paths():
+    # Una trayectoria que cae un 20% y se recupera, y otra que solo sube
+    paths = np.array([[100, 90, 80, 95, 110], [100, 105, 110, 115, 120]], dtype=np.float32)
+    result = simulate_dca_plan(paths, [100, 90, 80], [10, 10, 10], capital=30)
+
+    assert result["fill_probability_pct"] == [100.0, 50.0, 50.0]
+    assert result["recovery_probability_pct"] == 100.0
+    assert result["paths"] == 2 and result["horizon_bars"] == 4
+
+
+def test_resolve_seed_prefers_user_then_env(monkeypatch):
+    monkeypatch.setattr(monte_carlo, "MONTE_CARLO_SEED", "7")
+    assert resolve_seed(42) == 42
+    assert resolve_seed() == 7
+    monkeypatch.setattr(monte_carlo, "MONTE_CARLO_SEED", "")
+    assert 0 <= resolve_seed() < 2**32
+
+
+def dca_strategy(params, candles):
+    """Como handle_advanced_strategy: los parámetros del router pasan al perfil del usuario."""
+    return generate_advanced_trading_strategy(
+        scores={"technical_analysis": 0},
+        tech_data={"symbol": "BTCUSDT", "current_price": float(candles["close"].iloc[-1])},
+        multi_tf_data={"1h": candles},
+        user_profile={"capital": params["capital"], "risk_level": params["risk_level"], "timeframe": params["timeframe"],
+                      "strategy_type": params["strategy_type"], "seed": params["seed"]},
+    )
+
+
+def test_dca_request_with_seed_is_reproducible():
+    params = IntentRouter(AssetMapper()).classify("estrategia dca para BTC con $500 semilla 42")
+    assert params["intention"] == "strategy_full"
+    assert params["strategy_type"] == "dca"
+    assert params["seed"] == 42
+
+    candles = hourly_candles()
+    first = dca_strategy(params, candles)
+    again = dca_strategy(params, candles)
+
+    assert first["type"] == "DCA Strategy"
+    assert first["dca_plan"]["monte_carlo"]["seed"] == 42
+    assert first == again
+
+
+def test_dca_is_kept_when_the_market_has_a_direction():
+    params = {"capital": 500, "risk_level": "medium", "timeframe": "1h", "strategy_type": "dca", "seed": 1}
+    candles = hourly_candles()
+    strategy = generate_advanced_trading_strategy(
+        scores={"technical_analysis": 8}, tech_data={"symbol": "BTCUSDT", "current_price": 100.0},
+        multi_tf_data={"1h": candles}, user_profile=params)
+    assert strategy["direction"] == "LONG"
+    assert strategy["type"] == "DCA Strategy"
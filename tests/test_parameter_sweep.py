@@ -0,0 +1,69 @@
+# Archivo: tests/test_parameter_sweep.py
+
+import json
+import os
+
+from tools import parameter_sweep
+from tools.strategy_tools import AdvancedStrategyGenerator
+
+TUNED = {
+    "BTCUSDT": {
+        "1h": {
+            "risk_multipliers": {"medium": 0.03},
+            "leverage_limits": {"medium": 7},
+            "targets": [1.5, 2.5, 4.0],
+            "entry_allocations": [50, 30, 20],
+        }
+    }
+}
+
+
+def write_tuned(path, data, mtime_ns=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_tuned_parameters_override_generator_defaults(tmp_path, monkeypatch):
+    path = tmp_path / "tuned.json"
+    write_tuned(path, TUNED)
+    monkeypatch.setattr(parameter_sweep, "TUNED_PARAMS_PATH", str(path))
+
+    generator = AdvancedStrategyGenerator()
+    assert generator.apply_tuned_parameters("BTC", "1h")
+
+    assert generator.risk_multipliers["medium"] == 0.03
+    assert generator.risk_multipliers["low"] == 0.01
+    assert generator.leverage_limits["medium"] == 7
+    assert generator.timeframe_configs["1h"]["targets"] == [1.5, 2.5, 4.0]
+    assert generator.timeframe_configs["4h"]["targets"] == [2.0, 4.0, 6.0]
+    assert generator.entry_allocations == [50, 30, 20]
+
+
+def test_unknown_symbol_keeps_defaults(tmp_path, monkeypatch):
+    path = tmp_path / "tuned.json"
+    write_tuned(path, TUNED)
+    monkeypatch.setattr(parameter_sweep, "TUNED_PARAMS_PATH", str(path))
+
+    generator = AdvancedStrategyGenerator()
+    assert not generator.apply_tuned_parameters("ETH", "1h")
+    assert generator.risk_multipliers["medium"] == 0.02
+    assert generator.entry_allocations == [30, 40, 30]
+
+
+def test_tuned_file_is_parsed_again_only_when_it_changes(tmp_path, monkeypatch):
+    path = tmp_path / "tuned.json"
+    write_tuned(path, TUNED, mtime_ns=1_000_000_000_000_000_000)
+    loads = []
+    real_load = json.load
+    monkeypatch.setattr(parameter_sweep.json, "load", lambda f: loads.append(1) or real_load(f))
+
+    for _ in range(3):
+        assert parameter_sweep.load_tuned_parameters("BTCUSDT", "1h", str(path))["leverage_limits"] == {"medium": 7}
+    assert len(loads) == 1
+
+    changed = {"BTCUSDT": {"1h": {**TUNED["BTCUSDT"]["1h"], "leverage_limits": {"medium": 5}}}}
+    write_tuned(path, changed, mtime_ns=2_000_000_000_000_000_000)
+    assert parameter_sweep.load_tuned_parameters("BTCUSDT", "1h", str(path))["leverage_limits"] == {"medium": 5}
+    assert len(loads) == 2
@@ -0,0 +1,122 @@
+# Archivo: tests/test_prefetch.py
+
+import asyncio
+from types import SimpleNamespace
+
+from tools import prefetch as prefetch_module
+from tools.prefetch import SpeculativePrefetcher
+
+
+def counting(calls, name, value, delay=0.0):
+    async def factory():
+        calls.append(name)
+        await asyncio.sleep(delay)
+        return value
+    return factory
+
+
+def test_take_reuses_prefetched_result():
+    async def main():
+        prefetcher, calls = SpeculativePrefetcher(), []
+        prefetcher.schedule("chat", {"k": counting(calls, "prefetch", "adelantado")})
+        await asyncio.sleep(0.01)
+        result = await prefetcher.take("k", counting(calls, "fallback", "directo"))
+        return result, calls, prefetcher.stats()
+
+    result, calls, stats = asyncio.run(main())
+    assert result == "adelantado"
+    assert calls == ["prefetch"]
+    assert stats["used"] == 1 and stats["pending"] == 0
+
+
+def test_take_waits_for_job_in_progress():
+    async def main():
+        prefetcher, calls = SpeculativePrefetcher(), []
+        prefetcher.schedule("chat", {"k": counting(calls, "prefetch", "adelantado", delay=0.02)})
+        await asyncio.sleep(0)
+        return await prefetcher.take("k", counting(calls, "fallback", "directo")), calls
+
+    assert asyncio.run(main()) == ("adelantado", ["prefetch"])
+
+
+def test_take_without_prefetch_runs_factory():
+    async def main():
+        prefetcher, calls = SpeculativePrefetcher(), []
+        return await prefetcher.take("k", counting(calls, "fallback", "directo")), calls
+
+    assert asyncio.run(main()) == ("directo", ["fallback"])
+
+
+def test_expired_result_is_not_used(monkeypatch):
+    # Solo el reloj del prefetcher: el del bucle de eventos tiene que seguir avanzando
+    now = [100.0]
+    monkeypatch.setattr(prefetch_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+
+    async def main():
+        prefetcher, calls = SpeculativePrefetcher(ttl=10), []
+        prefetcher.schedule("chat", {"k": counting(calls, "prefetch", "viejo")})
+        await asyncio.sleep(0.01)
+        now[0] += 11
+        return await prefetcher.take("k", counting(calls, "fallback", "nuevo")), prefetcher.stats()
+
+    result, stats = asyncio.run(main())
+    assert result == "nuevo"
+    assert stats["expired"] == 1 and stats["used"] == 0
+
+
+def test_rescheduling_cancels_previous_jobs_of_owner():
+    async def main():
+        prefetcher, calls = SpeculativePrefetcher(), []
+        prefetcher.schedule("chat", {"old": counting(calls, "old", 1, delay=1)})
+        await asyncio.sleep(0)
+        old_task = prefetcher._entries["old"]["task"]
+        prefetcher.schedule("chat", {"new": counting(calls, "new", 2)})
+        await asyncio.sleep(0.01)
+        return old_task.cancelled(), prefetcher.stats()
+
+    cancelled, stats = asyncio.run(main())
+    assert cancelled
+    assert stats["cancelled"] == 1 and stats["pending"] == 1
+
+
+def test_cancel_only_affects_its_owner():
+    async def main():
+        prefetcher, calls = SpeculativePrefetcher(), []
+        prefetcher.schedule("a", {"ka": counting(calls, "a", 1, delay=1)})
+        prefetcher.schedule("b", {"kb": counting(calls, "b", 2)})
+        prefetcher.cancel("a")
+        await asyncio.sleep(0.01)
+        result = await prefetcher.take("kb", counting(calls, "fallback", 0))
+        return result, prefetcher.stats()
+
+    result, stats = asyncio.run(main())
+    assert result == 2
+    assert stats["cancelled"] == 1 and stats["pending"] == 0
+
+
+def test_failed_prefetch_falls_back_to_factory():
+    async def broken():
+        raise RuntimeError("sin datos")
+
+    async def main():
+        prefetcher, calls = SpeculativePrefetcher(), []
+        prefetcher.schedule("chat", {"k": broken})
+        await asyncio.sleep(0.01)
+        return await prefetcher.take("k", counting(calls, "fallback", "directo")), prefetcher.stats()
+
+    result, stats = asyncio.run(main())
+    assert result == "directo"
+    assert stats["failed"] == 1
+
+
+def test_take_does_not_wait_for_job_still_queued():
+    async def main():
+        prefetcher, calls = SpeculativePrefetcher(concurrency=1), []
+        prefetcher.schedule("chat", {"busy": counting(calls, "busy", 1, delay=1), "k": counting(calls, "queued", 2)})
+        await asyncio.sleep(0)
+        result = await prefetcher.take("k", counting(calls, "fallback", 3))
+        prefetcher.cancel("chat")
+        return result, calls
+
+    # "k" esperaba turno detrás de "busy": se cancela y se ejecuta directamente
+    assert asyncio.run(main()) == (3, ["busy", "fallback"])
@@ -0,0 +1,46 @@
+# Archivo: tests/test_walk_forward.py
+
+import pandas as pd
+
+from tools.walk_forward import build_folds
+
+
+def hourly(start: str, periods: int) -> pd.DatetimeIndex:
+    return pd.date_range(start, periods=periods, freq="h")
+
+
+def test_folds_are_contiguous_and_sized():
+    index = hourly("2024-01-01 07:00", 200)
+    folds = build_folds(index, in_sample_bars=50, out_of_sample_bars=24)
+    assert folds
+    for fold in folds:
+        assert fold["is_end"] - fold["is_start"] == 50
+        assert fold["oos_end"] - fold["is_end"] == 24
+        assert fold["oos_end"] <= len(index)
+    for previous, current in zip(folds, folds[1:]):
+        assert current["is_end"] == previous["oos_end"]
+
+
+def test_oos_starts_are_aligned_to_the_clock():
+    index = hourly("2024-01-01 07:00", 200)
+    folds = build_folds(index, in_sample_bars=50, out_of_sample_bars=24)
+    # Ventana OOS de 24 velas horarias: cada tramo empieza a medianoche
+    assert all(index[fold["is_end"]].hour == 0 for fold in folds)
+    assert [fold["oos_start_time"] for fold in folds] == ["20240104T0000", "20240105T0000", "20240106T0000",
+                                                         "20240107T0000", "20240108T0000"]
+
+
+def test_appending_candles_keeps_existing_folds():
+    index = hourly("2024-01-01 07:00", 200)
+    folds = build_folds(index, in_sample_bars=50, out_of_sample_bars=24)
+    # Se cae la vela más antigua y llegan 48 nuevas: los cortes ya calculados no cambian
+    longer = hourly("2024-01-01 08:00", 247)
+    longer_folds = build_folds(longer, in_sample_bars=50, out_of_sample_bars=24)
+
+    known = {fold["oos_start_time"] for fold in folds}
+    assert known <= {fold["oos_start_time"] for fold in longer_folds}
+    assert len(longer_folds) == len(folds) + 2
+
+
+def test_short_series_has_no_folds():
+    assert build_folds(hourly("2024-01-01", 60), in_sample_bars=50, out_of_sample_bars=24) == []
@@ -1,22 +1,100 @@
 # Archivo: tools/analysis_tools.py
 
+import os
+import time
+import asyncio
+import threading
 import pandas as pd
 import numpy as np
 import talib
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple
 
-from .bybit_tools import session as bybit_session
+from .bybit_tools import session as bybit_session, USE_TESTNET as BYBIT_TESTNET
 from .binance_tools import get_historical_data_binance
+from .async_tools import fetch_json, run_cpu
+
+# Endpoints REST públicos de velas (la versión asíncrona no necesita las librerías cliente)
+BYBIT_REST_URL = "https://api-testnet.bybit.com" if BYBIT_TESTNET else "https://api.bybit.com"
+BINANCE_REST_URL = "https://api.binance.com"
+
+# --- CACHÉ DE VELAS EN MEMORIA ---
+# Segundos que una serie descargada se considera fresca (la última vela sigue formándose)
+CANDLE_CACHE_TTL = int(os.getenv("CANDLE_CACHE_TTL", "60"))
+# Series (símbolo + intervalo) que se conservan; al superarlo se expulsa la menos usada
+CANDLE_CACHE_MAX_SERIES = int(os.getenv("CANDLE_CACHE_MAX_SERIES", "64"))
+
+_candle_cache = OrderedDict()  # (símbolo, intervalo API) -> {"df", "fetched_at", "complete"}, orden LRU
+_candle_cache_lock = threading.Lock()
+
+def _cache_key(symbol: str, interval: str) -> Tuple[str, str]:
+    symbol = symbol.upper()
+    if not symbol.endswith('USDT'):
+        symbol += 'USDT'
+    return symbol, get_bybit_api_interval(interval)
+
+def get_cached_candles(symbol: str, interval: str, limit: Optional[int] = None,
+                       max_age: Optional[float] = None) -> Optional[pd.DataFrame]:
+    """
+    Devuelve (sin tocar la red) las últimas `limit` velas cacheadas de un símbolo/intervalo,
+    o None si no hay serie suficiente o es más antigua que `max_age` segundos.
+    """
+    if not symbol:
+        return None
+    with _candle_cache_lock:
+        key = _cache_key(symbol, interval)
+        entry = _candle_cache.get(key)
+        if entry is not None:
+            _candle_cache.move_to_end(key)
+    if entry is None:
+        return None
+    if max_age is not None and time.time() - entry["fetched_at"] > max_age:
+        return None
+    df = entry["df"]
+    if limit is not None and len(df) < limit and not entry["complete"]:
+        return None
+    return (df.tail(limit) if limit else df).copy()
+
+def clear_candle_cache() -> None:
+    """Vacía la caché de velas (p. ej. para medir una ejecución en frío)."""
+    with _candle_cache_lock:
+        _candle_cache.clear()
+
+def _store_candles(symbol: str, interval: str, df: pd.DataFrame, requested: int) -> None:
+    key = _cache_key(symbol, interval)
+    with _candle_cache_lock:
+        current = _candle_cache.get(key)
+        is_fresh = current is not None and time.time() - current["fetched_at"] <= CANDLE_CACHE_TTL
+        # Una serie fresca más larga no se sustituye por una más corta
+        if is_fresh and len(current["df"]) > len(df):
+            return
+        _candle_cache[key] = {"df": df, "fetched_at": time.time(), "complete": len(df) < requested}
+        _candle_cache.move_to_end(key)
+        while len(_candle_cache) > CANDLE_CACHE_MAX_SERIES:
+            _candle_cache.popitem(last=False)
 
-# ... (todas las funciones desde get_historical_data_extended hasta perform_multi_timeframe_analysis no necesitan cambios) ...
 def get_historical_data_extended(symbol: str, interval: str = 'D', limit: int = 1000) -> Optional[pd.DataFrame]:
     """
     Obtiene datos históricos extendidos y se asegura de que el índice sea DatetimeIndex.
+    Reutiliza la serie cacheada si es reciente y tiene velas suficientes.
     """
     symbol = symbol.upper()
     if not symbol.endswith('USDT'):
         symbol += 'USDT'
 
+    cached = get_cached_candles(symbol, interval, limit, max_age=CANDLE_CACHE_TTL)
+    if cached is not None:
+        print(f"-> Usando velas cacheadas de {symbol} en {interval} ({len(cached)} velas).")
+        return cached
+
+    df = _fetch_historical_data(symbol, interval, limit)
+    if df is not None and not df.empty:
+        _store_candles(symbol, interval, df, limit)
+        return df.copy()
+    return df
+
+def _fetch_historical_data(symbol: str, interval: str, limit: int) -> Optional[pd.DataFrame]:
+    """Descarga las velas de los proveedores (Bybit y, si falla, Binance)."""
     print(f"Iniciando búsqueda de datos históricos para {symbol}...")
 
     # Proveedor 1: Bybit
@@ -30,15 +108,7 @@ def get_historical_data_extended(symbol: str, interval: str = 'D', limit: int =
 
     # Proveedor 2: Binance (fallback)
     print("  -> Fallo en Bybit. Intentando obtener datos de Binance...")
-    interval_map_to_binance = {
-        'D': '1d', 'W': '1w', 'M': '1M',
-        '1': '1m', '3': '3m', '5': '5m', '15': '15m', '30m': '30m',
-        '60': '1h', '120': '2h', '240': '4h', '360': '6h', '720': '12h'
-    }
-    bybit_api_interval = get_bybit_api_interval(interval)
-    binance_interval = interval_map_to_binance.get(bybit_api_interval, bybit_api_interval)
-
-    df_binance = get_historical_data_binance(symbol, binance_interval, limit)
+    df_binance = get_historical_data_binance(symbol, get_binance_api_interval(interval), limit)
 
     if df_binance is not None and not df_binance.empty:
         print("  -> Datos obtenidos exitosamente de Binance.")
@@ -51,6 +121,43 @@ def get_historical_data_extended(symbol: str, interval: str = 'D', limit: int =
     print(f"❌ No se pudieron obtener datos para {symbol} en ninguna fuente.")
     return None
 
+async def get_historical_data_extended_async(symbol: str, interval: str = 'D', limit: int = 1000) -> Optional[pd.DataFrame]:
+    """
+    Versión asíncrona de get_historical_data_extended: misma caché de velas, pero descarga
+    por la API REST pública con el cliente HTTP compartido, sin ocupar un hilo.
+    """
+    symbol = symbol.upper()
+    if not symbol.endswith('USDT'):
+        symbol += 'USDT'
+
+    cached = get_cached_candles(symbol, interval, limit, max_age=CANDLE_CACHE_TTL)
+    if cached is not None:
+        print(f"-> Usando velas cacheadas de {symbol} en {interval} ({len(cached)} velas).")
+        return cached
+
+    df = await get_historical_data_bybit_async(symbol, interval, limit)
+    if df is not None and not df.empty:
+        df['source'] = 'Bybit'
+    else:
+        print(f"  -> Fallo en Bybit para {symbol}. Intentando obtener datos de Binance...")
+        df = await get_historical_data_binance_async(symbol, get_binance_api_interval(interval), limit)
+        if df is None or df.empty:
+            print(f"❌ No se pudieron obtener datos para {symbol} en ninguna fuente.")
+            return None
+        df['source'] = 'Binance'
+
+    _store_candles(symbol, interval, df, limit)
+    return df.copy()
+
+def get_binance_api_interval(interval: str) -> str:
+    interval_map_to_binance = {
+        'D': '1d', 'W': '1w', 'M': '1M',
+        '1': '1m', '3': '3m', '5': '5m', '15': '15m', '30m': '30m',
+        '60': '1h', '120': '2h', '240': '4h', '360': '6h', '720': '12h'
+    }
+    bybit_api_interval = get_bybit_api_interval(interval)
+    return interval_map_to_binance.get(bybit_api_interval, bybit_api_interval)
+
 def get_bybit_api_interval(interval: str) -> str:
     interval_map = {
         '1m': '1', '3m': '3', '5m': '5', '15m': '15', '30m': '30',
@@ -98,22 +205,94 @@ def get_historical_data_bybit(symbol: str, interval: str, limit: int) -> Optiona
                     print(f"  Error de API Bybit: {response.get('retMsg')}")
                 break
         
-        if all_data:
-            combined_df = pd.concat(all_data, ignore_index=True)
-            numeric_cols = ['open', 'high', 'low', 'close', 'volume', 'timestamp']
-            combined_df[numeric_cols] = combined_df[numeric_cols].apply(pd.to_numeric)
-            combined_df['timestamp'] = pd.to_datetime(combined_df['timestamp'], unit='ms')
-            
-            combined_df = combined_df.sort_values('timestamp').reset_index(drop=True)
-            combined_df = combined_df.drop_duplicates(subset=['timestamp'], keep='first')
-            combined_df = combined_df.set_index('timestamp')
-            return combined_df
-        
-        return None
+        return _combine_bybit_pages(all_data)
         
     except Exception as e:
         print(f"Error obteniendo datos de Bybit: {e}")
         return None
+
+def _combine_bybit_pages(all_data: List[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """Une las páginas de velas de Bybit en un DataFrame ordenado con índice temporal."""
+    if not all_data:
+        return None
+    combined_df = pd.concat(all_data, ignore_index=True)
+    numeric_cols = ['open', 'high', 'low', 'close', 'volume', 'timestamp']
+    combined_df[numeric_cols] = combined_df[numeric_cols].apply(pd.to_numeric)
+    combined_df['timestamp'] = pd.to_datetime(combined_df['timestamp'], unit='ms')
+    
+    combined_df = combined_df.sort_values('timestamp').reset_index(drop=True)
+    combined_df = combined_df.drop_duplicates(subset=['timestamp'], keep='first')
+    return combined_df.set_index('timestamp')
+
+async def get_historical_data_bybit_async(symbol: str, interval: str, limit: int) -> Optional[pd.DataFrame]:
+    """Velas de Bybit (API v5 pública /market/kline), paginadas hacia atrás como la versión síncrona."""
+    api_interval = get_bybit_api_interval(interval)
+    all_data = []
+    max_limit_per_call = 1000
+    end_time = None
+    remaining = limit
+
+    while remaining > 0:
+        params = {"category": "spot", "symbol": symbol, "interval": api_interval,
+                  "limit": min(remaining, max_limit_per_call)}
+        if end_time:
+            params["end"] = end_time
+
+        result = await fetch_json(f"{BYBIT_REST_URL}/v5/market/kline", params=params)
+        if not result["success"]:
+            print(f"  Error de red con Bybit: {result.get('message')}")
+            break
+        response = result["data"]
+        if response.get('retCode') != 0 or not response.get('result', {}).get('list'):
+            if response.get('retCode') not in (0, 10001):
+                print(f"  Error de API Bybit: {response.get('retMsg')}")
+            break
+
+        data = pd.DataFrame(
+            response['result']['list'],
+            columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'turnover']
+        )
+        end_time = int(pd.to_numeric(data['timestamp']).min()) - 1
+        all_data.append(data)
+        remaining -= len(data)
+        if len(data) < max_limit_per_call:
+            break
+
+    try:
+        return _combine_bybit_pages(all_data)
+    except Exception as e:
+        print(f"Error procesando datos de Bybit: {e}")
+        return None
+
+async def get_historical_data_binance_async(symbol: str, interval: str, limit: int) -> Optional[pd.DataFrame]:
+    """Velas de Binance (/api/v3/klines pública), paginadas con endTime en bloques de 1000."""
+    all_rows = []
+    end_time = None
+    remaining = limit
+
+    while remaining > 0:
+        params = {"symbol": symbol, "interval": interval, "limit": min(remaining, 1000)}
+        if end_time:
+            params["endTime"] = end_time
+        result = await fetch_json(f"{BINANCE_REST_URL}/api/v3/klines", params=params)
+        if not result["success"] or not result["data"]:
+            break
+        rows = result["data"]
+        all_rows = rows + all_rows
+        remaining -= len(rows)
+        end_time = int(rows[0][0]) - 1
+        if len(rows) < 1000:
+            break
+
+    if not all_rows:
+        return None
+    df = pd.DataFrame([row[:6] for row in all_rows], columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    numeric_cols = ['open', 'high', 'low', 'close', 'volume']
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df = df.drop_duplicates(subset=['timestamp'], keep='last').set_index('timestamp')
+    print(f"  -> Datos de Binance obtenidos exitosamente ({len(df)} velas).")
+    return df
 def calculate_market_structure(df: pd.DataFrame) -> Dict:
     """Analiza la estructura del mercado (HH, HL, LL, LH)."""
     highs = df['high'].values
@@ -236,49 +415,68 @@ def perform_multi_timeframe_analysis(symbol: str, timeframes: Optional[List[str]
     if timeframes is None:
         timeframes = ['15m', '1h', '4h', '1d']
 
-    mtf_analysis = {}
-    
+    frames = {}
     for tf in timeframes:
         print(f"Analizando {symbol} en {tf}...")
-        
-        df = get_historical_data_extended(symbol, interval=tf, limit=500)
-        if df is None or len(df) < 50:
-            continue
-        
-        rsi = talib.RSI(df['close'], timeperiod=14)
-        macd, signal, hist = talib.MACD(df['close'])
-        
-        sma_50 = talib.SMA(df['close'], timeperiod=50)
-        sma_200 = talib.SMA(df['close'], timeperiod=200) if len(df) > 200 else None
-        
-        atr = talib.ATR(df['high'], df['low'], df['close'], timeperiod=14)
-        
-        current_close = df['close'].iloc[-1]
-        trend = "Neutral"
-        
-        if sma_200 is not None and not pd.isna(sma_200.iloc[-1]) and not pd.isna(sma_50.iloc[-1]):
-            if current_close > sma_50.iloc[-1] > sma_200.iloc[-1]:
-                trend = "Fuerte Alcista"
-            elif current_close < sma_50.iloc[-1] < sma_200.iloc[-1]:
-                trend = "Fuerte Bajista"
-            elif current_close > sma_200.iloc[-1]:
-                trend = "Alcista"
-            elif current_close < sma_200.iloc[-1]:
-                trend = "Bajista"
-        
-        momentum = "Neutral"
-        if not rsi.empty and not macd.empty:
-            if rsi.iloc[-1] > 70: momentum = "Sobrecompra"
-            elif rsi.iloc[-1] < 30: momentum = "Sobreventa"
-            elif macd.iloc[-1] > signal.iloc[-1] and hist.iloc[-1] > 0: momentum = "Bullish"
-            elif macd.iloc[-1] < signal.iloc[-1] and hist.iloc[-1] < 0: momentum = "Bearish"
-        
-        mtf_analysis[tf] = {
-            "trend": trend,
-            "momentum": momentum,
-            "rsi": round(rsi.iloc[-1], 2) if not rsi.empty else None,
-            "volatility_atr": round(atr.iloc[-1], 4) if not atr.empty else None
-        }
+        frames[tf] = get_historical_data_extended(symbol, interval=tf, limit=500)
+    return summarize_multi_timeframe(frames)
+
+async def perform_multi_timeframe_analysis_async(symbol: str, timeframes: Optional[List[str]] = None) -> Dict:
+    """Como perform_multi_timeframe_analysis, pero descarga todas las temporalidades a la vez."""
+    if timeframes is None:
+        timeframes = ['15m', '1h', '4h', '1d']
+
+    print(f"Analizando {symbol} en {', '.join(timeframes)} (en paralelo)...")
+    results = await asyncio.gather(*(get_historical_data_extended_async(symbol, interval=tf, limit=500) for tf in timeframes))
+    return await run_cpu(summarize_multi_timeframe, dict(zip(timeframes, results)))
+
+def analyze_timeframe(df: Optional[pd.DataFrame]) -> Optional[Dict]:
+    """Tendencia, momentum, RSI y ATR de una temporalidad (None si no hay velas suficientes)."""
+    if df is None or len(df) < 50:
+        return None
+    
+    rsi = talib.RSI(df['close'], timeperiod=14)
+    macd, signal, hist = talib.MACD(df['close'])
+    
+    sma_50 = talib.SMA(df['close'], timeperiod=50)
+    sma_200 = talib.SMA(df['close'], timeperiod=200) if len(df) > 200 else None
+    
+    atr = talib.ATR(df['high'], df['low'], df['close'], timeperiod=14)
+    
+    current_close = df['close'].iloc[-1]
+    trend = "Neutral"
+    
+    if sma_200 is not None and not pd.isna(sma_200.iloc[-1]) and not pd.isna(sma_50.iloc[-1]):
+        if current_close > sma_50.iloc[-1] > sma_200.iloc[-1]:
+            trend = "Fuerte Alcista"
+        elif current_close < sma_50.iloc[-1] < sma_200.iloc[-1]:
+            trend = "Fuerte Bajista"
+        elif current_close > sma_200.iloc[-1]:
+            trend = "Alcista"
+        elif current_close < sma_200.iloc[-1]:
+            trend = "Bajista"
+    
+    momentum = "Neutral"
+    if not rsi.empty and not macd.empty:
+        if rsi.iloc[-1] > 70: momentum = "Sobrecompra"
+        elif rsi.iloc[-1] < 30: momentum = "Sobreventa"
+        elif macd.iloc[-1] > signal.iloc[-1] and hist.iloc[-1] > 0: momentum = "Bullish"
+        elif macd.iloc[-1] < signal.iloc[-1] and hist.iloc[-1] < 0: momentum = "Bearish"
+    
+    return {
+        "trend": trend,
+        "momentum": momentum,
+        "rsi": round(rsi.iloc[-1], 2) if not rsi.empty else None,
+        "volatility_atr": round(atr.iloc[-1], 4) if not atr.empty else None
+    }
+
+def summarize_multi_timeframe(frames: Dict[str, Optional[pd.DataFrame]]) -> Dict:
+    """Analiza cada temporalidad ya descargada y calcula el sesgo global y la alineación."""
+    mtf_analysis = {}
+    for tf, df in frames.items():
+        analysis = analyze_timeframe(df)
+        if analysis is not None:
+            mtf_analysis[tf] = analysis
     
     trends = [analysis["trend"] for analysis in mtf_analysis.values()]
     if not trends:
@@ -309,6 +507,37 @@ def advanced_technical_analysis(symbol: str, interval: str = '1h') -> Dict:
     if df is None or len(df) < 200:
         return {"success": False, "message": f"Datos insuficientes para {symbol} en el intervalo {interval} desde todas las fuentes."}
     
+    mtf = perform_multi_timeframe_analysis(symbol, ['15m', '1h', '4h'])
+    return build_technical_analysis(symbol, df, mtf)
+
+async def advanced_technical_analysis_async(symbol: str, interval: str = '1h') -> Dict:
+    """
+    Versión asíncrona: descarga la serie principal y las tres temporalidades a la vez y
+    calcula los indicadores en el pool de CPU.
+    """
+    mtf_timeframes = ['15m', '1h', '4h']
+    # La temporalidad que coincide con la principal sale de la misma descarga
+    extra_timeframes = [tf for tf in mtf_timeframes if tf != interval]
+    main_df, *extra_frames = await asyncio.gather(
+        get_historical_data_extended_async(symbol, interval=interval, limit=1000),
+        *(get_historical_data_extended_async(symbol, interval=tf, limit=500) for tf in extra_timeframes)
+    )
+    
+    if main_df is None or len(main_df) < 200:
+        return {"success": False, "message": f"Datos insuficientes para {symbol} en el intervalo {interval} desde todas las fuentes."}
+    
+    frames = dict(zip(extra_timeframes, extra_frames))
+    if interval in mtf_timeframes:
+        frames[interval] = main_df.tail(500)
+    
+    def _compute() -> Dict:
+        mtf = summarize_multi_timeframe({tf: frames[tf] for tf in mtf_timeframes})
+        return build_technical_analysis(symbol, main_df, mtf)
+    
+    return await run_cpu(_compute)
+
+def build_technical_analysis(symbol: str, df: pd.DataFrame, mtf: Dict) -> Dict:
+    """Parte de cálculo del análisis técnico, a partir de velas ya descargadas."""
     current_price = float(df['close'].iloc[-1])
     data_source = df['source'].iloc[-1]
     
@@ -316,18 +545,23 @@ def advanced_technical_analysis(symbol: str, interval: str = '1h') -> Dict:
     sr_zones = calculate_support_resistance_zones(df)
     patterns = detect_chart_patterns(df)
     
+    # Series completas de las medias y las bandas: el gráfico reutiliza su tramo final
+    sma_20 = talib.SMA(df['close'], 20)
+    sma_50 = talib.SMA(df['close'], 50)
+    bb_upper, bb_middle, bb_lower = talib.BBANDS(df['close'], 20)
+
     indicators = {}
-    indicators['SMA_50'] = talib.SMA(df['close'], 50).iloc[-1]
+    indicators['SMA_20'] = sma_20.iloc[-1]
+    indicators['SMA_50'] = sma_50.iloc[-1]
     indicators['SMA_200'] = talib.SMA(df['close'], 200).iloc[-1]
     indicators['RSI'] = talib.RSI(df['close'], 14).iloc[-1]
     macd, signal, hist = talib.MACD(df['close'])
     indicators['MACD'] = {"macd": macd.iloc[-1], "signal": signal.iloc[-1], "histogram": hist.iloc[-1]}
-    bb_upper, bb_middle, bb_lower = talib.BBANDS(df['close'], 20)
     indicators['Bollinger'] = {"upper": bb_upper.iloc[-1], "middle": bb_middle.iloc[-1], "lower": bb_lower.iloc[-1]}
     indicators['ATR'] = talib.ATR(df['high'], df['low'], df['close'], 14).iloc[-1]
+    indicators['ADX'] = talib.ADX(df['high'], df['low'], df['close'], 14).iloc[-1]
     indicators['Volume_SMA'] = df['volume'].rolling(20).mean().iloc[-1]
     
-    mtf = perform_multi_timeframe_analysis(symbol, ['15m', '1h', '4h'])
     signals = generate_trading_signals(df, indicators, patterns, sr_zones, mtf)
     
     return {
@@ -338,7 +572,13 @@ def advanced_technical_analysis(symbol: str, interval: str = '1h') -> Dict:
             "patterns": patterns, "indicators": indicators, "multi_timeframe": mtf, 
             "signals": signals, 
             # --- LÍNEA CORREGIDA: ACCEDER AL ÍNDICE ---
-            "timestamp": df.index[-1].isoformat()
+            "timestamp": df.index[-1].isoformat(),
+            # Velas e indicadores ya calculados, para dibujar el gráfico sin red ni TA-Lib
+            # (son objetos de pandas: compact_payload los omite de los prompts)
+            "series": {
+                "candles": df,
+                "indicators": {"sma20": sma_20, "sma50": sma_50, "bb_upper": bb_upper, "bb_lower": bb_lower},
+            }
         }
     }
 def generate_trading_signals(df: pd.DataFrame, indicators: Dict, 
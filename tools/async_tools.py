@@ -0,0 +1,81 @@
+# Archivo: tools/async_tools.py
+
+import os
+import asyncio
+import functools
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Conexiones HTTP simultáneas del cliente compartido (todas las APIs de datos)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "15"))
+
+# Hilos para trabajo de CPU (indicadores, simulaciones, gráficos): NumPy/talib liberan el GIL
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 4)))
+
+# Hilos para librerías que solo tienen API bloqueante (yfinance, pybit, duckduckgo, on-chain)
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "32"))
+
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+_blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+# matplotlib (pyplot) guarda estado global: los gráficos se dibujan de uno en uno
+_chart_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+
+# Un cliente por event loop: httpx no permite compartir conexiones entre loops
+_http_clients: Dict[int, httpx.AsyncClient] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Cliente httpx compartido del event loop actual (con pool de conexiones acotado)."""
+    loop_id = id(asyncio.get_running_loop())
+    client = _http_clients.get(loop_id)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS // 2),
+            follow_redirects=True
+        )
+        _http_clients[loop_id] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    """Cierra los clientes HTTP (al apagar el bot)."""
+    for client in list(_http_clients.values()):
+        await client.aclose()
+    _http_clients.clear()
+
+
+async def fetch_json(url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                     timeout: Optional[float] = None) -> Dict:
+    """
+    GET asíncrono que devuelve {"success", "status", "data"} sin lanzar excepciones,
+    con el mismo estilo de resultado que el resto de herramientas.
+    """
+    try:
+        response = await get_http_client().get(url, params=params, headers=headers,
+                                                timeout=timeout or HTTP_TIMEOUT_SECONDS)
+        if response.status_code == 200:
+            return {"success": True, "status": 200, "data": response.json()}
+        return {"success": False, "status": response.status_code, "message": f"HTTP {response.status_code}"}
+    except (httpx.HTTPError, ValueError) as e:
+        return {"success": False, "status": None, "message": str(e)}
+
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """Ejecuta trabajo de CPU en el pool de cálculo sin bloquear el event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Ejecuta una llamada de una librería bloqueante en su pool acotado."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_chart(func: Callable, *args, **kwargs) -> Any:
+    """Dibuja un gráfico en el hilo dedicado de matplotlib."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_chart_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,351 @@
+# Archivo: tools/cache_tools.py
+
+import os
+import sys
+import json
+import time
+import queue
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .async_tools import run_blocking
+
+# Cada cuánto se consideran renovadas las noticias/contexto web (segundos)
+NEWS_REFRESH_SECONDS = int(os.getenv("NEWS_REFRESH_SECONDS", "900"))
+
+# Cada cuánto (segundos) se borran del disco las entradas caducadas que nadie ha vuelto a leer
+DISK_PRUNE_INTERVAL = int(os.getenv("CACHE_DISK_PRUNE_INTERVAL", "3600"))
+
+# TTL mínimo: evita entradas que caducan nada más crearse al final de una vela
+MIN_TTL_SECONDS = 5
+
+# Duración de cada vela en segundos, con las mismas claves de timeframe que el resto del bot
+INTERVAL_SECONDS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1h": 3600, "2h": 7200, "4h": 14400, "6h": 21600, "12h": 43200,
+    "1d": 86400, "1w": 604800
+}
+
+
+def interval_seconds(interval: str) -> int:
+    return INTERVAL_SECONDS.get(interval, 3600)
+
+
+def seconds_until_candle_close(interval: str, now: Optional[float] = None) -> float:
+    """Segundos que faltan para que cierre la vela actual del timeframe (alineado a UTC)."""
+    now = time.time() if now is None else now
+    period = interval_seconds(interval)
+    return max(period - (now % period), MIN_TTL_SECONDS)
+
+
+def news_window(now: Optional[float] = None) -> int:
+    """Índice del bloque de refresco de noticias en curso (sirve como parte de una clave)."""
+    now = time.time() if now is None else now
+    return int(now // NEWS_REFRESH_SECONDS)
+
+
+def seconds_until_news_refresh(now: Optional[float] = None) -> float:
+    now = time.time() if now is None else now
+    return max(NEWS_REFRESH_SECONDS - (now % NEWS_REFRESH_SECONDS), MIN_TTL_SECONDS)
+
+
+def _canonical_default(obj):
+    if isinstance(obj, (np.integer, np.floating, np.bool_)):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (pd.Timestamp, pd.Timedelta)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=str)
+    return str(obj)
+
+
+def canonicalize(payload: Any) -> str:
+    """JSON determinista (claves ordenadas, sin espacios) para usar como contenido de una clave."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_canonical_default)
+
+
+def llm_cache_key(model: str, system_prompt: str, payload: Any, options: Optional[Dict] = None) -> str:
+    """Hash del modelo, el prompt de sistema, los datos canonicalizados y las opciones de la llamada."""
+    content = canonicalize({"model": model, "system": system_prompt, "payload": payload, "options": options or {}})
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _value_size(value: Any) -> int:
+    """Bytes que ocupa un valor a efectos del límite de memoria (exacto para bytes/str)."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return sys.getsizeof(value)
+
+
+class TieredCache:
+    """
+    Caché en memoria con TTL por entrada y expulsión LRU al superar `max_entries` (o
+    `max_bytes`), con un segundo nivel opcional en disco (pickle por clave). El disco no
+    se toca desde el bucle de eventos: las escrituras van a un hilo propio, que también
+    expulsa lo menos usado al superar `max_disk_bytes` (con un índice en memoria, sin
+    listar la carpeta) y purga las caducadas cada DISK_PRUNE_INTERVAL segundos; las
+    lecturas asíncronas (`aget`) van al pool de hilos. Lleva aciertos/fallos por espacio
+    de nombres (p. ej. por handler) y es segura entre hilos.
+    """
+
+    def __init__(self, name: str, max_entries: int = 512, disk_dir: Optional[str] = None,
+                 max_bytes: Optional[int] = None, max_disk_bytes: Optional[int] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir or None
+        self._entries = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {}
+        # Nivel en disco: clave -> bytes del archivo, en orden de uso (LRU), y su total
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        self._disk_jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._disk_writer: Optional[threading.Thread] = None
+        self._next_prune = time.time() + DISK_PRUNE_INTERVAL
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _count(self, namespace: str, field: str) -> None:
+        stats = self._stats.setdefault(namespace, {"hits": 0, "disk_hits": 0, "misses": 0})
+        stats[field] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _load_disk_index(self) -> None:
+        """Índice del disco al arrancar (la única vez que se lista la carpeta), del más antiguo al más reciente."""
+        files = []
+        for filename in os.listdir(self.disk_dir):
+            if filename.endswith(".pkl"):
+                try:
+                    st = os.stat(os.path.join(self.disk_dir, filename))
+                except OSError:
+                    continue
+                files.append((st.st_mtime, filename[:-4], st.st_size))
+        for _, key, size in sorted(files):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+
+    def _memory_get(self, key: str, now: float, namespace: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._count(namespace, "hits")
+                    return value
+                self._pop(key)
+        return None
+
+    def _disk_get(self, key: str, now: float, namespace: str) -> Optional[Any]:
+        """Lectura del disco (bloqueante); si está, vuelve a la memoria."""
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self._count(namespace, "misses")
+                return None
+            expires_at, value = entry
+            self._insert(key, value, expires_at)
+            self._count(namespace, "disk_hits")
+        return value
+
+    def get(self, key: str, namespace: str = "default") -> Optional[Any]:
+        """
+        Devuelve el valor si existe y no ha caducado; None en caso contrario. Si hay que ir
+        al disco la lectura bloquea: desde código asíncrono se usa `aget`.
+        """
+        now = time.time()
+        value = self._memory_get(key, now, namespace)
+        if value is not None:
+            return value
+        if self.disk_dir and key in self._disk_index:
+            return self._disk_get(key, now, namespace)
+        with self._lock:
+            self._count(namespace, "misses")
+        return None
+
+    async def aget(self, key: str, namespace: str = "default") -> Optional[Any]:
+        """Como `get`, pero la lectura del disco (si hace falta) va al pool de hilos."""
+        now = time.time()
+        value = self._memory_get(key, now, namespace)
+        if value is not None:
+            return value
+        if self.disk_dir and key in self._disk_index:
+            return await run_blocking(self._disk_get, key, now, namespace)
+        with self._lock:
+            self._count(namespace, "misses")
+        return None
+
+    def set(self, key: str, value: Any, ttl: float, namespace: str = "default") -> None:
+        """
+        Guarda un valor durante `ttl` segundos en memoria; la copia en disco (si está
+        activado) la escribe el hilo del disco, sin esperar.
+        """
+        if ttl is None or ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._insert(key, value, expires_at)
+        if self.disk_dir:
+            self._disk_jobs.put((key, value, expires_at))
+            self._start_disk_writer()
+
+    def _pop(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def _insert(self, key: str, value: Any, expires_at: float) -> None:
+        self._pop(key)
+        size = _value_size(value) if self.max_bytes else 0
+        self._entries[key] = (expires_at, value)
+        self._sizes[key] = size
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1):
+            self._pop(next(iter(self._entries)))
+
+    def _start_disk_writer(self) -> None:
+        with self._disk_lock:
+            if self._disk_writer is None:
+                self._disk_writer = threading.Thread(target=self._disk_loop, name=f"cache-{self.name}", daemon=True)
+                self._disk_writer.start()
+
+    def _disk_loop(self) -> None:
+        """Hilo del disco: escribe lo que llega por la cola y purga caducadas cada DISK_PRUNE_INTERVAL."""
+        while True:
+            try:
+                job = self._disk_jobs.get(timeout=max(self._next_prune - time.time(), 0.05))
+            except queue.Empty:
+                job = None
+            if job is not None:
+                try:
+                    self._write_disk(*job)
+                finally:
+                    self._disk_jobs.task_done()
+            if time.time() >= self._next_prune:
+                self._next_prune = time.time() + DISK_PRUNE_INTERVAL
+                removed = self.prune_disk()
+                if removed:
+                    print(f"-> Caché '{self.name}': {removed} entradas caducadas borradas del disco.")
+
+    def flush_disk(self) -> None:
+        """Espera a que el hilo del disco haya escrito todo lo pendiente."""
+        if self._disk_writer is not None:
+            self._disk_jobs.join()
+
+    def _forget_disk(self, key: str) -> None:
+        with self._disk_lock:
+            self._disk_bytes -= self._disk_index.pop(key, 0)
+
+    def _remove_disk(self, key: str) -> None:
+        self._forget_disk(key)
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _read_disk(self, key: str, now: float) -> Optional[tuple]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, ValueError, AttributeError):
+            self._forget_disk(key)
+            return None
+        if expires_at <= now:
+            self._remove_disk(key)
+            return None
+        with self._disk_lock:
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+        return expires_at, value
+
+    def _write_disk(self, key: str, value: Any, expires_at: float) -> None:
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump((expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PickleError, TypeError, AttributeError) as e:
+            print(f"  ⚠️ No se pudo escribir la caché '{self.name}' en disco: {e}")
+            return
+        with self._disk_lock:
+            self._disk_bytes += size - self._disk_index.pop(key, 0)
+            self._disk_index[key] = size
+        if self.max_disk_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Borra los archivos usados hace más tiempo hasta quedar dentro de `max_disk_bytes`."""
+        while True:
+            with self._disk_lock:
+                if self._disk_bytes <= self.max_disk_bytes or len(self._disk_index) <= 1:
+                    return
+                key = next(iter(self._disk_index))
+            self._remove_disk(key)
+
+    def disk_bytes(self) -> int:
+        """Bytes ocupados en disco según el índice."""
+        return self._disk_bytes
+
+    def prune_disk(self) -> int:
+        """Borra del disco las entradas caducadas. Devuelve cuántas se eliminaron."""
+        if not self.disk_dir:
+            return 0
+        removed, now = 0, time.time()
+        with self._disk_lock:
+            keys = list(self._disk_index)
+        for key in keys:
+            if self._read_disk(key, now) is None:
+                removed += 1
+        return removed
+
+    def clear(self, disk: bool = True) -> None:
+        """Vacía la memoria y, salvo `disk=False`, también el nivel en disco."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+        if disk and self.disk_dir:
+            self.flush_disk()
+            with self._disk_lock:
+                keys = list(self._disk_index)
+            for key in keys:
+                self._remove_disk(key)
+
+    def memory_bytes(self) -> int:
+        """Bytes en memoria contabilizados (solo si la caché tiene `max_bytes`)."""
+        return self._bytes
+
+    def stats(self) -> Dict[str, Dict]:
+        """Aciertos, fallos y tasa de acierto por espacio de nombres."""
+        with self._lock:
+            report = {}
+            for namespace, s in self._stats.items():
+                total = s["hits"] + s["disk_hits"] + s["misses"]
+                report[namespace] = {**s, "requests": total,
+                                     "hit_rate_pct": round((s["hits"] + s["disk_hits"]) / total * 100, 1) if total else 0.0}
+            return report
+
+    def hit_rate(self, namespace: str) -> float:
+        return self.stats().get(namespace, {}).get("hit_rate_pct", 0.0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
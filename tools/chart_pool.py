@@ -0,0 +1,150 @@
+# Archivo: tools/chart_pool.py
+
+import os
+import time
+import asyncio
+import multiprocessing
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Deque, Dict, Optional
+
+from .chart_render import render_chart, warm_up
+from .async_tools import run_chart
+
+# Procesos que dibujan gráficos (0 = en el hilo de gráficos del propio bot)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", str(min(4, max(1, (os.cpu_count() or 2) // 2)))))
+# Gráficos en cola o dibujándose; los que no caben se omiten (la respuesta sale sin gráfico)
+CHART_QUEUE_MAX = int(os.getenv("CHART_QUEUE_MAX", str(max(CHART_WORKERS, 1) * 4)))
+# Plazas de la cola que pueden ocupar a la vez los gráficos en segundo plano (paneles de un álbum):
+# esperan turno en vez de descartarse y dejan el resto de la cola a los gráficos de las respuestas
+CHART_BACKGROUND_SLOTS = int(os.getenv("CHART_BACKGROUND_SLOTS", str(max(CHART_WORKERS, 1))))
+# Segundos máximos de un gráfico desde que entra en la cola
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "30"))
+
+# Tiempos recientes que se conservan para los percentiles
+TIMING_SAMPLES = 500
+
+
+def _process_context():
+    """
+    forkserver en Linux: un servidor limpio (sin los hilos ni las conexiones del bot) importa
+    una vez el módulo principal y chart_render, y cada proceso del pool nace de él ya cargado.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["__main__", "tools.chart_render"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class ChartRenderPool:
+    """
+    Pool de procesos de larga duración que dibujan gráficos con el backend Agg y el estilo
+    ya cargados. Recibe payloads de arrays (chart_render.candles_payload) y devuelve la
+    imagen en bytes, sin retener el GIL del bot. La cola está acotada y cada gráfico
+    registra su espera y su tiempo de dibujo.
+    """
+
+    def __init__(self, workers: int = CHART_WORKERS, queue_max: int = CHART_QUEUE_MAX,
+                 timeout: float = CHART_RENDER_TIMEOUT, background_slots: int = CHART_BACKGROUND_SLOTS):
+        self.workers = workers
+        self.queue_max = max(queue_max, 1)
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._background = asyncio.Semaphore(max(min(background_slots, self.queue_max), 1))
+        self._slot_freed = asyncio.Event()
+        self._stats = {"rendered": 0, "rejected": 0, "timeouts": 0, "failed": 0, "restarts": 0}
+        self._render_s: Deque[float] = deque(maxlen=TIMING_SAMPLES)
+        self._queue_s: Deque[float] = deque(maxlen=TIMING_SAMPLES)
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_process_context(),
+                                                 initializer=warm_up)
+        return self._executor
+
+    async def start(self) -> None:
+        """Arranca todos los procesos y los calienta antes de la primera petición."""
+        pool = self._pool()
+        if pool is None:
+            return
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, time.sleep, 0.05) for _ in range(self.workers)))
+        print(f"🖼️ Pool de gráficos listo: {self.workers} procesos en {time.perf_counter() - started:.1f}s")
+
+    async def render(self, payload: Dict[str, Any], background: bool = False) -> Optional[bytes]:
+        """
+        Imagen del payload, o None si la cola está llena, vence el plazo o el dibujo falla.
+        Con `background` (p. ej. los paneles de un álbum) no se descarta por cola llena:
+        espera a una de las plazas de segundo plano y a que haya hueco en la cola.
+        """
+        if background:
+            async with self._background:
+                while self._pending >= self.queue_max:
+                    self._slot_freed.clear()
+                    await self._slot_freed.wait()
+                return await self._render(payload)
+
+        if self._pending >= self.queue_max:
+            self._stats["rejected"] += 1
+            print(f"  ⚠️ Cola de gráficos llena ({self.queue_max}); la respuesta sale sin gráfico.")
+            return None
+        return await self._render(payload)
+
+    async def _render(self, payload: Dict[str, Any]) -> Optional[bytes]:
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            pool = self._pool()
+            if pool is None:
+                future = run_chart(render_chart, payload)
+            else:
+                future = asyncio.get_running_loop().run_in_executor(pool, render_chart, payload)
+            result = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            print(f"  ⚠️ El gráfico no terminó en {self.timeout:g}s.")
+            return None
+        except BrokenProcessPool as e:
+            # Un proceso murió (p. ej. por memoria): el pool se recrea en la siguiente petición
+            self._stats["failed"] += 1
+            self._stats["restarts"] += 1
+            print(f"  ❌ Pool de gráficos roto, se reinicia: {e}")
+            self.shutdown()
+            return None
+        except Exception as e:
+            self._stats["failed"] += 1
+            print(f"  ❌ Error al dibujar el gráfico: {e}")
+            return None
+        finally:
+            self._pending -= 1
+            self._slot_freed.set()
+
+        total = time.perf_counter() - started
+        self._stats["rendered"] += 1
+        self._render_s.append(result["render_s"])
+        self._queue_s.append(max(total - result["render_s"], 0.0))
+        return result["image"]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        def pcts(samples) -> Dict[str, Optional[float]]:
+            if not samples:
+                return {"p50": None, "p95": None}
+            p50, p95 = np.percentile(list(samples), (50, 95))
+            return {"p50": round(float(p50), 3), "p95": round(float(p95), 3)}
+        return {**self._stats, "workers": self.workers, "pending": self._pending,
+                "render_s": pcts(self._render_s), "queue_s": pcts(self._queue_s)}
+
+
+chart_pool = ChartRenderPool()
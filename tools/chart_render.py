@@ -0,0 +1,263 @@
+# Archivo: tools/chart_render.py
+#
+# Dibujo de los gráficos de velas a partir de un payload compacto de arrays. Solo depende de
+# numpy, pandas y matplotlib/mplfinance: es lo que ejecutan los procesos del pool de gráficos
+# (tools/chart_pool.py) y no necesita datos ni clientes del bot.
+
+import io
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import mplfinance as mpf
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.ticker import MaxNLocator
+from typing import Any, Dict, Optional
+
+# Formato de la imagen que se envía a Telegram: "png" (sin pérdida) o "jpeg" (más ligera de subir)
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png").lower()
+CHART_DPI = int(os.getenv("CHART_DPI", "100"))
+# Calidad JPEG (1-95) y nivel de compresión PNG (0-9): más compresión, menos bytes que subir
+CHART_JPEG_QUALITY = int(os.getenv("CHART_JPEG_QUALITY", "85"))
+CHART_PNG_COMPRESS_LEVEL = int(os.getenv("CHART_PNG_COMPRESS_LEVEL", "6"))
+
+# Motor de dibujo: "mplfinance" (completo) o "fast" (colecciones de matplotlib sin pasar por
+# mplfinance ni pyplot; mismo aspecto y varias veces más rápido, ver benchmarks/bench_chart_render.py)
+CHART_RENDERER = os.getenv("CHART_RENDERER", "mplfinance").lower()
+
+# Versión del aspecto de los gráficos (estilo, indicadores, tamaño): subirla invalida la caché de gráficos
+CHART_STYLE_VERSION = 1
+
+# Columnas de `ohlcv` en el payload, en este orden
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+# Colores del estilo del bot (los mismos que chart_style) y geometría de la figura de mplfinance
+# con figratio=(16, 9) y figscale=1.5, para que los dos motores den el mismo gráfico
+UP_COLOR, DOWN_COLOR = '#2ECC71', '#E74C3C'
+FACE_COLOR, GRID_COLOR = '#1E1E2D', '#2D2D44'
+VOLUME_EDGE_COLOR = '#1F77B4'
+FIGSIZE = (15.333, 8.625)
+PRICE_AXES = (0.18, 0.38, 0.72, 0.5)
+VOLUME_AXES = (0.18, 0.18, 0.72, 0.2)
+
+# Un búfer por hilo que se reutiliza entre gráficos en lugar de crear uno nuevo cada vez
+_buffers = threading.local()
+# Figura del motor rápido, también una por hilo
+_figures = threading.local()
+_style = None
+
+
+def chart_style():
+    """Estilo oscuro del bot; se construye una sola vez por proceso."""
+    global _style
+    if _style is None:
+        mc = mpf.make_marketcolors(
+            up='#2ECC71', down='#E74C3C',
+            wick={'up':'#2ECC71', 'down':'#E74C3C'},
+            edge='inherit', volume='inherit'
+        )
+        _style = mpf.make_mpf_style(
+            base_mpf_style='charles',
+            marketcolors=mc,
+            facecolor='#1E1E2D', figcolor='#1E1E2D',
+            gridcolor='#2D2D44', gridstyle='--',
+            rc={'axes.labelcolor': 'white', 'xtick.color': 'white', 'ytick.color': 'white'}
+        )
+    return _style
+
+
+def _render_buffer() -> io.BytesIO:
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _buffers.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
+
+
+def chart_savefig_options(buffer: io.BytesIO) -> dict:
+    """Argumentos de savefig para escribir la imagen en `buffer` con el formato y la compresión configurados."""
+    if CHART_FORMAT in ("jpg", "jpeg"):
+        return {"fname": buffer, "format": "jpeg", "dpi": CHART_DPI,
+                "pil_kwargs": {"quality": CHART_JPEG_QUALITY, "optimize": True}}
+    # Sin optimize: en PNG fuerza el nivel 9 e ignoraría CHART_PNG_COMPRESS_LEVEL
+    return {"fname": buffer, "format": "png", "dpi": CHART_DPI,
+            "pil_kwargs": {"compress_level": CHART_PNG_COMPRESS_LEVEL}}
+
+
+def candles_payload(plot_data: pd.DataFrame, title: str, overlays: Optional[list] = None,
+                    levels: Optional[list] = None) -> Dict[str, Any]:
+    """
+    Payload compacto de un gráfico: índice en nanosegundos, matriz OHLCV en float64 y las
+    líneas a superponer como (valores, color, grosor, estilo) y niveles como (precio, color).
+    Es lo único que viaja al proceso que dibuja.
+    """
+    return {
+        "title": title,
+        # En nanosegundos sea cual sea la resolución del índice (pandas 2+ usa también ms/us)
+        "index": plot_data.index.values.astype("datetime64[ns]").view(np.int64),
+        "ohlcv": plot_data[OHLCV_COLUMNS].to_numpy(dtype=np.float64),
+        "overlays": [(np.asarray(values, dtype=np.float64), color, width, linestyle)
+                     for values, color, width, linestyle in (overlays or [])],
+        "levels": [(float(price), color) for price, color in (levels or [])],
+    }
+
+
+def render_chart(payload: Dict[str, Any], renderer: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Dibuja el payload de candles_payload con `renderer` (por defecto CHART_RENDERER) y
+    devuelve {"image": bytes, "render_s": segundos}.
+    """
+    started = time.perf_counter()
+    buffer = _render_buffer()
+    if (renderer or CHART_RENDERER) == "fast":
+        _draw_fast(payload, buffer)
+    else:
+        _draw_mplfinance(payload, buffer)
+    return {"image": buffer.getvalue(), "render_s": time.perf_counter() - started}
+
+
+def _draw_mplfinance(payload: Dict[str, Any], buffer: io.BytesIO) -> None:
+    index = pd.DatetimeIndex(payload["index"].astype("datetime64[ns]"))
+    plot_data = pd.DataFrame(payload["ohlcv"], index=index, columns=OHLCV_COLUMNS)
+
+    plots_to_add = [
+        mpf.make_addplot(pd.Series(values, index=index), color=color, width=width, linestyle=linestyle)
+        for values, color, width, linestyle in payload["overlays"]
+    ]
+    for price, color in payload["levels"]:
+        line = pd.Series(price, index=index)
+        plots_to_add.append(mpf.make_addplot(line, color=color, width=1.0, linestyle='-.'))
+
+    options = {"addplot": plots_to_add} if plots_to_add else {}
+    mpf.plot(
+        plot_data,
+        type='candle',
+        style=chart_style(),
+        title=payload["title"],
+        ylabel='Precio (USD)',
+        volume=True,
+        figratio=(16, 9),
+        figscale=1.5,
+        savefig=chart_savefig_options(buffer),
+        show_nontrading=False,
+        **options
+    )
+    plt.close("all")
+
+
+def _date_labels(index: np.ndarray) -> list:
+    """Etiquetas del eje X como las de mplfinance: con hora si las velas son intradía."""
+    dates = pd.DatetimeIndex(index.astype("datetime64[ns]"))
+    intraday = len(dates) > 1 and (dates[1:] - dates[:-1]).min() < pd.Timedelta(days=1)
+    return list(dates.strftime("%b %d, %H:%M" if intraday else "%b %d, %Y"))
+
+
+def _style_axes(ax, ylabel: str) -> None:
+    ax.set_facecolor(FACE_COLOR)
+    ax.grid(True, color=GRID_COLOR, linestyle='--', linewidth=0.4)
+    ax.set_axisbelow(True)
+    ax.yaxis.tick_right()
+    ax.yaxis.set_label_position("right")
+    ax.set_ylabel(ylabel, color='white', fontsize=12, fontweight='semibold')
+    ax.tick_params(colors='white', labelsize=10)
+    for spine in ax.spines.values():
+        spine.set_edgecolor('white')
+
+
+def _fast_figure() -> Dict[str, Any]:
+    """Figura y ejes del motor rápido: se crean y se les da estilo una sola vez por hilo."""
+    figure = getattr(_figures, "figure", None)
+    if figure is None:
+        fig = Figure(figsize=FIGSIZE, facecolor=FACE_COLOR)
+        FigureCanvasAgg(fig)
+        ax = fig.add_axes(PRICE_AXES)
+        ax_volume = fig.add_axes(VOLUME_AXES, sharex=ax)
+        _style_axes(ax, 'Precio (USD)')
+        _style_axes(ax_volume, 'Volume')
+        ax.tick_params(labelbottom=False)
+        # Los límites se fijan en cada gráfico; así matplotlib no los recalcula en cada artista
+        ax.set_autoscale_on(False)
+        ax_volume.set_autoscale_on(False)
+        title = fig.suptitle("", fontsize=14.4, fontweight='semibold')
+        figure = _figures.figure = {"fig": fig, "ax": ax, "volume": ax_volume, "title": title}
+    return figure
+
+
+def _boxes(x: np.ndarray, half: float, bottoms: np.ndarray, tops: np.ndarray) -> np.ndarray:
+    """Vértices (n, 4, 2) de rectángulos centrados en `x` entre `bottoms` y `tops`."""
+    return np.stack([
+        np.column_stack([x - half, bottoms]), np.column_stack([x - half, tops]),
+        np.column_stack([x + half, tops]), np.column_stack([x + half, bottoms]),
+    ], axis=1)
+
+
+def _draw_fast(payload: Dict[str, Any], buffer: io.BytesIO) -> None:
+    """
+    Mismo gráfico que _draw_mplfinance construido directamente con matplotlib sobre una figura
+    que se reutiliza: cuerpos de las velas en una PolyCollection, mechas en una LineCollection,
+    volumen en otra PolyCollection y medias, bandas y niveles como líneas.
+    """
+    figure = _fast_figure()
+    fig, ax, ax_volume = figure["fig"], figure["ax"], figure["volume"]
+    for artist in [*ax.collections, *ax.lines, *ax_volume.collections]:
+        artist.remove()
+    # mplfinance no deja hueco por los saltos de línea iniciales del título
+    figure["title"].set_text(payload["title"].strip())
+
+    ohlcv = payload["ohlcv"]
+    opens, highs, lows, closes, volumes = ohlcv.T
+    x = np.arange(len(ohlcv), dtype=np.float64)
+    colors = np.where(closes >= opens, UP_COLOR, DOWN_COLOR)
+
+    # Velas: mechas (mínimo-máximo) y cuerpos (apertura-cierre)
+    wicks = np.stack([np.column_stack([x, lows]), np.column_stack([x, highs])], axis=1)
+    ax.add_collection(LineCollection(wicks, colors=colors, linewidths=0.7), autolim=False)
+    ax.add_collection(PolyCollection(_boxes(x, 0.24, np.minimum(opens, closes), np.maximum(opens, closes)),
+                                     facecolors=colors, edgecolors=colors, linewidths=0.7), autolim=False)
+
+    for values, color, width, linestyle in payload["overlays"]:
+        ax.plot(x, values, color=color, linewidth=width, linestyle=linestyle)
+    for price, color in payload["levels"]:
+        ax.hlines(price, x[0], x[-1], colors=color, linewidth=1.0, linestyles='-.')
+
+    # Volumen: una sola colección (bar crearía un Rectangle por vela)
+    ax_volume.add_collection(PolyCollection(_boxes(x, 0.47, np.zeros_like(x), volumes), facecolors=colors,
+                                            edgecolors=VOLUME_EDGE_COLOR, linewidths=0.65), autolim=False)
+
+    # Mismos márgenes que mplfinance; el eje de precios abarca velas, indicadores y niveles
+    pad = max(len(x) * 0.06, 1.0)
+    ax.set_xlim(-pad, len(x) - 1 + pad)
+    prices = np.concatenate([lows, highs, *(values for values, *_ in payload["overlays"]),
+                             [price for price, _ in payload["levels"]]])
+    low, high = np.nanmin(prices), np.nanmax(prices)
+    margin = (high - low) * 0.05 or abs(high) * 0.01 or 1.0
+    ax.set_ylim(low - margin, high + margin)
+    ax_volume.set_ylim(0.3 * np.nanmin(volumes), 1.1 * np.nanmax(volumes) or 1.0)
+
+    labels = _date_labels(payload["index"])
+    ticks = [int(t) for t in MaxNLocator(nbins=6, integer=True).tick_values(0, len(x) - 1) if 0 <= t < len(x)]
+    ax_volume.set_xticks(ticks, [labels[t] for t in ticks], rotation=45)
+
+    fig.savefig(**chart_savefig_options(buffer), facecolor=FACE_COLOR)
+
+
+def warm_up() -> None:
+    """
+    Inicializador de los procesos del pool: construye el estilo y dibuja un gráfico mínimo
+    para cargar fuentes y cachés de matplotlib antes de la primera petición real. Si falla,
+    el proceso sigue siendo válido: solo será algo más lento en su primer gráfico.
+    """
+    chart_style()
+    index = pd.date_range("2024-01-01", periods=3, freq="h")
+    ohlcv = np.array([[1, 2, 0.5, 1.5, 10], [1.5, 2.5, 1, 2, 12], [2, 2.2, 1.2, 1.4, 8]], dtype=np.float64)
+    try:
+        render_chart(candles_payload(pd.DataFrame(ohlcv, index=index, columns=OHLCV_COLUMNS), "warm-up"))
+    except Exception as e:
+        print(f"⚠️ Calentamiento del proceso de gráficos fallido: {e}")
@@ -1,94 +1,224 @@
 # Archivo: tools/chart_tools.py
 
 import os
-import mplfinance as mpf
-import matplotlib.pyplot as plt
+import asyncio
+import hashlib
+import numpy as np
 import pandas as pd
-import traceback
 import talib
-from tools.analysis_tools import get_historical_data_extended
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from tools.analysis_tools import get_historical_data_extended_async
+from tools.async_tools import run_cpu
+from tools.cache_tools import TieredCache, canonicalize, interval_seconds, seconds_until_candle_close
+from tools.chart_render import (
+    candles_payload, CHART_STYLE_VERSION, CHART_FORMAT, CHART_DPI,
+    CHART_JPEG_QUALITY, CHART_PNG_COMPRESS_LEVEL, CHART_RENDERER, OHLCV_COLUMNS
+)
+from tools.chart_pool import chart_pool
 
-def generate_candlestick_chart(
-    symbol: str, 
-    interval: str = '1h', 
-    title: str = None, 
-    support_levels: list = None, 
+# Caché de gráficos ya dibujados: límite de entradas y de MB en memoria, y carpeta/MB opcionales en disco
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "256"))
+CHART_CACHE_MAX_MB = float(os.getenv("CHART_CACHE_MAX_MB", "64"))
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "")
+CHART_CACHE_DISK_MAX_MB = float(os.getenv("CHART_CACHE_DISK_MAX_MB", "256"))
+# Cifras significativas de los niveles S/R en la clave: variaciones mínimas no generan otro gráfico
+CHART_LEVEL_DIGITS = 4
+# Velas que se dibujan (las últimas de la serie), para que el gráfico no esté muy apretado
+CHART_CANDLES = 100
+# Velas previas que necesitan los indicadores (SMA50) para tener valor desde la primera dibujada
+CHART_WARMUP_CANDLES = 50
+
+# Álbum multi-timeframe: paneles que se envían juntos y velas máximas de una serie base. Los
+# timeframes mayores se obtienen re-agrupando la serie del menor mientras quepan en ese máximo.
+ALBUM_TIMEFRAMES = [tf.strip() for tf in os.getenv("ALBUM_TIMEFRAMES", "15m,1h,4h,1d").split(",") if tf.strip()]
+ALBUM_MAX_BASE_CANDLES = int(os.getenv("ALBUM_MAX_BASE_CANDLES", "3000"))
+
+chart_cache = TieredCache(
+    "charts", max_entries=CHART_CACHE_MAX_ENTRIES, disk_dir=CHART_CACHE_DIR or None,
+    max_bytes=int(CHART_CACHE_MAX_MB * 1024 * 1024), max_disk_bytes=int(CHART_CACHE_DISK_MAX_MB * 1024 * 1024)
+)
+
+def _round_levels(levels: Optional[list]) -> list:
+    return sorted(float(f"{float(level):.{CHART_LEVEL_DIGITS}g}") for level in levels or [])
+
+def chart_cache_key(symbol: str, interval: str, candle, title: Optional[str],
+                    support_levels: Optional[list], resistance_levels: Optional[list]) -> str:
+    """
+    Clave de un gráfico dibujado: símbolo, intervalo, última vela (`candle`, su apertura en
+    ISO 8601), niveles S/R redondeados, título y versión del estilo/formato de la imagen.
+    """
+    content = canonicalize({
+        "symbol": symbol, "interval": interval, "candle": candle, "title": title,
+        "support": _round_levels(support_levels), "resistance": _round_levels(resistance_levels),
+        "style": [CHART_STYLE_VERSION, CHART_RENDERER, CHART_FORMAT, CHART_DPI, CHART_JPEG_QUALITY,
+                  CHART_PNG_COMPRESS_LEVEL],
+    })
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def _tail(values, plot_data: pd.DataFrame) -> np.ndarray:
+    """Últimos valores de un indicador alineados con las velas que se dibujan."""
+    return np.asarray(values, dtype=np.float64)[-len(plot_data):]
+
+def chart_payload_from_series(
+    symbol: str,
+    interval: str,
+    candles: pd.DataFrame,
+    indicators: Dict[str, Any],
+    title: str = None,
+    support_levels: list = None,
     resistance_levels: list = None
-) -> str:
+) -> Optional[Dict[str, Any]]:
     """
-    Genera un gráfico de velas con niveles de S/R, Medias Móviles y Bandas de Bollinger.
+    Payload del gráfico a partir de velas ya cargadas y sus indicadores ya calculados
+    (series completas "sma20", "sma50", "bb_upper" y "bb_lower" alineadas con `candles`):
+    solo se toma el tramo final, sin red ni TA-Lib.
     """
-    print(f"-> Generando gráfico avanzado para {symbol} en {interval}...")
-    # Pedimos más datos para que los indicadores se calculen bien
-    data = get_historical_data_extended(symbol, interval=interval, limit=200)
-    if data is None or data.empty or not isinstance(data.index, pd.DatetimeIndex):
+    if candles is None or candles.empty or not isinstance(candles.index, pd.DatetimeIndex):
         print(f"  ❌ Datos insuficientes o mal formateados para el gráfico de {symbol}.")
         return None
 
-    # Tomamos las últimas 100 velas para que el gráfico no esté muy apretado
-    plot_data = data.tail(100)
-
-    mc = mpf.make_marketcolors(
-        up='#2ECC71', down='#E74C3C',
-        wick={'up':'#2ECC71', 'down':'#E74C3C'},
-        edge='inherit', volume='inherit'
-    )
-    style = mpf.make_mpf_style(
-        base_mpf_style='charles',
-        marketcolors=mc,
-        facecolor='#1E1E2D', figcolor='#1E1E2D',
-        gridcolor='#2D2D44', gridstyle='--',
-        rc={'axes.labelcolor': 'white', 'xtick.color': 'white', 'ytick.color': 'white'}
-    )
+    plot_data = candles.tail(CHART_CANDLES)
     
     # --- Añadir Indicadores al Gráfico ---
-    plots_to_add = []
+    overlays = []
     
     # 1. Medias Móviles (SMA 20 y 50)
-    sma20 = talib.SMA(data['close'], timeperiod=20)
-    sma50 = talib.SMA(data['close'], timeperiod=50)
-    plots_to_add.append(mpf.make_addplot(sma20.tail(100), color='cyan', width=0.7))
-    plots_to_add.append(mpf.make_addplot(sma50.tail(100), color='yellow', width=0.7))
+    overlays.append((_tail(indicators["sma20"], plot_data), 'cyan', 0.7, '-'))
+    overlays.append((_tail(indicators["sma50"], plot_data), 'yellow', 0.7, '-'))
 
     # 2. Bandas de Bollinger
-    upper, middle, lower = talib.BBANDS(data['close'], timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
-    plots_to_add.append(mpf.make_addplot(upper.tail(100), color='gray', width=0.6, linestyle='--'))
-    plots_to_add.append(mpf.make_addplot(lower.tail(100), color='gray', width=0.6, linestyle='--'))
-
-    # 3. Niveles de Soporte y Resistencia
-    if support_levels:
-        for level in support_levels:
-            line = pd.Series([float(level)] * len(plot_data), index=plot_data.index)
-            plots_to_add.append(mpf.make_addplot(line, color='#3498DB', width=1.0, linestyle='-.')) # Azul para soporte
-            
-    if resistance_levels:
-        for level in resistance_levels:
-            line = pd.Series([float(level)] * len(plot_data), index=plot_data.index)
-            plots_to_add.append(mpf.make_addplot(line, color='#F39C12', width=1.0, linestyle='-.')) # Naranja para resistencia
-        
-    try:
-        chart_dir = os.path.join(os.getcwd(), 'charts')
-        os.makedirs(chart_dir, exist_ok=True)
-        chart_path = os.path.join(chart_dir, f"{symbol.replace('/', '_')}_{interval}_{pd.Timestamp.now().strftime('%Y%m%d%H%M%S')}.png")
-
-        mpf.plot(
-            plot_data, # Graficamos solo las últimas 100 velas
-            type='candle',
-            style=style,
-            title=title or f"\nAnálisis Técnico de {symbol} - {interval}",
-            ylabel='Precio (USD)',
-            volume=True,
-            figratio=(16, 9),
-            figscale=1.5, # Hacemos el gráfico un poco más grande
-            addplot=plots_to_add if plots_to_add else None,
-            savefig=chart_path,
-            show_nontrading=False
-        )
-        
-        print(f"  ✅ Gráfico avanzado guardado en: {chart_path}")
-        return chart_path
-
-    except Exception as e:
-        print(f"  ❌ Error al generar el gráfico con mplfinance: {e}")
-        traceback.print_exc()
-        return None
\ No newline at end of file
+    overlays.append((_tail(indicators["bb_upper"], plot_data), 'gray', 0.6, '--'))
+    overlays.append((_tail(indicators["bb_lower"], plot_data), 'gray', 0.6, '--'))
+
+    # 3. Niveles de Soporte (azul) y Resistencia (naranja)
+    levels = [(level, '#3498DB') for level in support_levels or []]
+    levels += [(level, '#F39C12') for level in resistance_levels or []]
+
+    return candles_payload(plot_data, title or f"\nAnálisis Técnico de {symbol} - {interval}", overlays, levels)
+
+def chart_indicators(candles: pd.DataFrame) -> Dict[str, Any]:
+    """SMA 20/50 y Bandas de Bollinger de las velas, con las claves de chart_payload_from_series."""
+    upper, middle, lower = talib.BBANDS(candles['close'], timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
+    return {
+        "sma20": talib.SMA(candles['close'], timeperiod=20),
+        "sma50": talib.SMA(candles['close'], timeperiod=50),
+        "bb_upper": upper,
+        "bb_lower": lower,
+    }
+
+async def generate_chart_from_series_async(
+    symbol: str,
+    interval: str,
+    series: Dict[str, Any],
+    title: str = None,
+    support_levels: list = None,
+    resistance_levels: list = None
+) -> Optional[bytes]:
+    """
+    Gráfico a partir de la serie de un análisis ya hecho (data["series"] de
+    build_technical_analysis: {"candles", "indicators"}): no pide velas ni recalcula
+    indicadores, solo recorta el tramo final y lo dibuja en el pool. La vela de la clave
+    de caché es la última de la serie.
+    """
+    candles = series["candles"]
+    key = chart_cache_key(symbol, interval, candles.index[-1].isoformat() if len(candles) else None,
+                          title, support_levels, resistance_levels)
+
+    async def build() -> Optional[Dict[str, Any]]:
+        return chart_payload_from_series(symbol, interval, candles, series["indicators"],
+                                         title, support_levels, resistance_levels)
+
+    return await _cached_chart(key, symbol, interval, build)
+
+async def _cached_chart(key: str, symbol: str, interval: str,
+                        build: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+                        background: bool = False) -> Optional[bytes]:
+    """
+    Imagen de la caché de gráficos o, si no está, el payload de `build()` dibujado en el pool
+    (en segundo plano si `background`, ver ChartRenderPool.render).
+    """
+    image = await chart_cache.aget(key, "charts")
+    if image is not None:
+        print(f"-> Gráfico de {symbol} en {interval} reutilizado de la caché (tasa de acierto {chart_cache.hit_rate('charts'):.0f}%).")
+        return image
+
+    payload = await build()
+    if payload is None:
+        return None
+    image = await chart_pool.render(payload, background=background)
+    if image is not None:
+        print(f"  ✅ Gráfico avanzado generado ({len(image) / 1024:.0f} KB).")
+        chart_cache.set(key, image, seconds_until_candle_close(interval), "charts")
+    return image
+
+def plan_album_loads(timeframes: List[str], candles: int = CHART_CANDLES + CHART_WARMUP_CANDLES,
+                     max_base_candles: int = ALBUM_MAX_BASE_CANDLES) -> Dict[str, Dict[str, Any]]:
+    """
+    Series que hay que descargar para un álbum: {timeframe base: {"limit", "panels"}}. Cada
+    panel se re-agrupa desde la base más fina de la que sea múltiplo si le bastan
+    `max_base_candles` velas de ella; si no, tiene su propia descarga (p. ej. 1d frente a 15m).
+    """
+    loads: Dict[str, Dict[str, Any]] = {}
+    for timeframe in sorted(dict.fromkeys(timeframes), key=interval_seconds):
+        period = interval_seconds(timeframe)
+        for base, load in loads.items():
+            ratio, remainder = divmod(period, interval_seconds(base))
+            if remainder == 0 and candles * ratio <= max_base_candles:
+                load["panels"].append(timeframe)
+                load["limit"] = max(load["limit"], candles * ratio)
+                break
+        else:
+            loads[timeframe] = {"limit": candles, "panels": [timeframe]}
+    return loads
+
+def resample_candles(candles: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """Velas OHLCV re-agrupadas a `interval` (alineadas a UTC como las del exchange)."""
+    bars = candles[OHLCV_COLUMNS].resample(pd.Timedelta(seconds=interval_seconds(interval)),
+                                           label="left", closed="left").agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+    ).dropna(subset=["open"])
+    # La primera vela queda incompleta si la serie base no empieza en su apertura
+    if len(bars) > 1 and candles.index[0] != bars.index[0]:
+        bars = bars.iloc[1:]
+    return bars
+
+async def generate_timeframe_album_async(symbol: str, timeframes: Optional[List[str]] = None) -> List[Tuple[str, bytes]]:
+    """
+    Gráficos de `symbol` en varios timeframes (por defecto ALBUM_TIMEFRAMES) para enviarlos
+    juntos: las series base de plan_album_loads se descargan a la vez, cada panel se
+    re-agrupa y se dibuja en paralelo en el pool. Devuelve [(timeframe, imagen)] en el orden
+    pedido, sin los paneles que no se pudieron dibujar.
+    """
+    timeframes = timeframes or ALBUM_TIMEFRAMES
+    loads = plan_album_loads(timeframes)
+    print(f"-> Álbum de {symbol} en {', '.join(timeframes)}: {len(loads)} descarga(s) ({', '.join(loads)}).")
+    series = await asyncio.gather(*(get_historical_data_extended_async(symbol, interval=base, limit=load["limit"])
+                                    for base, load in loads.items()))
+
+    def panel_payload(candles: pd.DataFrame, base: str, timeframe: str, title: str) -> Optional[Dict[str, Any]]:
+        if timeframe != base:
+            candles = resample_candles(candles, timeframe)
+        candles = candles.tail(CHART_CANDLES + CHART_WARMUP_CANDLES)
+        return chart_payload_from_series(symbol, timeframe, candles, chart_indicators(candles), title)
+
+    async def panel(candles: Optional[pd.DataFrame], base: str, timeframe: str) -> Tuple[str, Optional[bytes]]:
+        if candles is None or candles.empty:
+            return timeframe, None
+        title = f"\n{symbol} - {timeframe}"
+        # La última vela de la serie base fija el contenido del panel
+        key = chart_cache_key(symbol, timeframe, candles.index[-1].isoformat(), title, None, None)
+        # Los paneles esperan turno en el pool en vez de llenar la cola de los gráficos de respuesta
+        return timeframe, await _cached_chart(key, symbol, timeframe,
+                                              lambda: run_cpu(panel_payload, candles, base, timeframe, title),
+                                              background=True)
+
+    panels = dict(await asyncio.gather(*(
+        panel(candles, base, timeframe)
+        for (base, load), candles in zip(loads.items(), series) for timeframe in load["panels"]
+    )))
+    return [(timeframe, panels[timeframe]) for timeframe in dict.fromkeys(timeframes) if panels.get(timeframe)]
+
+def get_chart_cache_stats() -> Dict[str, Any]:
+    """Aciertos de la caché de gráficos y ocupación en memoria."""
+    return {**chart_cache.stats().get("charts", {}), "entries": len(chart_cache),
+            "memory_mb": round(chart_cache.memory_bytes() / 1024 / 1024, 1)}
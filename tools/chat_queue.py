@@ -0,0 +1,153 @@
+# Archivo: tools/chat_queue.py
+
+import os
+import time
+import asyncio
+import contextvars
+import numpy as np
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+# Peticiones de un mismo chat que se procesan a la vez (1 = en orden de llegada)
+CHAT_QUEUE_CONCURRENCY = int(os.getenv("CHAT_QUEUE_CONCURRENCY", "1"))
+# Peticiones por chat entre en curso y en espera; las que no caben se rechazan
+CHAT_QUEUE_MAX_DEPTH = int(os.getenv("CHAT_QUEUE_MAX_DEPTH", "5"))
+
+# Esperas recientes en cola que se conservan para los percentiles
+WAIT_SAMPLES = 500
+
+# Trabajo de la cola al que pertenece la tarea actual (lo consultan los checkpoints)
+_current_job: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("chat_job", default=None)
+
+
+class RequestSuperseded(asyncio.CancelledError):
+    """Una petición más reciente del mismo tipo en el mismo chat ha sustituido a esta."""
+
+
+class ChatQueueFull(RuntimeError):
+    """El chat ya tiene CHAT_QUEUE_MAX_DEPTH peticiones en curso o en espera."""
+
+
+def is_superseded() -> bool:
+    """True si la petición que ejecuta la tarea actual ya ha sido sustituida."""
+    job = _current_job.get()
+    return job is not None and job["superseded"]
+
+
+def checkpoint() -> None:
+    """
+    Punto de cancelación cooperativa entre etapas del pipeline (enrutado, datos, síntesis,
+    envío): si la petición ha sido sustituida, lanza RequestSuperseded y no se sigue gastando
+    en ella. Fuera de la cola (p. ej. alertas o benchmarks) no hace nada.
+    """
+    if is_superseded():
+        raise RequestSuperseded()
+
+
+class ChatWorkQueue:
+    """
+    Cola de trabajo por chat: cada chat procesa como mucho `concurrency` peticiones a la vez
+    y en orden de llegada. Una petición nueva con `supersede=True` retira de la cola las
+    anteriores de su mismo tipo y marca las que están en curso, que se detienen en el siguiente
+    checkpoint().
+    """
+
+    def __init__(self, concurrency: int = CHAT_QUEUE_CONCURRENCY, max_depth: int = CHAT_QUEUE_MAX_DEPTH):
+        self.concurrency = max(concurrency, 1)
+        self.max_depth = max(max_depth, 1)
+        self._chats: Dict[Hashable, Dict[str, Any]] = {}
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+                       "superseded_queued": 0, "superseded_running": 0, "max_depth_seen": 0}
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def _chat(self, chat_id: Hashable) -> Dict[str, Any]:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = {"running": [], "waiting": deque()}
+        return chat
+
+    def depth(self, chat_id: Hashable) -> int:
+        chat = self._chats.get(chat_id)
+        return len(chat["running"]) + len(chat["waiting"]) if chat else 0
+
+    def _supersede(self, chat: Dict[str, Any], kind: str) -> None:
+        for job in [j for j in chat["waiting"] if j["kind"] == kind]:
+            chat["waiting"].remove(job)
+            job["turn"].set_exception(RequestSuperseded())
+            self._stats["superseded_queued"] += 1
+        for job in chat["running"]:
+            if job["kind"] == kind and not job["superseded"]:
+                job["superseded"] = True
+                self._stats["superseded_running"] += 1
+
+    def _grant(self, chat_id: Hashable) -> None:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return
+        while chat["waiting"] and len(chat["running"]) < self.concurrency:
+            job = chat["waiting"].popleft()
+            chat["running"].append(job)
+            job["turn"].set_result(None)
+        if not chat["running"] and not chat["waiting"]:
+            del self._chats[chat_id]
+
+    async def run(self, chat_id: Hashable, kind: str, factory: Callable[[], Awaitable[Any]],
+                  supersede: bool = False) -> Any:
+        """
+        Ejecuta `factory()` cuando le toque en la cola de `chat_id` y devuelve su resultado.
+        Lanza ChatQueueFull si el chat ya está al límite y RequestSuperseded si una petición
+        posterior del mismo `kind` la sustituye antes o durante la ejecución.
+        """
+        chat = self._chat(chat_id)
+        if supersede:
+            self._supersede(chat, kind)
+        if self.depth(chat_id) >= self.max_depth:
+            self._stats["rejected"] += 1
+            raise ChatQueueFull(f"El chat {chat_id} tiene {self.max_depth} peticiones pendientes.")
+
+        job = {"kind": kind, "superseded": False, "turn": asyncio.get_running_loop().create_future()}
+        chat["waiting"].append(job)
+        self._stats["submitted"] += 1
+        self._stats["max_depth_seen"] = max(self._stats["max_depth_seen"], self.depth(chat_id))
+        queued_at = time.perf_counter()
+        self._grant(chat_id)
+        try:
+            await job["turn"]
+        except asyncio.CancelledError:
+            if job in chat["waiting"]:
+                chat["waiting"].remove(job)
+            elif job in chat["running"]:
+                chat["running"].remove(job)
+            self._grant(chat_id)
+            raise
+        self._waits.append(time.perf_counter() - queued_at)
+
+        token = _current_job.set(job)
+        try:
+            result = await factory()
+            self._stats["completed"] += 1
+            return result
+        except RequestSuperseded:
+            raise
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            _current_job.reset(token)
+            chat["running"].remove(job)
+            self._grant(chat_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidad actual (global y del chat más cargado), contadores y espera en cola p50/p95."""
+        depths = [len(c["running"]) + len(c["waiting"]) for c in self._chats.values()]
+        waits = list(self._waits)
+        p50, p95 = np.percentile(waits, (50, 95)) if waits else (None, None)
+        return {
+            **self._stats,
+            "active_chats": len(self._chats),
+            "running": sum(len(c["running"]) for c in self._chats.values()),
+            "queued": sum(len(c["waiting"]) for c in self._chats.values()),
+            "max_chat_depth": max(depths, default=0),
+            "wait_p50_s": round(float(p50), 3) if p50 is not None else None,
+            "wait_p95_s": round(float(p95), 3) if p95 is not None else None,
+        }
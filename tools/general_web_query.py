@@ -6,6 +6,9 @@ from duckduckgo_search import DDGS
 import re
 import time
 
+from .async_tools import run_blocking
+from .llm_metrics import instrumented_completion
+
 # --- 1. Reformula el prompt para hacer búsquedas claras ---
 def reformulate_prompt(user_query: str) -> str:
     return f"Reformulate this user question for web search clarity: '{user_query}'"
@@ -40,7 +43,9 @@ def extract_relevant_snippets(results: list, keywords: list = []) -> str:
     return "\n\n".join(top)
 
 # --- 4. Genera una respuesta contextual usando el modelo LLM principal ---
-def generate_contextual_response(user_query: str, context_snippets: str, ai_client, model="deepseek/deepseek-chat") -> str:
+CONTEXTUAL_SYSTEM_PROMPT = "Eres un agente experto en análisis estratégico y búsqueda web."
+
+def _contextual_messages(user_query: str, context_snippets: str) -> list:
     prompt = f"""
 Eres un experto en análisis de información general. A continuación tienes fragmentos seleccionados de múltiples fuentes. Usa esta información para responder la siguiente pregunta de forma precisa, sin inventar nada.
 
@@ -51,12 +56,24 @@ Eres un experto en análisis de información general. A continuación tienes fra
 
 <b>Respuesta:</b>
 """
+    return [
+        {"role": "system", "content": CONTEXTUAL_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def generate_contextual_response(user_query: str, context_snippets: str, ai_client, model="deepseek/deepseek-chat") -> str:
     response = ai_client.chat.completions.create(
         model=model,
-        messages=[
-            {"role": "system", "content": "Eres un agente experto en análisis estratégico y búsqueda web."},
-            {"role": "user", "content": prompt}
-        ]
+        messages=_contextual_messages(user_query, context_snippets)
+    )
+    return response.choices[0].message.content.strip()
+
+async def generate_contextual_response_async(user_query: str, context_snippets: str, ai_client, model="deepseek/deepseek-chat") -> str:
+    """Igual que generate_contextual_response, con un cliente AsyncOpenAI (y métricas de la llamada)."""
+    response = await instrumented_completion(
+        ai_client, "general_web_query",
+        model=model,
+        messages=_contextual_messages(user_query, context_snippets)
     )
     return response.choices[0].message.content.strip()
 
@@ -69,10 +86,26 @@ def handle_general_web_query(user_query: str, ai_client, keywords: list = []) ->
     context = extract_relevant_snippets(results, keywords)
     return generate_contextual_response(user_query, context, ai_client)
 
+async def handle_general_web_query_async(user_query: str, ai_client, keywords: list = []) -> str:
+    """DuckDuckGo solo tiene cliente bloqueante: la búsqueda va al pool de E/S y el LLM se espera."""
+    query = user_query if len(user_query.split()) > 5 else reformulate_prompt(user_query)
+    results = await run_blocking(search_web_duckduckgo, query)
+    if not results:
+        return "❌ No se encontraron resultados relevantes en la web."
+    context = extract_relevant_snippets(results, keywords)
+    return await generate_contextual_response_async(user_query, context, ai_client)
+
 # --- 6. Función opcional para enriquecer informes existentes ---
 def enrich_with_general_context(topic: str, ai_client, keywords: list = []) -> dict:
     results = search_web_duckduckgo(topic)
     if not results:
         return {"success": False, "message": "No se encontraron resultados para contexto externo."}
     context = extract_relevant_snippets(results, keywords)
-    return {"success": True, "context": context}
\ No newline at end of file
+    return {"success": True, "context": context}
+
+async def enrich_with_general_context_async(topic: str, ai_client, keywords: list = []) -> dict:
+    results = await run_blocking(search_web_duckduckgo, topic)
+    if not results:
+        return {"success": False, "message": "No se encontraron resultados para contexto externo."}
+    context = extract_relevant_snippets(results, keywords)
+    return {"success": True, "context": context}
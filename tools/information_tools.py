@@ -1,7 +1,9 @@
 # Archivo: tools/information_tools.py
 
 import os
+import asyncio
 import requests
+import httpx
 import json
 from newsapi import NewsApiClient
 from ntscraper import Nitter
@@ -9,6 +11,8 @@ from dotenv import load_dotenv
 import random
 import time
 
+from .async_tools import get_http_client
+
 load_dotenv()
 
 # --- CONFIGURACIÓN DE APIS ---
@@ -37,140 +41,251 @@ except Exception as e:
 if not RAPIDAPI_KEYS:
     print("⚠️ ADVERTENCIA: No se encontraron claves 'RAPID_API_KEY_n'.")
 
-# --- FUNCIÓN CENTRALIZADA PARA LLAMADAS A RAPIDAPI (SIN CAMBIOS) ---
-def _make_rapidapi_request(url: str, host: str, params: dict, service_name: str) -> dict:
-    global current_rapidapi_key_index
+# --- FUNCIÓN CENTRALIZADA PARA LLAMADAS A RAPIDAPI ---
+def _rapidapi_precheck(host: str, service_name: str):
     if not host: return {"success": False, "message": f"Host para {service_name} no configurado en .env"}
     if not RAPIDAPI_KEYS: return {"success": False, "message": f"Claves de API no configuradas."}
+    return None
+
+def _rapidapi_attempts(host: str):
+    """Orden de claves a probar, empezando por la última que funcionó."""
     for i in range(len(RAPIDAPI_KEYS)):
         key_index = (current_rapidapi_key_index + i) % len(RAPIDAPI_KEYS)
-        current_key = RAPIDAPI_KEYS[key_index]
-        headers = {"X-RapidAPI-Key": current_key, "X-RapidAPI-Host": host}
+        yield key_index, {"X-RapidAPI-Key": RAPIDAPI_KEYS[key_index], "X-RapidAPI-Host": host}
+
+def _rapidapi_response(status_code: int, payload_getter, key_index: int, service_name: str):
+    """Interpreta la respuesta de una clave; None significa probar la siguiente."""
+    global current_rapidapi_key_index
+    if status_code == 200:
+        current_rapidapi_key_index = key_index
+        return {"success": True, "data": payload_getter()}
+    elif status_code == 429:
+        print(f"[{service_name}] ⚠️ Límite excedido en clave #{key_index + 1}. Rotando...")
+    else:
+        print(f"[{service_name}] Error {status_code} en clave #{key_index + 1}.")
+    return None
+
+def _make_rapidapi_request(url: str, host: str, params: dict, service_name: str) -> dict:
+    if (error := _rapidapi_precheck(host, service_name)): return error
+    for key_index, headers in _rapidapi_attempts(host):
         try:
             print(f"[{service_name}] Petición con clave #{key_index + 1}...")
             response = requests.get(url, headers=headers, params=params, timeout=10)
-            if response.status_code == 200:
-                current_rapidapi_key_index = key_index
-                return {"success": True, "data": response.json()}
-            elif response.status_code == 429:
-                print(f"[{service_name}] ⚠️ Límite excedido en clave #{key_index + 1}. Rotando...")
-                continue
-            else:
-                print(f"[{service_name}] Error {response.status_code} en clave #{key_index + 1}.")
+            if (result := _rapidapi_response(response.status_code, response.json, key_index, service_name)):
+                return result
         except requests.exceptions.RequestException as e:
             print(f"[{service_name}] Error de conexión con clave #{key_index + 1}: {e}")
     return {"success": False, "message": f"❌ Todas las claves para {service_name} fallaron."}
 
+async def _make_rapidapi_request_async(url: str, host: str, params: dict, service_name: str) -> dict:
+    """Igual que _make_rapidapi_request (con rotación de claves) sobre el cliente HTTP compartido."""
+    if (error := _rapidapi_precheck(host, service_name)): return error
+    for key_index, headers in _rapidapi_attempts(host):
+        try:
+            print(f"[{service_name}] Petición con clave #{key_index + 1}...")
+            response = await get_http_client().get(url, headers=headers, params=params, timeout=10)
+            if (result := _rapidapi_response(response.status_code, response.json, key_index, service_name)):
+                return result
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"[{service_name}] Error de conexión con clave #{key_index + 1}: {e}")
+    return {"success": False, "message": f"❌ Todas las claves para {service_name} fallaron."}
+
 # --- HERRAMIENTAS DE INFORMACIÓN INDIVIDUALES ---
+# Cada fuente define su petición (_xxx_request) y cómo leer la respuesta (_parse_xxx),
+# compartidas por la versión síncrona y la asíncrona.
+
+NEWSAPI_URL = "https://newsapi.org/v2/everything"
+
+def _parse_news(response: dict) -> dict:
+    if response.get('status') == 'ok' and response.get('totalResults') > 0:
+        return {"success": True, "articles": [{"title": a['title'], "source": a['source']['name']} for a in response['articles']]}
+    return {"success": False, "message": "No se encontraron noticias."}
 
 def get_news(query: str, page_size: int = 5) -> dict:
     # ... (código existente)
     if not newsapi: return {"success": False, "message": "NewsAPI no disponible."}
     try:
         response = newsapi.get_everything(q=query, language='en', sort_by='relevancy', page_size=page_size)
-        if response.get('status') == 'ok' and response.get('totalResults') > 0:
-            return {"success": True, "articles": [{"title": a['title'], "source": a['source']['name']} for a in response['articles']]}
+        return _parse_news(response)
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+async def get_news_async(query: str, page_size: int = 5) -> dict:
+    """get_news contra la API REST de NewsAPI directamente (el cliente oficial es bloqueante)."""
+    if not NEWS_API_KEY: return {"success": False, "message": "NewsAPI no disponible."}
+    try:
+        response = await get_http_client().get(
+            NEWSAPI_URL, headers={"X-Api-Key": NEWS_API_KEY},
+            params={"q": query, "language": "en", "sortBy": "relevancy", "pageSize": page_size}
+        )
+        return _parse_news(response.json())
     except Exception as e:
         return {"success": False, "message": str(e)}
-    return {"success": False, "message": "No se encontraron noticias."}
 
 
 def get_tweets(query: str, limit: int = 5) -> dict:
     # ... (código existente simplificado)
     return get_tweets_rapidapi(query, limit)
 
-def get_tweets_rapidapi(query: str, limit: int = 5) -> dict:
+def _tweets_request(query: str, limit: int) -> tuple:
     url = f"https://{HOSTS['twitter']}/search/search"
     params = {"query": query, "section": "top", "limit": str(limit), "language": "es"}
-    result = _make_rapidapi_request(url, HOSTS['twitter'], params, "Twitter")
+    return url, HOSTS['twitter'], params, "Twitter"
+
+def _parse_tweets(result: dict) -> dict:
     if result["success"] and result["data"].get("results"):
         return {"success": True, "tweets": [t["text"] for t in result["data"]["results"] if t.get("text")]}
     return {"success": False, "message": result.get("message", "No se encontraron tweets.")}
 
-def get_facebook_posts(query: str, limit: int = 5) -> dict:
-    # ... (código existente)
-    if not FACEBOOK_BASE_URL: return {"success": False, "message": "URL de Facebook no configurada."}
+def get_tweets_rapidapi(query: str, limit: int = 5) -> dict:
+    return _parse_tweets(_make_rapidapi_request(*_tweets_request(query, limit)))
+
+async def get_tweets_async(query: str, limit: int = 5) -> dict:
+    return _parse_tweets(await _make_rapidapi_request_async(*_tweets_request(query, limit)))
+
+def _facebook_request(query: str, limit: int) -> tuple:
     url = f"{FACEBOOK_BASE_URL.rstrip('/')}/search"
     params = {"query": query, "limit": str(limit)}
-    result = _make_rapidapi_request(url, HOSTS['facebook'], params, "Facebook")
+    return url, HOSTS['facebook'], params, "Facebook"
+
+def _parse_facebook(result: dict) -> dict:
     if result["success"] and (posts := result["data"].get("results") or result["data"].get("posts")):
         return {"success": True, "posts": [p.get("text", "") for p in posts if p.get("text")]}
     return {"success": False, "message": result.get("message", "No se encontraron posts.")}
 
+def get_facebook_posts(query: str, limit: int = 5) -> dict:
+    # ... (código existente)
+    if not FACEBOOK_BASE_URL: return {"success": False, "message": "URL de Facebook no configurada."}
+    return _parse_facebook(_make_rapidapi_request(*_facebook_request(query, limit)))
+
+async def get_facebook_posts_async(query: str, limit: int = 5) -> dict:
+    if not FACEBOOK_BASE_URL: return {"success": False, "message": "URL de Facebook no configurada."}
+    return _parse_facebook(await _make_rapidapi_request_async(*_facebook_request(query, limit)))
+
 # --- NUEVAS FUNCIONES DE NOTICIAS ---
 
-def get_bloomberg_news(limit: int = 5) -> dict:
-    """Obtiene audios de tendencia de Bloomberg."""
-    url = f"https://{HOSTS['bloomberg']}/media/audios-trending"
-    result = _make_rapidapi_request(url, HOSTS['bloomberg'], {}, "Bloomberg")
+def _bloomberg_request() -> tuple:
+    return f"https://{HOSTS['bloomberg']}/media/audios-trending", HOSTS['bloomberg'], {}, "Bloomberg"
+
+def _parse_bloomberg(result: dict, limit: int) -> dict:
     if result["success"] and result["data"]:
         return {"success": True, "audios": [item.get("title") for item in result["data"][:limit]]}
     return {"success": False, "message": result.get("message", "No se encontraron audios.")}
 
-def get_reddit_posts(limit: int = 5) -> dict:
-    """Obtiene los posts más 'hot' de subreddits de finanzas."""
+def get_bloomberg_news(limit: int = 5) -> dict:
+    """Obtiene audios de tendencia de Bloomberg."""
+    return _parse_bloomberg(_make_rapidapi_request(*_bloomberg_request()), limit)
+
+async def get_bloomberg_news_async(limit: int = 5) -> dict:
+    return _parse_bloomberg(await _make_rapidapi_request_async(*_bloomberg_request()), limit)
+
+REDDIT_SUBREDDITS = ["wallstreetbets", "CryptoCurrency", "investing"]
+
+def _reddit_request(subreddit: str, limit: int) -> tuple:
+    url = f"https://{HOSTS['reddit']}/v1/reddit/subreddit/posts"
+    params = {"subreddit": subreddit, "limit": str(limit), "sort": "hot"}
+    return url, HOSTS['reddit'], params, f"Reddit ({subreddit})"
+
+def _parse_reddit(results: list) -> dict:
     posts = []
-    for subreddit in ["wallstreetbets", "CryptoCurrency", "investing"]:
-        url = f"https://{HOSTS['reddit']}/v1/reddit/subreddit/posts"
-        params = {"subreddit": subreddit, "limit": str(limit), "sort": "hot"}
-        result = _make_rapidapi_request(url, HOSTS['reddit'], params, f"Reddit ({subreddit})")
+    for subreddit, result in zip(REDDIT_SUBREDDITS, results):
         if result["success"] and result["data"].get("data"):
             posts.extend([f"({subreddit}): {p.get('title')}" for p in result["data"]["data"]])
     if posts:
         return {"success": True, "posts": posts}
     return {"success": False, "message": "No se pudieron obtener posts de Reddit."}
 
-def get_wsj_news(query: str = "market", limit: int = 5) -> dict:
-    """Busca noticias en el Wall Street Journal."""
+def get_reddit_posts(limit: int = 5) -> dict:
+    """Obtiene los posts más 'hot' de subreddits de finanzas."""
+    return _parse_reddit([_make_rapidapi_request(*_reddit_request(sub, limit)) for sub in REDDIT_SUBREDDITS])
+
+async def get_reddit_posts_async(limit: int = 5) -> dict:
+    """Como get_reddit_posts, con los tres subreddits consultados a la vez."""
+    results = await asyncio.gather(*(_make_rapidapi_request_async(*_reddit_request(sub, limit)) for sub in REDDIT_SUBREDDITS))
+    return _parse_reddit(list(results))
+
+def _wsj_request(query: str, limit: int) -> tuple:
     url = f"https://{HOSTS['wsj']}/api/v1/search"
     params = {"query": query, "count": str(limit)}
-    result = _make_rapidapi_request(url, HOSTS['wsj'], params, "WSJ")
+    return url, HOSTS['wsj'], params, "WSJ"
+
+def _parse_wsj(result: dict) -> dict:
     if result["success"] and result["data"].get("data"):
         return {"success": True, "articles": [item.get("title") for item in result["data"]["data"]]}
     return {"success": False, "message": result.get("message", "No se encontraron artículos.")}
 
-def get_reuters_news(query: str = "finance", limit: int = 5) -> dict:
-    """Busca artículos en Reuters por palabra clave."""
+def get_wsj_news(query: str = "market", limit: int = 5) -> dict:
+    """Busca noticias en el Wall Street Journal."""
+    return _parse_wsj(_make_rapidapi_request(*_wsj_request(query, limit)))
+
+async def get_wsj_news_async(query: str = "market", limit: int = 5) -> dict:
+    return _parse_wsj(await _make_rapidapi_request_async(*_wsj_request(query, limit)))
+
+def _reuters_request(query: str, limit: int) -> tuple:
     url = f"https://{HOSTS['reuters']}/articles/get-articles-by-keyword/{query}/0/{limit}"
-    result = _make_rapidapi_request(url, HOSTS['reuters'], {}, "Reuters")
+    return url, HOSTS['reuters'], {}, "Reuters"
+
+def _parse_reuters(result: dict) -> dict:
     if result["success"] and result["data"].get("articles"):
         return {"success": True, "articles": [item.get("title") for item in result["data"]["articles"]]}
     return {"success": False, "message": result.get("message", "No se encontraron artículos.")}
 
+def get_reuters_news(query: str = "finance", limit: int = 5) -> dict:
+    """Busca artículos en Reuters por palabra clave."""
+    return _parse_reuters(_make_rapidapi_request(*_reuters_request(query, limit)))
+
+async def get_reuters_news_async(query: str = "finance", limit: int = 5) -> dict:
+    return _parse_reuters(await _make_rapidapi_request_async(*_reuters_request(query, limit)))
+
 
 # --- FUNCIÓN AGREGADORA PRINCIPAL ---
 
+# Fuentes del informe: (función síncrona, función asíncrona, clave, consulta)
+BRIEFING_SOURCES = [
+    (get_news, get_news_async, "news_api", "finance, politics, technology"),
+    (get_tweets, get_tweets_async, "twitter", "$BTC, $ETH, market sentiment, economy"),
+    (get_facebook_posts, get_facebook_posts_async, "facebook", "investment opportunities, market crash"),
+    (get_bloomberg_news, get_bloomberg_news_async, "bloomberg", None),
+    (get_reddit_posts, get_reddit_posts_async, "reddit", None),
+    (get_wsj_news, get_wsj_news_async, "wsj", "global market, economy"),
+    (get_reuters_news, get_reuters_news_async, "reuters", "finance")
+]
+
+def _store_briefing_result(briefing_data: dict, key: str, result: dict) -> None:
+    if result.get("success"):
+        briefing_data[key] = result
+    else:
+        briefing_data[key] = {"error": result.get("message", "Unknown error")}
+        print(f"   ! Falló la obtención de datos para {key.upper()}.")
+
 def get_comprehensive_market_briefing_data() -> dict:
     """
     Orquesta la recolección de datos de todas las fuentes para un informe completo.
     """
     print("\n--- INICIANDO INFORME DE INTELIGENCIA DE MERCADO ---")
     
-    # Lista de funciones a ejecutar y la clave bajo la cual guardar sus resultados
-    data_sources = [
-        (get_news, "news_api", "finance, politics, technology"),
-        (get_tweets, "twitter", "$BTC, $ETH, market sentiment, economy"),
-        (get_facebook_posts, "facebook", "investment opportunities, market crash"),
-        (get_bloomberg_news, "bloomberg", None),
-        (get_reddit_posts, "reddit", None),
-        (get_wsj_news, "wsj", "global market, economy"),
-        (get_reuters_news, "reuters", "finance")
-    ]
-    
     briefing_data = {}
     
-    for func, key, query in data_sources:
+    for func, _, key, query in BRIEFING_SOURCES:
         print(f"-> Obteniendo datos de: {key.upper()}")
-        if query:
-            result = func(query)
-        else:
-            result = func()
-            
-        if result.get("success"):
-            briefing_data[key] = result
-        else:
-            briefing_data[key] = {"error": result.get("message", "Unknown error")}
-            print(f"   ! Falló la obtención de datos para {key.upper()}.")
+        result = func(query) if query else func()
+        _store_briefing_result(briefing_data, key, result)
+
+    print("--- INFORME DE INTELIGENCIA COMPLETADO ---\n")
+    return briefing_data
+
+async def get_comprehensive_market_briefing_data_async() -> dict:
+    """Versión asíncrona del informe: todas las fuentes se consultan a la vez."""
+    print("\n--- INICIANDO INFORME DE INTELIGENCIA DE MERCADO (en paralelo) ---")
+    
+    calls = [func(query) if query else func() for _, func, _, query in BRIEFING_SOURCES]
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    
+    briefing_data = {}
+    for (_, _, key, _), result in zip(BRIEFING_SOURCES, results):
+        if isinstance(result, Exception):
+            result = {"success": False, "message": str(result)}
+        _store_briefing_result(briefing_data, key, result)
 
     print("--- INFORME DE INTELIGENCIA COMPLETADO ---\n")
-    return briefing_data
\ No newline at end of file
+    return briefing_data
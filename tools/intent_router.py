@@ -0,0 +1,279 @@
+# Archivo: tools/intent_router.py
+
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from tools.asset_mapper import AssetMapper
+from tools.cache_tools import INTERVAL_SECONDS
+
+# Confianza mínima para resolver una intención sin pasar por el router de la IA
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.75"))
+
+# Mensajes más largos que esto suelen ser preguntas abiertas: mejor que decida la IA
+MAX_FAST_PATH_WORDS = 14
+
+# Valores por defecto, los mismos que declara advanced_router_tool
+DEFAULT_TIMEFRAME = "1h"
+DEFAULT_CAPITAL = 100
+DEFAULT_RISK_LEVEL = "medium"
+DEFAULT_STRATEGY_TYPE = "directional"
+
+# Reglas de SYSTEM_PROMPTS["router_advanced"], en el mismo orden de prioridad.
+# asset: True = requiere activo, False = solo sin activo, None = indiferente.
+INTENT_RULES = [
+    ("whale_analysis", r"\b(ballenas?|whales?|on-?chain|flujos?|actividad de (las )?billeteras|whale analysis)\b", None),
+    ("grid_setup", r"\b(grid|grids|rejilla|grid trading|bot de grid)\b", True),
+    ("strategy_full", r"\b(estrategias?|plan|trade|trading plan|operacion|operar|dca|martingala|martingale)\b", True),
+    ("specific_asset_analysis", r"\b(analisis|analiza|analizar|grafico|grafica|chart|at|como (esta|va)|que (hace|pasa con))\b", True),
+    ("global_market_report", r"\b(resumen|informe|noticias|reporte|como esta el mercado|mercado hoy)\b", False),
+    ("ecosystem_analysis", r"\b(ecosistema|relaciones|conexiones)\b", True),
+    ("top_gainers", r"\b(ganadores|gainers|subiendo|ganando|mas suben|que operar|candidatos|sugerencias|caliente)\b", False),
+    ("top_traded", r"\b(volumen|negociados?|mas tradeados|top traded)\b", False),
+    ("cross_reference_lists", r"\b(comparar listas|en comun|coinciden)\b", None),
+    ("sentiment_check", r"\b(sentimiento|rumores|noticias|narrativa)\b", True),
+    ("conversation", r"^(hola|buenas|buenos dias|buenas (tardes|noches)|gracias|muchas gracias|ok|vale|genial|perfecto|adios|hey)\b[\s!.?]*$", False),
+]
+
+# Pares de intenciones que el prompt del router resuelve explícitamente por prioridad
+RESOLVED_OVERLAPS = {
+    ("whale_analysis", "specific_asset_analysis"),
+    ("whale_analysis", "sentiment_check"),
+    ("strategy_full", "specific_asset_analysis"),
+    ("grid_setup", "strategy_full"),
+    ("grid_setup", "specific_asset_analysis"),
+    ("top_gainers", "top_traded"),
+}
+
+# Indicios de pregunta abierta (intención general_web_query) que restan confianza
+OPEN_QUESTION_PATTERN = re.compile(r"\b(que es|que son|por que|porque|quien|cuando|explica|explicame|como funciona)\b")
+
+# Indicios de seguimiento ("y ahora en 4h", "otra vez") para recuperar el activo del historial
+FOLLOW_UP_PATTERN = re.compile(r"\b(otra vez|de nuevo|ahora|tambien|y en|lo mismo|el mismo)\b")
+
+# Pares con USDT escritos directamente (BTCUSDT, SOLUSDT)
+PAIR_PATTERN = re.compile(r"\b([A-Z0-9]{2,10})USDT\b")
+
+TIMEFRAME_PATTERN = re.compile(r"\b(\d{1,2})\s*(m|min|mins|minutos?|h|hr|horas?|d|dias?|w|semanas?)\b")
+# Timeframes con velas en el exchange; cualquier otro ("3h", "30d") se deja a la IA
+SUPPORTED_TIMEFRAMES = set(INTERVAL_SECONDS)
+TIMEFRAME_WORDS = {"diario": "1d", "daily": "1d", "semanal": "1w", "weekly": "1w", "horario": "1h", "intradia": "15m"}
+# Capital con moneda explícita ($500, 1000 usdt, 2k$); si no hay, "con 500" siempre que el número
+# no sea un plazo ("con 15 minutos"), un número de velas o un apalancamiento ("con 10 x")
+CAPITAL_PATTERN = re.compile(r"\$\s*(\d[\d.,]*)\s*(k)?|(\d[\d.,]*)\s*(k)?\s*(?:usd|usdt|dolares|\$|pavos)")
+CON_CAPITAL_PATTERN = re.compile(
+    r"\bcon\s+(\d[\d.,]*)\s*(k)?\b"
+    r"(?!\s*(?:(?:x|m|min|mins|minutos?|h|hr|horas?|d|dias?|w|semanas?|meses|velas?|apalancamiento|leverage)\b|%))"
+)
+# Tipos de estrategia de generate_advanced_trading_strategy (sin mención = directional)
+STRATEGY_TYPE_WORDS = {
+    "dca": r"\b(dca|dollar cost averaging|promediar|compras? escalonadas?)\b",
+    "martingale": r"\b(martingala|martingale|recuperar (las |mis )?perdidas?)\b",
+    "grid": r"\b(grid|rejilla)\b",
+    "mixed": r"\b(mixta|hibrida|mixed)\b",
+}
+SEED_PATTERN = re.compile(r"\b(?:semilla|seed)\s*[:=]?\s*(\d{1,10})\b")
+RISK_WORDS = {
+    "low": r"\b(riesgo bajo|bajo riesgo|conservador[a]?|poco riesgo|low)\b",
+    "medium": r"\b(riesgo medio|moderad[oa]|medium)\b",
+    "high": r"\b(riesgo alto|alto riesgo|agresiv[oa]|high)\b",
+    "degen": r"\b(degen|yolo|all in|maximo riesgo)\b",
+}
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas y sin acentos, para que las reglas no dependan de la ortografía."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+
+def parse_timeframe(text: str) -> Optional[str]:
+    """Timeframe mencionado en el texto, en el formato del bot (15m, 1h, 4h, 1d, 1w), exista o no."""
+    normalized = normalize_text(text)
+    match = TIMEFRAME_PATTERN.search(normalized)
+    if match:
+        unit = {"s": "w"}.get(match.group(2)[0], match.group(2)[0])
+        return f"{int(match.group(1))}{unit}"
+    for word, timeframe in TIMEFRAME_WORDS.items():
+        if re.search(rf"\b{word}\b", normalized):
+            return timeframe
+    return None
+
+
+def extract_timeframe(text: str) -> Optional[str]:
+    """Extrae el timeframe mencionado si es uno de los soportados."""
+    timeframe = parse_timeframe(text)
+    return timeframe if timeframe in SUPPORTED_TIMEFRAMES else None
+
+
+def _capital_match(text: str) -> Optional[Tuple[str, Optional[str]]]:
+    """(importe, sufijo k) del capital mencionado, prefiriendo el que lleva moneda."""
+    normalized = normalize_text(text)
+    match = CAPITAL_PATTERN.search(normalized)
+    if match:
+        return match.group(1) or match.group(3), match.group(2) or match.group(4)
+    match = CON_CAPITAL_PATTERN.search(normalized)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def mentions_capital(text: str) -> bool:
+    return _capital_match(text) is not None
+
+
+def parse_amount(raw: str) -> Optional[float]:
+    """Convierte un importe con separadores de miles y/o decimales ("1,500.50", "1.500,50", "1.000")."""
+    raw = raw.rstrip(".,")
+    if "." in raw and "," in raw:
+        # Con los dos separadores, el último es el decimal
+        decimal = "." if raw.rfind(".") > raw.rfind(",") else ","
+        thousands_sep = "," if decimal == "." else "."
+        integer, _, fraction = raw.rpartition(decimal)
+        if not re.fullmatch(rf"\d{{1,3}}(\{thousands_sep}\d{{3}})*", integer) or not fraction.isdigit():
+            return None
+        return float(f"{integer.replace(thousands_sep, '')}.{fraction}")
+    # "1.000" y "1,000" son miles; "1000.50" es decimal
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", raw):
+        return float(re.sub(r"[.,]", "", raw))
+    try:
+        return float(raw.replace(",", "."))
+    except ValueError:
+        return None
+
+
+def extract_capital(text: str) -> Optional[float]:
+    """Extrae el capital mencionado ($500, 1000 usdt, 2k$, $1,500.50, ...)."""
+    match = _capital_match(text)
+    if not match:
+        return None
+    raw, thousands = match
+    value = parse_amount(raw)
+    if value is None:
+        return None
+    return value * 1000 if thousands else value
+
+
+def extract_strategy_type(text: str) -> Optional[str]:
+    """Extrae el tipo de estrategia pedido (dca, martingale, grid, mixed) si se menciona."""
+    normalized = normalize_text(text)
+    for strategy_type, pattern in STRATEGY_TYPE_WORDS.items():
+        if re.search(pattern, normalized):
+            return strategy_type
+    return None
+
+
+def extract_seed(text: str) -> Optional[int]:
+    """Extrae la semilla de la simulación Monte Carlo si se pide una ("semilla 42")."""
+    match = SEED_PATTERN.search(normalize_text(text))
+    return int(match.group(1)) if match else None
+
+
+def extract_risk_level(text: str) -> Optional[str]:
+    """Extrae el nivel de riesgo (low, medium, high, degen) si se menciona."""
+    normalized = normalize_text(text)
+    for level, pattern in RISK_WORDS.items():
+        if re.search(pattern, normalized):
+            return level
+    return None
+
+
+class IntentRouter:
+    """
+    Clasificador local de intenciones: aplica las reglas del router de la IA con
+    expresiones compiladas y AssetMapper. Solo responde cuando la confianza supera
+    el umbral; en otro caso devuelve None y se consulta a la IA.
+    """
+
+    def __init__(self, asset_mapper: AssetMapper, threshold: float = ROUTER_CONFIDENCE_THRESHOLD):
+        self.asset_mapper = asset_mapper
+        self.threshold = threshold
+        self.rules = [(intention, re.compile(pattern), needs_asset) for intention, pattern, needs_asset in INTENT_RULES]
+
+    def classify(self, message: str, history: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """Devuelve los parámetros de la intención (como advanced_router_tool) o None si es ambiguo."""
+        normalized = normalize_text(message)
+        if not normalized:
+            return None
+
+        asset = self._extract_asset(message)
+        confidence = 0.95
+        follow_up = bool(history) and FOLLOW_UP_PATTERN.search(normalized) is not None
+        if asset is None and follow_up:
+            asset = self.asset_mapper.extract_asset_from_history(history)
+            confidence -= 0.1
+
+        matches = self._match_rules(normalized)
+        candidates = [
+            intention for intention, pattern, needs_asset in self.rules
+            if intention in matches and (needs_asset is None or needs_asset == (asset is not None))
+        ]
+        if not candidates:
+            previous = self._previous_intention(history) if follow_up else None
+            if asset and not matches and previous:
+                # Seguimiento ("y ahora en 4h"): se repite la intención del mensaje anterior
+                candidates = [previous]
+                confidence -= 0.05
+            elif asset and len(normalized.split()) <= 3 and not matches:
+                # Solo un activo y un timeframe ("BTC 4h"): es un análisis técnico
+                candidates = ["specific_asset_analysis"]
+                confidence -= 0.1
+            else:
+                return None
+
+        intention = candidates[0]
+        others = [other for other in candidates[1:] if (intention, other) not in RESOLVED_OVERLAPS]
+        if others:
+            confidence -= 0.3
+        if intention != "conversation" and OPEN_QUESTION_PATTERN.search(normalized):
+            confidence -= 0.3
+        if len(normalized.split()) > MAX_FAST_PATH_WORDS:
+            confidence -= 0.2
+        if intention == "strategy_full" and asset and self.asset_mapper.is_traditional_asset(asset):
+            confidence -= 0.3
+        # Un timeframe o un capital que no sabemos interpretar no se sustituye por el valor por defecto
+        timeframe = parse_timeframe(message)
+        if timeframe is not None and timeframe not in SUPPORTED_TIMEFRAMES:
+            confidence -= 0.3
+        capital = extract_capital(message)
+        if capital is None and mentions_capital(message):
+            confidence -= 0.3
+
+        if confidence < self.threshold:
+            print(f"-> Router local: '{intention}' con confianza {confidence:.2f}; se consulta a la IA.")
+            return None
+
+        print(f"-> Router local: '{intention}' (confianza {confidence:.2f}), sin llamada a la IA.")
+        return {
+            "intention": intention,
+            "asset_name": asset or "NONE",
+            "timeframe": timeframe or DEFAULT_TIMEFRAME,
+            "capital": capital or DEFAULT_CAPITAL,
+            "risk_level": extract_risk_level(message) or DEFAULT_RISK_LEVEL,
+            "strategy_type": extract_strategy_type(message) or DEFAULT_STRATEGY_TYPE,
+            "seed": extract_seed(message),
+            "confidence": round(confidence, 2),
+            "source": "local"
+        }
+
+    def _extract_asset(self, message: str) -> Optional[str]:
+        """AssetMapper sobre el texto, aceptando también pares completos (SOLUSDT -> SOL)."""
+        asset = self.asset_mapper.extract_asset_from_text(message)
+        if asset is None:
+            pair = PAIR_PATTERN.search(message.upper())
+            if pair:
+                asset = pair.group(1)
+        return asset
+
+    def _match_rules(self, normalized: str) -> List[str]:
+        return [intention for intention, pattern, _ in self.rules if pattern.search(normalized)]
+
+    def _previous_intention(self, history: List[Dict]) -> Optional[str]:
+        """Intención del último mensaje del usuario con un activo (solo las que lo requieren)."""
+        for message in reversed(history):
+            if message.get('role') != 'user':
+                continue
+            matches = self._match_rules(normalize_text(message.get('content', '')))
+            for intention, _, needs_asset in self.rules:
+                if needs_asset and intention in matches:
+                    return intention
+        return None
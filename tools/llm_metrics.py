@@ -0,0 +1,298 @@
+# Archivo: tools/llm_metrics.py
+
+import os
+import json
+import time
+import queue
+import asyncio
+import threading
+import numpy as np
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from .prompt_compactor import estimate_tokens
+from .llm_scheduler import llm_scheduler, LLMOverloadedError, is_rate_limit_error, retry_after_seconds
+
+# Llamadas recientes que se conservan por (handler, modelo) para calcular percentiles
+LLM_METRICS_WINDOW = int(os.getenv("LLM_METRICS_WINDOW", "500"))
+# Una línea JSON por llamada para análisis offline (vacío = desactivado). Se escribe en un hilo
+# aparte y, al superar LLM_METRICS_FILE_MAX_MB, el archivo pasa a <nombre>.1 y se empieza otro
+LLM_METRICS_FILE = os.getenv("LLM_METRICS_FILE", "")
+LLM_METRICS_FILE_MAX_MB = float(os.getenv("LLM_METRICS_FILE_MAX_MB", "50"))
+# Endpoint HTTP con las métricas en JSON (puerto 0 = desactivado)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Precio en USD por millón de tokens (entrada, salida); los modelos ":free" no cuestan nada
+MODEL_PRICES_USD_PER_MTOKEN = {
+    "google/gemini-flash-1.5": (0.075, 0.30),
+    "deepseek/deepseek-chat": (0.27, 1.10),
+}
+
+
+def call_cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    if not model or model.endswith(":free"):
+        return 0.0
+    price_in, price_out = MODEL_PRICES_USD_PER_MTOKEN.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+def _percentiles(samples: List[float], pcts: Tuple[int, ...]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {f"p{p}": None for p in pcts}
+    values = np.percentile(samples, pcts)
+    return {f"p{p}": round(float(v), 3) for p, v in zip(pcts, values)}
+
+
+class LLMMetrics:
+    """
+    Métricas de cada llamada a la IA por handler y modelo: tiempo total, tiempo hasta el
+    primer token, tokens, coste y estado de la caché.
+    """
+
+    def __init__(self, window: int = LLM_METRICS_WINDOW, dump_path: Optional[str] = LLM_METRICS_FILE,
+                 dump_max_bytes: int = int(LLM_METRICS_FILE_MAX_MB * 1024 * 1024)):
+        self.window = window
+        self.dump_path = dump_path or None
+        self.dump_max_bytes = dump_max_bytes
+        self._series: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._dump_queue: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    def _entry(self, handler: str, model: str) -> Dict[str, Any]:
+        key = (handler, model or "?")
+        entry = self._series.get(key)
+        if entry is None:
+            entry = {
+                "calls": 0, "cache_hits": 0, "errors": 0, "cancelled": 0, "rejected": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "estimated_tokens": 0, "cost_usd": 0.0,
+                "wall": deque(maxlen=self.window), "ttft": deque(maxlen=self.window),
+                "queue": deque(maxlen=self.window),
+            }
+            self._series[key] = entry
+        return entry
+
+    def record(self, handler: str, model: str, wall_s: float = 0.0, ttft_s: Optional[float] = None,
+               prompt_tokens: int = 0, completion_tokens: int = 0, cache: str = "off",
+               status: str = "ok", stream: bool = False, estimated: bool = False,
+               queue_s: Optional[float] = None) -> None:
+        """
+        `cache` es "hit", "miss" u "off" (llamada sin caché); `status` es "ok", "error",
+        "cancelled" (p. ej. el modelo que pierde una carrera cubierta) o "rejected" (sin
+        turno en el planificador). `queue_s` es la espera en la cola del planificador.
+        """
+        cost = call_cost_usd(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            entry = self._entry(handler, model)
+            entry["calls"] += 1
+            if cache == "hit":
+                entry["cache_hits"] += 1
+            elif status == "ok":
+                # Los percentiles solo cuentan llamadas completas (no errores ni carreras perdidas)
+                entry["wall"].append(wall_s)
+                if ttft_s is not None:
+                    entry["ttft"].append(ttft_s)
+            entry["errors"] += int(status == "error")
+            entry["cancelled"] += int(status == "cancelled")
+            entry["rejected"] += int(status == "rejected")
+            if queue_s is not None:
+                entry["queue"].append(queue_s)
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["estimated_tokens"] += int(estimated)
+            entry["cost_usd"] += cost
+
+        if self.dump_path:
+            line = {
+                "ts": round(time.time(), 3), "handler": handler, "model": model, "cache": cache,
+                "status": status, "stream": stream, "wall_s": round(wall_s, 3),
+                "ttft_s": round(ttft_s, 3) if ttft_s is not None else None,
+                "queue_s": round(queue_s, 3) if queue_s is not None else None,
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "estimated_tokens": estimated, "cost_usd": round(cost, 6),
+            }
+            self._dump(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def _dump(self, line: str) -> None:
+        """Encola la línea para el hilo escritor (el bucle de eventos no toca el disco)."""
+        self._dump_queue.put(line)
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="llm-metrics-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        while True:
+            lines = [self._dump_queue.get()]
+            while not self._dump_queue.empty():
+                lines.append(self._dump_queue.get())
+            try:
+                if self.dump_max_bytes and os.path.exists(self.dump_path) \
+                        and os.path.getsize(self.dump_path) >= self.dump_max_bytes:
+                    os.replace(self.dump_path, f"{self.dump_path}.1")
+                with open(self.dump_path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+            except OSError as e:
+                print(f"⚠️ No se pudo escribir la métrica en {self.dump_path}: {e}")
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        """{handler: {modelo: resumen}} con percentiles de la ventana y acumulados."""
+        with self._lock:
+            series = {key: {**entry, "wall": list(entry["wall"]), "ttft": list(entry["ttft"]), "queue": list(entry["queue"])}
+                      for key, entry in self._series.items()}
+        report: Dict[str, Dict[str, Dict]] = {}
+        for (handler, model), s in sorted(series.items()):
+            report.setdefault(handler, {})[model] = {
+                "calls": s["calls"],
+                "cache_hits": s["cache_hits"],
+                "cache_hit_rate": round(s["cache_hits"] / s["calls"] * 100, 1) if s["calls"] else 0.0,
+                "errors": s["errors"],
+                "cancelled": s["cancelled"],
+                "rejected": s["rejected"],
+                "wall_s": _percentiles(s["wall"], (50, 95, 99)),
+                "ttft_s": _percentiles(s["ttft"], (50, 95)),
+                "queue_s": _percentiles(s["queue"], (50, 95)),
+                "prompt_tokens": s["prompt_tokens"],
+                "completion_tokens": s["completion_tokens"],
+                "estimated_tokens": s["estimated_tokens"],
+                "cost_usd": round(s["cost_usd"], 4),
+            }
+        return report
+
+
+llm_metrics = LLMMetrics()
+
+
+def _prompt_text(kwargs: Dict) -> str:
+    return "\n".join(str(m.get("content") or "") for m in kwargs.get("messages", []))
+
+
+def _usage(usage, kwargs: Dict, output_text: str) -> Tuple[int, int, bool]:
+    """Tokens de la respuesta; si el proveedor no los devuelve, se estiman."""
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return usage.prompt_tokens or 0, usage.completion_tokens or 0, False
+    return estimate_tokens(_prompt_text(kwargs)), estimate_tokens(output_text), True
+
+
+def _on_provider_error(model: str, error: Exception) -> None:
+    if is_rate_limit_error(error):
+        llm_scheduler.penalize(model, retry_after_seconds(error))
+
+
+async def instrumented_completion(client, handler: str, cache: str = "off", **kwargs):
+    """
+    client.chat.completions.create (sin streaming) midiendo la llamada. Antes espera su
+    turno en el planificador (tools/llm_scheduler) con la prioridad del contexto actual.
+    """
+    model = kwargs.get("model")
+    started = time.perf_counter()
+    queue_s = None
+    status = "error"
+    response = None
+    try:
+        queue_s = await llm_scheduler.acquire(model)
+        started = time.perf_counter()
+        response = await client.chat.completions.create(**kwargs)
+        status = "ok"
+        return response
+    except LLMOverloadedError:
+        status = "rejected"
+        raise
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except Exception as e:
+        _on_provider_error(model, e)
+        raise
+    finally:
+        wall = time.perf_counter() - started if queue_s is not None else 0.0
+        prompt_tokens, completion_tokens, estimated = 0, 0, False
+        if response is not None:
+            output = (response.choices[0].message.content or "") if getattr(response, "choices", None) else ""
+            prompt_tokens, completion_tokens, estimated = _usage(getattr(response, "usage", None), kwargs, output)
+        llm_metrics.record(handler, model, wall_s=wall, ttft_s=wall, prompt_tokens=prompt_tokens,
+                           completion_tokens=completion_tokens, cache=cache, status=status,
+                           estimated=estimated, queue_s=queue_s)
+
+
+async def instrumented_stream(client, handler: str, cache: str = "off", **kwargs) -> AsyncIterator[Any]:
+    """
+    client.chat.completions.create(stream=True) como generador asíncrono de fragmentos,
+    midiendo el tiempo hasta el primer token y pidiendo el uso de tokens en el último fragmento.
+    Como instrumented_completion, espera antes su turno en el planificador.
+    """
+    model = kwargs.get("model")
+    started = time.perf_counter()
+    queue_s = None
+    ttft = None
+    usage = None
+    output = ""
+    status = "error"
+    stream = None
+    try:
+        queue_s = await llm_scheduler.acquire(model)
+        started = time.perf_counter()
+        stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if chunk.choices and (delta := chunk.choices[0].delta.content):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                output += delta
+            yield chunk
+        status = "ok"
+    except LLMOverloadedError:
+        status = "rejected"
+        raise
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"
+        raise
+    except Exception as e:
+        _on_provider_error(model, e)
+        raise
+    finally:
+        if stream is not None:
+            # Liberar la conexión HTTP aunque se corte a medias; un fallo al cerrar no
+            # debe tapar la cancelación o el error original
+            try:
+                await asyncio.shield(stream.close())
+            except BaseException as e:
+                print(f"  ⚠️ No se pudo cerrar el stream de [{handler}]: {e!r}")
+        # Si la petición ni siquiera se abrió no hubo consumo de tokens
+        prompt_tokens, completion_tokens, estimated = _usage(usage, kwargs, output) if stream is not None else (0, 0, False)
+        llm_metrics.record(handler, model, wall_s=time.perf_counter() - started if queue_s is not None else 0.0,
+                           ttft_s=ttft, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           cache=cache, status=status, stream=True, estimated=estimated, queue_s=queue_s)
+
+
+async def start_metrics_server(collect: Callable[[], Dict], host: str = METRICS_HOST,
+                               port: int = METRICS_PORT) -> Optional[asyncio.AbstractServer]:
+    """
+    Servidor HTTP mínimo: GET /metrics devuelve `collect()` en JSON. Con puerto 0 no arranca.
+    """
+    if not port:
+        return None
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", json.dumps(collect(), ensure_ascii=False, default=str).encode("utf-8")
+            else:
+                status, body = "404 Not Found", b'{"error": "not found"}'
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"📈 Métricas de la IA en http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,346 @@
+# Archivo: tools/llm_scheduler.py
+
+import os
+import time
+import asyncio
+import threading
+import contextvars
+import numpy as np
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, Optional, Tuple
+
+# Clases de prioridad, de mayor a menor: el usuario esperando, las alertas proactivas
+# de ballenas y el trabajo en segundo plano (prefetch, precálculos)
+PRIORITY_CLASSES = ("interactive", "alerts", "background")
+INTERACTIVE, ALERTS, BACKGROUND = PRIORITY_CLASSES
+
+# Peticiones por minuto que se lanzan a cada modelo y ráfaga permitida. Los modelos ":free"
+# de OpenRouter admiten ~20/min; LLM_RATE_LIMITS ajusta modelos concretos ("modelo=rpm,...")
+LLM_FREE_MODEL_RPM = float(os.getenv("LLM_FREE_MODEL_RPM", "20"))
+LLM_MODEL_RPM = float(os.getenv("LLM_MODEL_RPM", "120"))
+LLM_BURST = float(os.getenv("LLM_BURST", "4"))
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+
+# Peticiones en cola por modelo y, dentro de ellas, por chat (control de admisión)
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "64"))
+LLM_QUEUE_MAX_PER_CHAT = int(os.getenv("LLM_QUEUE_MAX_PER_CHAT", "3"))
+
+# Espera máxima en cola (segundos) de cada clase: pasado el plazo la petición se rechaza
+LLM_MAX_QUEUE_WAIT = {
+    INTERACTIVE: float(os.getenv("LLM_MAX_QUEUE_WAIT_INTERACTIVE", "30")),
+    ALERTS: float(os.getenv("LLM_MAX_QUEUE_WAIT_ALERTS", "120")),
+    BACKGROUND: float(os.getenv("LLM_MAX_QUEUE_WAIT_BACKGROUND", "15")),
+}
+
+# Pausa (segundos) tras un 429 del proveedor si no indica Retry-After
+LLM_RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "10"))
+
+# Esperas recientes que se conservan por modelo y clase para los percentiles
+WAIT_SAMPLES = 200
+
+# Prioridad y clave de equidad (el chat) de las llamadas que haga la tarea actual
+_current_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+_current_owner: contextvars.ContextVar[Hashable] = contextvars.ContextVar("llm_owner", default=None)
+
+
+class LLMOverloadedError(RuntimeError):
+    """La petición no se admitió en la cola del modelo o esperó más de lo permitido a su clase."""
+
+
+def set_llm_context(priority: str, owner: Hashable = None) -> None:
+    """
+    Fija la clase de prioridad y el dueño (chat) de las llamadas a la IA que haga la tarea
+    actual y las tareas que cree a partir de ahora. Cada update de Telegram corre en su
+    propia tarea, así que no afecta a los demás.
+    """
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Prioridad desconocida: {priority}")
+    _current_priority.set(priority)
+    _current_owner.set(owner)
+
+
+def current_llm_context() -> Tuple[str, Hashable]:
+    return _current_priority.get(), _current_owner.get()
+
+
+def _parse_rate_limits(value: str) -> Dict[str, float]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        model, _, rpm = item.rpartition("=")
+        try:
+            limits[model] = float(rpm)
+        except ValueError:
+            print(f"⚠️ LLM_RATE_LIMITS: entrada ignorada '{item}'")
+    return limits
+
+
+def model_rpm(model: str, overrides: Dict[str, float]) -> float:
+    if model in overrides:
+        return overrides[model]
+    return LLM_FREE_MODEL_RPM if (model or "").endswith(":free") else LLM_MODEL_RPM
+
+
+class TokenBucket:
+    """Cubo de fichas: `rate` peticiones por segundo con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Segundos hasta que haya una ficha disponible (0 si ya la hay)."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else LLM_RATE_LIMIT_BACKOFF
+
+    def take(self) -> None:
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """El proveedor ha respondido 429: no se lanza nada durante `seconds` y la ráfaga se vacía."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class _ModelQueue:
+    """
+    Cola de un modelo en un event loop: una subcola por clase de prioridad y, dentro de
+    cada clase, una fila por dueño que se atiende por turnos (round-robin).
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, bucket: TokenBucket):
+        self.loop = loop
+        self.bucket = bucket
+        self.classes: Dict[str, "OrderedDict[Hashable, Deque[Dict[str, Any]]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_CLASSES
+        }
+        self.size = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def pending(self, priority: str, owner: Hashable = None) -> int:
+        rows = self.classes[priority]
+        if owner is not None:
+            return len(rows.get(owner, ()))
+        return sum(len(row) for row in rows.values())
+
+    def ahead_of(self, priority: str) -> int:
+        """Peticiones que se atenderían antes que una nueva de `priority` (aproximado)."""
+        return sum(self.pending(p) for p in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1])
+
+    def push(self, waiter: Dict[str, Any]) -> None:
+        self.classes[waiter["priority"]].setdefault(waiter["owner"], deque()).append(waiter)
+        self.size += 1
+
+    def remove(self, waiter: Dict[str, Any]) -> bool:
+        rows = self.classes[waiter["priority"]]
+        row = rows.get(waiter["owner"])
+        if row is None or waiter not in row:
+            return False
+        row.remove(waiter)
+        if not row:
+            del rows[waiter["owner"]]
+        self.size -= 1
+        return True
+
+    def pop_next(self) -> Optional[Dict[str, Any]]:
+        for priority in PRIORITY_CLASSES:
+            rows = self.classes[priority]
+            if not rows:
+                continue
+            owner, row = next(iter(rows.items()))
+            waiter = row.popleft()
+            # El dueño pasa al final de la ronda: un chat con muchas peticiones no acapara la clase
+            del rows[owner]
+            if row:
+                rows[owner] = row
+            self.size -= 1
+            return waiter
+        return None
+
+    def eviction_candidate(self, priority: str) -> Optional[Dict[str, Any]]:
+        """La petición más reciente del dueño más cargado de la clase más baja, si es inferior a `priority`."""
+        for lower in reversed(PRIORITY_CLASSES[PRIORITY_CLASSES.index(priority) + 1:]):
+            rows = self.classes[lower]
+            if rows:
+                return max(rows.values(), key=len)[-1]
+        return None
+
+
+class LLMScheduler:
+    """
+    Punto único por el que pasan las llamadas a la IA: limita el ritmo de cada modelo con
+    un cubo de fichas y reparte los turnos por prioridad (interactive > alerts > background)
+    y, dentro de cada clase, por turnos entre chats. Las colas están acotadas: lo que no
+    cabe, o no llegaría a tiempo, se rechaza con LLMOverloadedError en lugar de acumularse.
+    """
+
+    def __init__(self, rate_limits: str = LLM_RATE_LIMITS, burst: float = LLM_BURST,
+                 queue_max: int = LLM_QUEUE_MAX, queue_max_per_chat: int = LLM_QUEUE_MAX_PER_CHAT,
+                 max_wait: Optional[Dict[str, float]] = None):
+        self.overrides = _parse_rate_limits(rate_limits)
+        self.burst = burst
+        self.queue_max = queue_max
+        self.queue_max_per_chat = queue_max_per_chat
+        self.max_wait = {**LLM_MAX_QUEUE_WAIT, **(max_wait or {})}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queues: Dict[Tuple[int, str], _ModelQueue] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, model: str) -> TokenBucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            bucket = self._buckets[model] = TokenBucket(model_rpm(model, self.overrides) / 60, self.burst)
+        return bucket
+
+    def _queue(self, model: str) -> _ModelQueue:
+        loop = asyncio.get_running_loop()
+        key = (id(loop), model)
+        queue = self._queues.get(key)
+        if queue is None or queue.loop is not loop:
+            queue = self._queues[key] = _ModelQueue(loop, self._bucket(model))
+        return queue
+
+    def _model_stats(self, model: str) -> Dict[str, Any]:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = {
+                "granted": {p: 0 for p in PRIORITY_CLASSES},
+                "rejected": {"queue_full": 0, "chat_limit": 0, "wait_estimate": 0, "timeout": 0, "evicted": 0},
+                "rate_limited": 0,
+                "waits": {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_CLASSES},
+            }
+        return stats
+
+    def _reject(self, model: str, reason: str, message: str) -> LLMOverloadedError:
+        with self._lock:
+            self._model_stats(model)["rejected"][reason] += 1
+        print(f"  ⚠️ Planificador IA [{model}]: {message}")
+        return LLMOverloadedError(message)
+
+    def _admit(self, queue: _ModelQueue, model: str, waiter: Dict[str, Any]) -> None:
+        priority, owner = waiter["priority"], waiter["owner"]
+        if owner is not None and queue.pending(priority, owner) >= self.queue_max_per_chat:
+            raise self._reject(model, "chat_limit", f"el chat {owner} ya tiene {self.queue_max_per_chat} peticiones {priority} en cola")
+
+        # Si la cola no avanzaría a tiempo para esta clase, se rechaza ya en vez de hacer esperar
+        bucket = queue.bucket
+        backlog = max(queue.ahead_of(priority) + 1 - bucket.tokens, 0)
+        estimate = bucket.wait_time() + (backlog / bucket.rate if bucket.rate > 0 else 0.0)
+        if estimate > self.max_wait[priority]:
+            raise self._reject(model, "wait_estimate", f"espera estimada {estimate:.0f}s para {priority} (máx. {self.max_wait[priority]:g}s)")
+
+        if queue.size >= self.queue_max:
+            victim = queue.eviction_candidate(priority)
+            if victim is None:
+                raise self._reject(model, "queue_full", f"cola llena ({self.queue_max}) para {priority}")
+            queue.remove(victim)
+            if not victim["future"].done():
+                victim["future"].set_exception(self._reject(model, "evicted", f"petición {victim['priority']} desplazada por una {priority}"))
+        queue.push(waiter)
+
+    def _dispatch(self, queue: _ModelQueue) -> None:
+        """Concede turnos mientras haya fichas; si no, se reprograma para cuando las haya."""
+        queue.timer = None
+        while queue.size:
+            wait = queue.bucket.wait_time()
+            if wait > 0:
+                queue.timer = queue.loop.call_later(wait, self._dispatch, queue)
+                return
+            waiter = queue.pop_next()
+            if waiter is None or waiter["future"].done():
+                continue
+            queue.bucket.take()
+            waiter["future"].set_result(None)
+
+    async def acquire(self, model: str) -> float:
+        """
+        Espera el turno de una llamada a `model` con la prioridad y el chat del contexto
+        actual (ver set_llm_context). Devuelve los segundos esperados en cola.
+        """
+        priority, owner = current_llm_context()
+        queue = self._queue(model)
+        started = time.perf_counter()
+        waiter = {"priority": priority, "owner": owner, "future": queue.loop.create_future()}
+        self._admit(queue, model, waiter)
+        if queue.timer is None:
+            self._dispatch(queue)
+        try:
+            await asyncio.wait_for(waiter["future"], timeout=self.max_wait[priority])
+        except asyncio.TimeoutError:
+            queue.remove(waiter)
+            raise self._reject(model, "timeout", f"petición {priority} sin turno tras {self.max_wait[priority]:g}s") from None
+        except asyncio.CancelledError:
+            # Cancelada en cola (p. ej. el modelo que pierde una carrera cubierta): deja su hueco
+            queue.remove(waiter)
+            raise
+        waited = time.perf_counter() - started
+        with self._lock:
+            stats = self._model_stats(model)
+            stats["granted"][priority] += 1
+            stats["waits"][priority].append(waited)
+        return waited
+
+    def penalize(self, model: str, retry_after: Optional[float] = None) -> None:
+        """El proveedor devolvió 429 pese al límite: se pausa el modelo y se vacía su ráfaga."""
+        seconds = retry_after if retry_after and retry_after > 0 else LLM_RATE_LIMIT_BACKOFF
+        self._bucket(model).block(seconds)
+        with self._lock:
+            self._model_stats(model)["rate_limited"] += 1
+        print(f"  ⚠️ Planificador IA [{model}]: 429 del proveedor, pausa de {seconds:g}s")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Por modelo: límite, cola actual por clase, turnos concedidos, rechazos y esperas p50/p95."""
+        report = {}
+        with self._lock:
+            for model, stats in sorted(self._stats.items()):
+                queued = {p: 0 for p in PRIORITY_CLASSES}
+                for (_, queue_model), queue in self._queues.items():
+                    if queue_model == model:
+                        for p in PRIORITY_CLASSES:
+                            queued[p] += queue.pending(p)
+                waits = {}
+                for p, samples in stats["waits"].items():
+                    if samples:
+                        p50, p95 = np.percentile(list(samples), (50, 95))
+                        waits[p] = {"p50_s": round(float(p50), 3), "p95_s": round(float(p95), 3)}
+                report[model] = {
+                    "rpm": model_rpm(model, self.overrides),
+                    "queued": queued,
+                    "granted": dict(stats["granted"]),
+                    "rejected": dict(stats["rejected"]),
+                    "rate_limited": stats["rate_limited"],
+                    "wait": waits,
+                }
+        return report
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After de un error 429 del cliente de OpenAI, si lo trae."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,175 @@
+# Archivo: tools/model_hedging.py
+
+import os
+import asyncio
+import threading
+import numpy as np
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Percentil de la latencia del modelo principal a partir del cual se lanza el de respaldo
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
+# Espera antes de cubrirse mientras no haya muestras suficientes, y límites de esa espera
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "8"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "20"))
+HEDGE_MIN_SAMPLES = 5
+# Últimas latencias que se conservan por modelo
+HEDGE_LATENCY_WINDOW = 100
+
+Contender = Tuple[str, Callable[[], Awaitable[Any]]]
+
+
+class LatencyTracker:
+    """
+    Ventana de latencias recientes (segundos) por modelo, con percentiles. Las muestras
+    censuradas son llamadas cortadas antes de terminar: se guarda lo que llevaban, que es
+    una cota inferior de su latencia real (sin ellas las colas lentas no se verían nunca).
+    """
+
+    def __init__(self, window: int = HEDGE_LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float, censored: bool = False) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append((seconds, censored))
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        """Percentil de la latencia del modelo, o None si aún hay pocas muestras."""
+        with self._lock:
+            samples = [seconds for seconds, _ in self._samples.get(model, ())]
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return float(np.percentile(samples, pct))
+
+    def hedge_delay(self, model: str) -> float:
+        """Segundos que se espera al modelo antes de lanzar el de respaldo."""
+        observed = self.percentile(model, HEDGE_PERCENTILE)
+        if observed is None:
+            return HEDGE_DEFAULT_DELAY
+        return min(max(observed, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            snapshot = {model: list(samples) for model, samples in self._samples.items()}
+        report = {}
+        for model, samples in snapshot.items():
+            if not samples:
+                continue
+            seconds = [value for value, _ in samples]
+            report[model] = {
+                "samples": len(samples),
+                "censored": sum(1 for _, censored in samples if censored),
+                "p50_s": round(float(np.percentile(seconds, 50)), 2),
+                "p90_s": round(float(np.percentile(seconds, 90)), 2),
+                "p99_s": round(float(np.percentile(seconds, 99)), 2),
+            }
+        return report
+
+
+async def hedged_race(primary: Contender, backup: Contender, hedge_after: float, deadline: float,
+                      tracker: Optional[LatencyTracker] = None,
+                      first_token: Optional[Dict[str, asyncio.Event]] = None) -> Tuple[Optional[str], Any]:
+    """
+    Lanza `primary`; si no ha terminado tras `hedge_after` segundos (o falla antes), lanza
+    también `backup`. Devuelve (nombre, resultado) del primero que termine con un resultado
+    no vacío, prefiriendo el principal si ambos terminan a la vez, y cancela el otro. Si
+    ninguno lo consigue dentro de `deadline` segundos devuelve (None, None).
+
+    Con `first_token` (un evento por contendiente que se activa con su primer token en
+    streaming) la carrera se decide por el tiempo hasta el primer token: el que empieza a
+    escribir se queda solo, se cancela el otro y ya no se lanza el respaldo (el respaldo
+    solo entra si el elegido falla). `tracker` recibe entonces ese tiempo en vez del total.
+    Si el principal se corta sin haber terminado (o sin haber escrito), se registra lo que
+    llevaba como muestra censurada.
+    """
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    preference = [primary[0], backup[0]]
+    launched_at: Dict[str, float] = {}
+    tasks: Dict[asyncio.Future, str] = {}
+    committed: Optional[str] = None
+
+    def launch(contender: Contender) -> None:
+        name, factory = contender
+        launched_at[name] = loop.time()
+        tasks[asyncio.ensure_future(factory())] = name
+
+    def record(name: str, censored: bool = False) -> None:
+        if tracker is not None:
+            tracker.record(name, loop.time() - launched_at[name], censored=censored)
+
+    def drop(task: asyncio.Future) -> None:
+        name = tasks.pop(task)
+        task.cancel()
+        if name == primary[0]:
+            record(name, censored=True)
+
+    def commit_first_streamer() -> None:
+        nonlocal committed
+        for name in preference:
+            if name in launched_at and first_token[name].is_set():
+                committed = name
+                break
+        else:
+            return
+        record(committed)
+        for task in [t for t, name in tasks.items() if name != committed]:
+            print(f"  ⏩ {committed} ya está escribiendo; se cancela {tasks[task]}.")
+            drop(task)
+
+    launch(primary)
+    try:
+        while True:
+            if first_token and committed is None:
+                commit_first_streamer()
+            if not tasks:
+                if backup[0] in launched_at:
+                    return None, None
+                print(f"  ⚠️ {primary[0]} falló; se lanza {backup[0]} sin esperar.")
+                launch(backup)
+            waiting_hedge = backup[0] not in launched_at and committed is None
+            elapsed = loop.time() - started_at
+            next_event = min(hedge_after, deadline) if waiting_hedge else deadline
+            watchers = []
+            if first_token and committed is None:
+                watchers = [asyncio.ensure_future(first_token[name].wait()) for name in launched_at]
+            try:
+                done, _ = await asyncio.wait([*tasks, *watchers], timeout=max(next_event - elapsed, 0),
+                                             return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for watcher in watchers:
+                    watcher.cancel()
+            done = [task for task in done if task in tasks]
+            if not done:
+                if first_token and committed is None and any(first_token[n].is_set() for n in launched_at):
+                    continue
+                if not waiting_hedge or loop.time() - started_at >= deadline:
+                    print(f"  ❌ Ningún modelo respondió en {deadline:g}s.")
+                    return None, None
+                print(f"  ⏱️ {primary[0]} supera {hedge_after:.1f}s; se lanza {backup[0]} en paralelo.")
+                launch(backup)
+                continue
+            for task in sorted(done, key=lambda t: preference.index(tasks[t])):
+                name = tasks.pop(task)
+                if task.cancelled():
+                    print(f"  ⚠️ {name} se canceló.")
+                elif task.exception() is not None:
+                    print(f"  ⚠️ {name} falló: {task.exception()}")
+                elif task.result():
+                    if not first_token:
+                        record(name)
+                    elif committed is None:
+                        # Terminó sin pasar por el streaming (p. ej. respuesta cacheada)
+                        committed = name
+                        record(name)
+                    for other in list(tasks):
+                        drop(other)
+                    return name, task.result()
+                else:
+                    print(f"  ⚠️ {name} devolvió una respuesta vacía.")
+    finally:
+        for task in list(tasks):
+            drop(task)
@@ -0,0 +1,167 @@
+# Archivo: tools/monte_carlo.py
+
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+# Semilla de las simulaciones si el usuario no elige una (vacío = una nueva en cada simulación,
+# que se devuelve con el resultado para poder repetirla)
+MONTE_CARLO_SEED = os.getenv("MONTE_CARLO_SEED", "")
+
+# Número de trayectorias por defecto (suficiente para percentiles estables en <1s)
+DEFAULT_PATHS = 20000
+
+# Velas simuladas para un plan DCA según el timeframe de los datos
+DCA_HORIZON_BARS = {"15m": 384, "1h": 336, "4h": 180, "1d": 90}
+
+# Velas que dura cada trade de la recuperación tipo martingala
+MARTINGALE_TRADE_BARS = 16
+
+# Pérdida (fracción del capital) a partir de la cual se considera ruina
+RUIN_THRESHOLD = 0.5
+
+
+def log_returns_from_prices(prices) -> np.ndarray:
+    """Rendimientos logarítmicos limpios (sin NaN/inf) a partir de una serie de precios."""
+    prices = np.asarray(prices, dtype=float)
+    prices = prices[np.isfinite(prices) & (prices > 0)]
+    if len(prices) < 2:
+        return np.array([])
+    return np.diff(np.log(prices))
+
+
+def resolve_seed(seed: Optional[int] = None) -> int:
+    """Semilla efectiva: la del usuario, la de MONTE_CARLO_SEED o una aleatoria nueva."""
+    if seed is not None:
+        return int(seed)
+    if MONTE_CARLO_SEED:
+        return int(MONTE_CARLO_SEED)
+    return int(np.random.SeedSequence().entropy % 2**32)
+
+
+def simulate_price_paths(log_returns: np.ndarray, start_price: float, horizon: int,
+                         n_paths: int = DEFAULT_PATHS, method: str = "bootstrap",
+                         seed: Optional[int] = None) -> np.ndarray:
+    """
+    Genera `n_paths` trayectorias de precio de `horizon` velas en una sola pasada de NumPy.
+    - bootstrap: remuestrea los rendimientos históricos con reemplazo.
+    - gbm: movimiento browniano geométrico con la media/volatilidad históricas.
+    Devuelve una matriz (n_paths, horizon + 1) cuya primera columna es `start_price`.
+    """
+    rng = np.random.default_rng(seed)
+    if method == "gbm":
+        mu, sigma = float(np.mean(log_returns)), float(np.std(log_returns))
+        steps = rng.normal(mu, sigma, size=(n_paths, horizon)).astype(np.float32)
+    else:
+        steps = rng.choice(np.asarray(log_returns, dtype=np.float32), size=(n_paths, horizon), replace=True)
+
+    paths = np.empty((n_paths, horizon + 1), dtype=np.float32)
+    paths[:, 0] = start_price
+    paths[:, 1:] = start_price * np.exp(np.cumsum(steps, axis=1))
+    return paths
+
+
+def _distribution(values: np.ndarray) -> Optional[Dict]:
+    """Resumen por percentiles de una distribución (None si no hay muestras)."""
+    if len(values) == 0:
+        return None
+    p25, p50, p75, p90 = np.percentile(values, [25, 50, 75, 90])
+    return {"mean": round(float(values.mean()), 2), "p25": round(float(p25), 2), "median": round(float(p50), 2),
+            "p75": round(float(p75), 2), "p90": round(float(p90), 2)}
+
+
+def simulate_dca_plan(paths: np.ndarray, level_prices: List[float], level_amounts: List[float],
+                      capital: float, take_profit_pct: float = 10.0,
+                      ruin_threshold: float = RUIN_THRESHOLD) -> Dict:
+    """
+    Evalúa un plan DCA sobre trayectorias simuladas: probabilidad de ejecución de cada
+    nivel, tiempo hasta alcanzar el take-profit sobre el precio medio, drawdown y ruina.
+    """
+    level_prices = np.asarray(level_prices, dtype=np.float32)
+    level_amounts = np.asarray(level_amounts, dtype=np.float32)
+
+    # Un nivel se ejecuta en cuanto el mínimo acumulado de la trayectoria lo alcanza
+    running_min = np.minimum.accumulate(paths, axis=1)
+    filled = running_min[:, None, :] <= level_prices[None, :, None] * (1 + 1e-6)  # (paths, niveles, velas)
+
+    cost = np.einsum('plt,l->pt', filled, level_amounts)
+    coins = np.einsum('plt,l->pt', filled, level_amounts / level_prices)
+    pnl = coins * paths - cost
+
+    recovered = (cost > 0) & (coins * paths >= cost * (1 + take_profit_pct / 100))
+    has_recovered = recovered.any(axis=1)
+    recovery_bar = recovered.argmax(axis=1)
+
+    # Drawdown sobre el capital total del plan, cortado en el momento del take-profit
+    horizon = paths.shape[1]
+    active = np.arange(horizon)[None, :] <= np.where(has_recovered, recovery_bar, horizon)[:, None]
+    max_dd = np.clip(-np.where(active, pnl, 0).min(axis=1), 0, None) / capital
+
+    return {
+        "paths": int(paths.shape[0]),
+        "horizon_bars": int(horizon - 1),
+        "fill_probability_pct": [round(float(p) * 100, 1) for p in filled[:, :, -1].mean(axis=0)],
+        "recovery_probability_pct": round(float(has_recovered.mean()) * 100, 1),
+        "time_to_recovery_bars": _distribution(recovery_bar[has_recovered].astype(float)),
+        "ruin_probability_pct": round(float((max_dd >= ruin_threshold).mean()) * 100, 2),
+        "expected_max_drawdown_pct": round(float(max_dd.mean()) * 100, 2),
+        "max_drawdown_p95_pct": round(float(np.percentile(max_dd, 95)) * 100, 2)
+    }
+
+
+def simulate_martingale_plan(paths: np.ndarray, bet_sizes: List[float], initial_loss: float,
+                             capital: float, trade_bars: int = MARTINGALE_TRADE_BARS,
+                             ruin_threshold: float = RUIN_THRESHOLD) -> Dict:
+    """
+    Reproduce la secuencia de apuestas de la martingala sobre tramos consecutivos de las
+    trayectorias. Cada trade es un bracket 1:1 (TP = SL = movimiento típico del tramo);
+    si no toca ninguno al final del tramo se liquida a mercado.
+    """
+    bets = np.asarray(bet_sizes, dtype=np.float32)
+    n_trades = len(bets)
+    if n_trades == 0:
+        return {}
+
+    n_paths = paths.shape[0]
+    segments = paths[:, :n_trades * trade_bars + 1]
+    seg_start = segments[:, :-1:trade_bars][:, :n_trades]  # precio de entrada de cada trade
+    seg_path = segments[:, 1:].reshape(n_paths, n_trades, trade_bars) / seg_start[:, :, None] - 1
+
+    # Distancia del bracket: desviación típica del movimiento en un tramo
+    distance = max(float(np.std(seg_path[:, :, -1])), 1e-6)
+    up = seg_path >= distance
+    down = seg_path <= -distance
+    first_up = np.where(up.any(axis=2), up.argmax(axis=2), trade_bars)
+    first_down = np.where(down.any(axis=2), down.argmax(axis=2), trade_bars)
+    settle = np.clip(seg_path[:, :, -1] / distance, -1, 1)
+    outcome = np.where(first_up < first_down, 1.0, np.where(first_down < first_up, -1.0, settle))
+
+    # PnL acumulado: se deja de operar al recuperar la pérdida inicial
+    balance = -initial_loss + np.cumsum(outcome * bets[None, :], axis=1)
+    recovered = balance >= 0
+    has_recovered = recovered.any(axis=1)
+    recovery_trade = np.where(has_recovered, recovered.argmax(axis=1), n_trades)
+    trading = np.arange(n_trades)[None, :] <= recovery_trade[:, None]
+    worst = np.minimum(np.where(trading, balance, 0).min(axis=1), -initial_loss)
+
+    return {
+        "paths": int(n_paths),
+        "trade_bars": int(trade_bars),
+        "bracket_distance_pct": round(distance * 100, 2),
+        "trade_win_rate_pct": round(float((outcome > 0).mean()) * 100, 1),
+        "success_probability_by_trade_pct": [round(float(p) * 100, 1) for p in recovered.cumsum(axis=1).astype(bool).mean(axis=0)],
+        "recovery_probability_pct": round(float(has_recovered.mean()) * 100, 1),
+        "time_to_recovery_trades": _distribution(recovery_trade[has_recovered].astype(float) + 1),
+        "ruin_probability_pct": round(float((-worst >= capital * ruin_threshold).mean()) * 100, 2),
+        "expected_max_drawdown_pct": round(float(-worst.mean()) / capital * 100, 2),
+        "max_drawdown_p95_pct": round(float(np.percentile(-worst, 95)) / capital * 100, 2)
+    }
+
+
+def returns_from_frame(price_data: Optional[pd.DataFrame]) -> Optional[np.ndarray]:
+    """Extrae rendimientos logarítmicos de un DataFrame de velas, o None si no es utilizable."""
+    if not isinstance(price_data, pd.DataFrame) or 'close' not in price_data or len(price_data) < 30:
+        return None
+    returns = log_returns_from_prices(price_data['close'].to_numpy())
+    return returns if len(returns) >= 30 else None
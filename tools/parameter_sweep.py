@@ -0,0 +1,360 @@
+# Archivo: tools/parameter_sweep.py
+
+import os
+import sys
+import json
+import argparse
+import itertools
+import threading
+import traceback
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+from tools.strategy_tools import AdvancedStrategyGenerator, MAX_LOSS_PCT
+from tools.risk_metrics import TRADE_HORIZON_BARS
+
+# Archivo donde se guardan las mejores configuraciones encontradas por el barrido
+TUNED_PARAMS_PATH = os.getenv("TUNED_PARAMS_PATH", os.path.join(os.getcwd(), "data", "tuned_parameters.json"))
+
+# Comisión por lado (taker de Bybit spot/perp ~0.055%)
+FEE_RATE = 0.00055
+
+# Retrocesos (%) usados por generate_entry_zones
+ENTRY_RETRACEMENTS = np.array([0.5, 1.0, 1.5])
+
+# Rejillas de parámetros a evaluar
+TARGET_SCALES = [0.5, 0.75, 1.0, 1.25, 1.5, 2.0]
+ENTRY_SPLITS = [(30, 40, 30), (50, 30, 20), (20, 30, 50), (34, 33, 33), (100, 0, 0)]
+RISK_SCALES = [0.5, 0.75, 1.0, 1.25, 1.5]
+LEVERAGE_SCALES = [0.5, 1.0, 1.5]
+
+# Segmentos de memoria compartida ya abiertos dentro de cada proceso worker
+_WORKER_SEGMENTS = {}
+
+# Valores por defecto del generador (punto de partida de la rejilla)
+_DEFAULT_GENERATOR = AdvancedStrategyGenerator()
+
+
+class SharedCandleStore:
+    """
+    Publica las velas OHLC de cada símbolo/timeframe en memoria compartida para que
+    los procesos del pool las lean sin copiarlas (ni serializarlas) en cada tarea.
+    """
+
+    def __init__(self):
+        self._segments = {}
+        self.descriptors = {}
+
+    def add(self, key: Tuple[str, str], df) -> None:
+        """Copia open/high/low/close de un DataFrame a un bloque compartido de solo lectura."""
+        ohlc = np.ascontiguousarray(df[['open', 'high', 'low', 'close']].to_numpy(dtype=np.float64).T)
+        shm = shared_memory.SharedMemory(create=True, size=ohlc.nbytes)
+        view = np.ndarray(ohlc.shape, dtype=ohlc.dtype, buffer=shm.buf)
+        view[:] = ohlc
+        self._segments[key] = shm
+        self.descriptors[key] = {"name": shm.name, "shape": ohlc.shape, "dtype": ohlc.dtype.str}
+
+    def close(self) -> None:
+        for shm in self._segments.values():
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._segments.clear()
+        self.descriptors.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_shared_candles(descriptor: Dict) -> np.ndarray:
+    """Abre (una sola vez por proceso) un bloque compartido y devuelve una vista de solo lectura."""
+    name = descriptor["name"]
+    if name not in _WORKER_SEGMENTS:
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+        _WORKER_SEGMENTS[name] = shm
+    shm = _WORKER_SEGMENTS[name]
+    view = np.ndarray(tuple(descriptor["shape"]), dtype=np.dtype(descriptor["dtype"]), buffer=shm.buf)
+    view.flags.writeable = False
+    return view
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Media móvil simple vectorizada (NaN en las primeras velas)."""
+    out = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return out
+    csum = np.cumsum(np.insert(values, 0, 0.0))
+    out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def simulate_trade_returns(ohlc: np.ndarray, timeframe: str, target_scale: float,
+                           entry_split: Tuple[int, int, int], sides: Optional[np.ndarray] = None) -> Dict:
+    """
+    Simula, sin solapamiento, los trades direccionales que produciría el generador con
+    unos targets y un reparto de entradas dados. Devuelve arrays por trade.
+    `sides` (opcional) es la dirección por vela (+1/-1/0); si no se da, se usa el precio frente a la SMA50.
+    """
+    opens, highs, lows, closes = ohlc
+    hold = TRADE_HORIZON_BARS.get(timeframe, 16)
+    n = len(closes)
+
+    tf_configs = _DEFAULT_GENERATOR.timeframe_configs
+    base_targets = np.array(tf_configs.get(timeframe, tf_configs["1h"])["targets"])
+    gains = base_targets * target_scale / 100
+    exit_alloc = np.array([0.4, 0.3, 0.3])
+    weights = np.array(entry_split, dtype=float) / 100
+
+    sma50 = _rolling_mean(closes, 50)
+    prev_close = np.concatenate(([closes[0]], closes[:-1]))
+    true_range = np.maximum(highs - lows, np.maximum(np.abs(highs - prev_close), np.abs(lows - prev_close)))
+    atr_pct = _rolling_mean(true_range, 14) / closes
+
+    # Barras de señal: una cada `hold` velas, con indicadores ya calculados y ventana completa
+    signal_idx = np.arange(50, n - hold - 1, hold)
+    if len(signal_idx) == 0:
+        return {"returns": np.array([]), "fill": np.array([]), "stop_pct": np.array([]), "signal_idx": signal_idx}
+
+    if sides is None:
+        side = np.where(closes[signal_idx] > sma50[signal_idx], 1.0, -1.0)
+    else:
+        side = np.asarray(sides, dtype=float)[signal_idx]
+    stop_pct = np.clip(1.5 * atr_pct[signal_idx], 0.002, 0.25)
+
+    window = signal_idx[:, None] + 1 + np.arange(hold)[None, :]
+    win_high, win_low, win_close = highs[window], lows[window], closes[window]
+
+    # Entradas escalonadas: se llenan si el precio toca el nivel dentro de la ventana
+    levels = closes[signal_idx][:, None] * (1 - side[:, None] * ENTRY_RETRACEMENTS[None, :] / 100)
+    touched = np.where(side[:, None, None] > 0, win_low[:, :, None] <= levels[:, None, :],
+                       win_high[:, :, None] >= levels[:, None, :])
+    filled = touched.any(axis=1) & (side[:, None] != 0)
+    # La posición existe desde la primera entrada ejecutada: antes no cuentan stops ni targets
+    first_fill = np.where(filled.any(axis=1), touched.any(axis=2).argmax(axis=1), hold)
+    bars = np.arange(hold)[None, :]
+    fill_frac = (filled * weights).sum(axis=1)
+    avg_entry = np.where(fill_frac > 0, (filled * weights * levels).sum(axis=1) / np.maximum(fill_frac, 1e-12),
+                         closes[signal_idx])
+
+    # Primer toque del stop y de cada target tras la entrada (si ambos en la misma vela, cuenta el stop)
+    stop_price = avg_entry * (1 - side * stop_pct)
+    stop_hit = np.where(side[:, None] > 0, win_low <= stop_price[:, None], win_high >= stop_price[:, None])
+    stop_hit &= bars >= first_fill[:, None]
+    stop_bar = np.where(stop_hit.any(axis=1), stop_hit.argmax(axis=1), hold)
+
+    target_prices = avg_entry[:, None] * (1 + side[:, None] * gains[None, :])
+    fav = np.where(side[:, None] > 0, win_high, -win_low)
+    target_level = np.where(side[:, None] > 0, target_prices, -target_prices)
+    hit = (fav[:, :, None] >= target_level[:, None, :]) & (bars > first_fill[:, None])[:, :, None]
+    target_bar = np.where(hit.any(axis=1), hit.argmax(axis=1), hold)
+
+    final_move = side * (win_close[:, -1] / avg_entry - 1)
+    leg_return = np.where(target_bar < stop_bar[:, None], gains[None, :],
+                          np.where(stop_bar[:, None] < hold, -stop_pct[:, None], final_move[:, None]))
+    trade_return = (leg_return * exit_alloc[None, :]).sum(axis=1) - 2 * FEE_RATE
+
+    return {"returns": np.where(fill_frac > 0, trade_return, 0.0), "fill": fill_frac, "stop_pct": stop_pct,
+            "signal_idx": signal_idx}
+
+
+def evaluate_sizing_grid(trades: Dict, risk_levels: Dict[str, float], leverage_limits: Dict[str, int]) -> Dict:
+    """
+    Evalúa de una vez todas las combinaciones de multiplicador de riesgo y límite de
+    apalancamiento sobre los mismos trades. Devuelve la mejor combinación por perfil.
+    """
+    results = {}
+    returns, fill, stop_pct = trades["returns"], trades["fill"], trades["stop_pct"]
+    if len(returns) == 0:
+        return results
+
+    for level, base_risk in risk_levels.items():
+        mults = base_risk * np.array(RISK_SCALES)
+        levs = np.maximum(1, np.round(leverage_limits[level] * np.array(LEVERAGE_SCALES)))
+
+        # Tamaño de posición como fracción del capital, igual que calculate_position_size
+        pos_frac = np.minimum(mults[:, None, None] / stop_pct[None, None, :], levs[None, :, None])
+        growth = np.clip(1 + pos_frac * fill[None, None, :] * returns[None, None, :], 0.0, None)
+        equity = np.cumprod(growth, axis=2)
+        peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=2)
+        max_dd = ((peak - equity) / peak).max(axis=2)
+        final = equity[:, :, -1]
+
+        budget = MAX_LOSS_PCT[level] / 100
+        objective = np.where((max_dd <= budget) & (final > 0), np.log(np.maximum(final, 1e-12)), -np.inf)
+        if np.isinf(objective).all():
+            # Ninguna combinación respeta el presupuesto de drawdown: la menos dañina
+            objective = -max_dd
+        i, j = np.unravel_index(np.argmax(objective), objective.shape)
+
+        traded = fill > 0
+        results[level] = {
+            "risk_multiplier": round(float(mults[i]), 4),
+            "leverage_limit": int(levs[j]),
+            "final_equity": round(float(final[i, j]), 4),
+            "max_drawdown_pct": round(float(max_dd[i, j]) * 100, 2),
+            "objective": float(objective[i, j]),
+            "trades": int(traded.sum()),
+            "win_rate": round(float((returns[traded] > 0).mean()) * 100, 1) if traded.any() else 0.0
+        }
+    return results
+
+
+def _sweep_task(descriptor: Dict, symbol: str, timeframe: str, target_scale: float,
+                entry_split: Tuple[int, int, int]) -> Dict:
+    """Tarea del pool: evalúa una combinación targets/entradas para todos los perfiles."""
+    ohlc = attach_shared_candles(descriptor)
+    trades = simulate_trade_returns(ohlc, timeframe, target_scale, entry_split)
+    return {
+        "symbol": symbol, "timeframe": timeframe,
+        "target_scale": target_scale, "entry_split": list(entry_split),
+        "profiles": evaluate_sizing_grid(trades, _DEFAULT_GENERATOR.risk_multipliers, _DEFAULT_GENERATOR.leverage_limits)
+    }
+
+
+def _select_best(task_results: List[Dict], timeframe: str) -> Optional[Dict]:
+    """Elige la combinación de targets/entradas según el perfil 'medium' y guarda los perfiles de esa combinación."""
+    candidates = [r for r in task_results if "medium" in r["profiles"]]
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda r: r["profiles"]["medium"]["objective"])
+
+    tf_configs = _DEFAULT_GENERATOR.timeframe_configs
+    defaults = tf_configs.get(timeframe, tf_configs["1h"])
+    profiles = best["profiles"]
+    return {
+        "targets": [round(t * best["target_scale"], 3) for t in defaults["targets"]],
+        "entry_allocations": best["entry_split"],
+        "risk_multipliers": {level: p["risk_multiplier"] for level, p in profiles.items()},
+        "leverage_limits": {level: p["leverage_limit"] for level, p in profiles.items()},
+        "metrics": {level: {k: p[k] for k in ("final_equity", "max_drawdown_pct", "trades", "win_rate")}
+                    for level, p in profiles.items()},
+        "updated_at": datetime.now().isoformat()
+    }
+
+
+# Contenido ya leído de cada archivo de parámetros: ruta -> (mtime_ns, tamaño, datos)
+_tuned_files: Dict[str, Tuple[int, int, Dict]] = {}
+_tuned_files_lock = threading.Lock()
+
+
+def _read_tuned_file(path: str) -> Optional[Dict]:
+    """Contenido del archivo de parámetros; solo se vuelve a leer si ha cambiado en disco."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _tuned_files_lock:
+        cached = _tuned_files.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"  ⚠️ No se pudieron leer los parámetros optimizados: {e}")
+        return None
+    with _tuned_files_lock:
+        _tuned_files[path] = (st.st_mtime_ns, st.st_size, data)
+    return data
+
+
+def load_tuned_parameters(symbol: str, timeframe: str, path: Optional[str] = None) -> Optional[Dict]:
+    """Devuelve la configuración optimizada para un símbolo/timeframe, o None si no existe."""
+    if not symbol:
+        return None
+    path = path or TUNED_PARAMS_PATH
+    symbol = symbol.upper()
+    if not symbol.endswith('USDT'):
+        symbol += 'USDT'
+    data = _read_tuned_file(path)
+    return data.get(symbol, {}).get(timeframe) if data else None
+
+
+def save_tuned_parameters(tuned: Dict, path: str = TUNED_PARAMS_PATH) -> None:
+    """Fusiona los resultados nuevos con los existentes y los escribe de forma atómica."""
+    existing = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+        except (OSError, ValueError):
+            existing = {}
+    for symbol, per_tf in tuned.items():
+        existing.setdefault(symbol, {}).update(per_tf)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(existing, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_parameter_sweep(symbols: List[str], timeframes: List[str], limit: int = 2000,
+                        max_workers: Optional[int] = None, path: str = TUNED_PARAMS_PATH) -> Dict:
+    """
+    Descarga las velas de cada símbolo/timeframe, las publica en memoria compartida y
+    reparte la rejilla de parámetros en un pool de procesos. Guarda las mejores configuraciones.
+    """
+    from tools.analysis_tools import get_historical_data_extended
+
+    tuned = {}
+    with SharedCandleStore() as store:
+        for symbol in symbols:
+            pair = symbol.upper() if symbol.upper().endswith('USDT') else f"{symbol.upper()}USDT"
+            for tf in timeframes:
+                df = get_historical_data_extended(pair, interval=tf, limit=limit)
+                if df is None or len(df) < 200:
+                    print(f"  ⚠️ Datos insuficientes para {pair} en {tf}. Se omite del barrido.")
+                    continue
+                store.add((pair, tf), df)
+
+        if not store.descriptors:
+            return {"success": False, "message": "No se obtuvieron datos para ningún símbolo."}
+
+        results = {}
+        combos = list(itertools.product(TARGET_SCALES, ENTRY_SPLITS))
+        print(f"-> Barrido de parámetros: {len(store.descriptors)} series x {len(combos)} combinaciones...")
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(_sweep_task, descriptor, pair, tf, scale, split)
+                for (pair, tf), descriptor in store.descriptors.items()
+                for scale, split in combos
+            ]
+            for future in as_completed(futures):
+                try:
+                    r = future.result()
+                    results.setdefault((r["symbol"], r["timeframe"]), []).append(r)
+                except Exception as e:
+                    print(f"  ❌ Error en una tarea del barrido: {e}")
+                    traceback.print_exc()
+
+    for (pair, tf), task_results in results.items():
+        best = _select_best(task_results, tf)
+        if best:
+            tuned.setdefault(pair, {})[tf] = best
+
+    if tuned:
+        save_tuned_parameters(tuned, path)
+        print(f"  ✅ Parámetros optimizados guardados en: {path}")
+    return {"success": bool(tuned), "data": tuned}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Barrido de parámetros para AdvancedStrategyGenerator")
+    parser.add_argument("--symbols", nargs="+", default=["BTC", "ETH", "SOL"])
+    parser.add_argument("--timeframes", nargs="+", default=["1h", "4h"])
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    run_parameter_sweep(args.symbols, args.timeframes, limit=args.limit, max_workers=args.workers)
@@ -0,0 +1,103 @@
+# Archivo: tools/prefetch.py
+
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from .llm_scheduler import set_llm_context, BACKGROUND
+
+# Trabajos especulativos simultáneos (en todo el bot): no deben competir con las peticiones reales
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+# Segundos que un resultado adelantado sigue siendo válido si nadie lo reclama
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "180"))
+
+Factory = Callable[[], Awaitable[Any]]
+
+
+class SpeculativePrefetcher:
+    """
+    Adelanta en segundo plano trabajo que probablemente se pida a continuación (p. ej. los
+    destinos de los botones de un mensaje). Cada trabajo pertenece a un dueño (el chat): al
+    programar trabajo nuevo, o si el usuario pasa a otra cosa, se cancela el anterior.
+    Los handlers reclaman el resultado con `take`, que espera al trabajo si aún está en curso.
+    """
+
+    def __init__(self, concurrency: int = PREFETCH_CONCURRENCY, ttl: float = PREFETCH_TTL):
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._entries: Dict[Hashable, Dict[str, Any]] = {}
+        self._by_owner: Dict[Hashable, Set[Hashable]] = {}
+        self._stats = {"scheduled": 0, "used": 0, "cancelled": 0, "failed": 0, "expired": 0}
+
+    async def _run(self, key: Hashable, factory: Factory, entry: Dict[str, Any]) -> Any:
+        # Si el trabajo llama a la IA, lo hace en la cola de menor prioridad
+        set_llm_context(BACKGROUND, entry["owner"])
+        async with self._semaphore:
+            entry["started"] = True
+            print(f"-> Prefetch especulativo: {key}")
+            return await factory()
+
+    def _on_done(self, key: Hashable, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["failed"] += 1
+            print(f"  ⚠️ Prefetch {key} falló: {task.exception()}")
+
+    def _discard(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._by_owner.get(entry["owner"], set()).discard(key)
+        return entry
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if now - e["created"] > self.ttl]:
+            self._discard(key)["task"].cancel()
+            self._stats["expired"] += 1
+
+    def schedule(self, owner: Hashable, jobs: Dict[Hashable, Factory]) -> None:
+        """Sustituye el trabajo especulativo de `owner` por `jobs` ({clave: fábrica de corrutina})."""
+        self.cancel(owner)
+        self._purge_expired()
+        for key, factory in jobs.items():
+            if key in self._entries:
+                continue
+            entry = {"owner": owner, "created": time.monotonic(), "started": False}
+            entry["task"] = asyncio.ensure_future(self._run(key, factory, entry))
+            entry["task"].add_done_callback(lambda t, k=key: self._on_done(k, t))
+            self._entries[key] = entry
+            self._by_owner.setdefault(owner, set()).add(key)
+            self._stats["scheduled"] += 1
+
+    def cancel(self, owner: Hashable) -> None:
+        """Cancela lo que `owner` tenga adelantado y aún no se haya reclamado."""
+        for key in list(self._by_owner.pop(owner, ())):
+            entry = self._entries.pop(key, None)
+            if entry is not None and not entry["task"].done():
+                entry["task"].cancel()
+                self._stats["cancelled"] += 1
+
+    async def take(self, key: Hashable, factory: Factory) -> Any:
+        """
+        Resultado adelantado de `key` (esperando si sigue en curso); si no lo hay, ha
+        caducado, falló o aún esperaba turno en la cola especulativa, ejecuta `factory`.
+        """
+        entry = self._discard(key)
+        if entry is not None and not entry["started"]:
+            entry["task"].cancel()
+            self._stats["cancelled"] += 1
+        elif entry is not None and time.monotonic() - entry["created"] <= self.ttl:
+            try:
+                result = await entry["task"]
+                self._stats["used"] += 1
+                print(f"-> Prefetch {key} aprovechado.")
+                return result
+            except Exception:
+                pass
+        elif entry is not None:
+            entry["task"].cancel()
+            self._stats["expired"] += 1
+        return await factory()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "pending": len(self._entries)}
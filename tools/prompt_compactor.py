@@ -0,0 +1,207 @@
+# Archivo: tools/prompt_compactor.py
+
+import os
+import re
+import json
+import math
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Presupuesto de tokens del bloque de datos de un prompt (estimados, ver estimate_tokens)
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+PROMPT_TOKEN_BUDGETS = {
+    "strategy_interpreter": 1200,
+    "strategy_presenter": 1200,
+    "technical_analysis": 800,
+    "global_market_report": 3000,
+    "sentiment_check": 1500,
+    "ecosystem_analysis": 1500,
+    "traditional_market_analysis": 1000,
+    "whale_analysis": 800,
+    "proactive_strategy": 800,
+}
+
+# Cifras significativas de los números (precios de 0.00001234 o 67234.5 conservan su escala)
+SIGNIFICANT_DIGITS = 5
+
+# Escalones de recorte si el bloque no cabe: (máximo de elementos por lista, máximo de caracteres por texto)
+COMPACTION_STEPS = [(10, None), (6, 1500), (4, 600), (2, 300), (1, 150)]
+
+# Esquemas por handler: qué campos necesita realmente cada prompt.
+#   True             -> se conserva el valor (redondeado y con listas acotadas)
+#   False            -> se descarta
+#   {campo: esquema} -> solo esos campos, en ese orden de prioridad
+#   "_max": n        -> si el valor es una lista, como mucho n elementos (cada uno con el esquema)
+#   "_rest": True    -> además de los campos listados, se conservan los demás
+PAYLOAD_SCHEMAS = {
+    "strategy_interpreter": {
+        "technical": {
+            "data": {
+                "symbol": True,
+                "current_price": True,
+                "signals": {"overall": True, "confidence": True, "signals": {"bullish": {"_max": 6}, "bearish": {"_max": 6}}},
+                "indicators": True,
+                "multi_timeframe": {"overall_bias": True, "alignment": True, "timeframes": True},
+                "market_structure": {"structure": True},
+                "support_resistance": {
+                    "support_zones": {"center": True, "strength": True, "_max": 3},
+                    "resistance_zones": {"center": True, "strength": True, "_max": 3},
+                },
+                "patterns": {"pattern": True, "signal": True, "_max": 5},
+            },
+            "message": True,
+        },
+        "news": {"articles": {"title": True, "_max": 5}, "message": True},
+        "social": {"twitter": {"tweets": {"_max": 5}, "message": True}},
+    },
+    "strategy_presenter": {
+        "asset": True,
+        "profile": True,
+        "scores": True,
+        # sizing_inputs solo sirve para re-escalar la estrategia (/ajustar)
+        "strategy": {"_rest": True, "sizing_inputs": False},
+    },
+    "sentiment_check": {
+        "noticias": {"articles": {"title": True, "source": True, "_max": 6}, "message": True},
+        "twitter": {"tweets": {"_max": 8}, "message": True},
+        "facebook": {"posts": {"_max": 5}, "message": True},
+    },
+}
+
+# Tokens aproximados: palabras en trozos de ~4 caracteres, números en grupos de 3 dígitos
+# y cada signo de puntuación como un token (similar a los tokenizadores BPE habituales)
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_+")
+
+_OMIT = object()
+_stats: Dict[str, Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación del número de tokens de un texto sin depender de un tokenizador concreto."""
+    total = 0
+    for token in _TOKEN_PATTERN.findall(text or ""):
+        if token[0].isdigit():
+            total += math.ceil(len(token) / 3)
+        elif token[0].isalpha():
+            total += math.ceil(len(token) / 4)
+        else:
+            total += 1
+    return total
+
+
+def round_significant(value: float, digits: int = SIGNIFICANT_DIGITS) -> Optional[float]:
+    """Redondea a `digits` cifras significativas (NaN/inf pasan a None, que es JSON válido)."""
+    value = float(value)
+    if not math.isfinite(value):
+        return None
+    if value == 0:
+        return 0.0
+    rounded = float(f"{value:.{digits}g}")
+    return int(rounded) if rounded.is_integer() and abs(rounded) < 1e15 else rounded
+
+
+def _compact_value(value: Any, schema: Any, max_items: int, max_chars: Optional[int]) -> Any:
+    if schema is False or isinstance(value, (pd.DataFrame, pd.Series)):
+        return _OMIT
+    sub_schema = schema if isinstance(schema, dict) else True
+
+    if isinstance(value, dict):
+        if isinstance(schema, dict):
+            keys = [k for k in schema if not k.startswith("_") and k in value]
+            if schema.get("_rest"):
+                keys += [k for k in value if k not in schema]
+        else:
+            keys = list(value)
+        result = {}
+        for key in keys:
+            compacted = _compact_value(value[key], schema.get(key, True) if isinstance(schema, dict) else True,
+                                       max_items, max_chars)
+            if compacted is not _OMIT:
+                result[str(key)] = compacted
+        return result
+
+    if isinstance(value, (list, tuple, np.ndarray)):
+        limit = min(sub_schema.get("_max", max_items), max_items) if isinstance(sub_schema, dict) else max_items
+        items = [_compact_value(item, sub_schema, max_items, max_chars) for item in list(value)[:limit]]
+        return [item for item in items if item is not _OMIT]
+
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return round_significant(value)
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if isinstance(value, str):
+        if max_chars is not None and len(value) > max_chars:
+            return value[:max_chars].rstrip() + "…"
+        return value
+    if value is None:
+        return None
+    return str(value)
+
+
+def _dumps(payload: Any) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def _record(handler: str, tokens_before: int, tokens_after: int, truncated: bool) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(handler, {"calls": 0, "tokens_before": 0, "tokens_after": 0, "truncated": 0})
+        stats["calls"] += 1
+        stats["tokens_before"] += tokens_before
+        stats["tokens_after"] += tokens_after
+        stats["truncated"] += int(truncated)
+
+
+def compact_payload(handler: str, payload: Any, budget: Optional[int] = None) -> str:
+    """
+    JSON minificado con los campos que necesita el prompt de `handler`, números redondeados
+    y, si supera el presupuesto de tokens, listas y textos recortados por escalones. Como
+    último recurso descarta los campos de primer nivel menos prioritarios (los últimos).
+    """
+    schema = PAYLOAD_SCHEMAS.get(handler, True)
+    budget = budget or PROMPT_TOKEN_BUDGETS.get(handler, DEFAULT_PROMPT_TOKEN_BUDGET)
+    # Referencia: el mismo payload sin compactar (minificado, así que el ahorro medido es una cota inferior)
+    tokens_before = estimate_tokens(json.dumps(payload, separators=(",", ":"), ensure_ascii=False,
+                                               default=lambda obj: _compact_value(obj, True, 10**6, None)))
+
+    truncated = False
+    for step, (max_items, max_chars) in enumerate(COMPACTION_STEPS):
+        compacted = _compact_value(payload, schema, max_items, max_chars)
+        text = _dumps(compacted)
+        tokens = estimate_tokens(text)
+        if tokens <= budget:
+            truncated = step > 0
+            break
+    else:
+        truncated = True
+        while tokens > budget and isinstance(compacted, dict) and len(compacted) > 1:
+            compacted.popitem()
+            text = _dumps(compacted)
+            tokens = estimate_tokens(text)
+
+    _record(handler, tokens_before, tokens, truncated)
+    print(f"-> Prompt [{handler}]: ~{tokens_before} -> ~{tokens} tokens"
+          f"{' (recortado al presupuesto)' if truncated else ''}.")
+    return text
+
+
+def get_prompt_size_stats() -> Dict[str, Dict]:
+    """Tamaño medio de los datos de cada prompt antes y después de compactar."""
+    with _stats_lock:
+        report = {}
+        for handler, s in _stats.items():
+            report[handler] = {
+                "calls": s["calls"],
+                "avg_tokens_before": round(s["tokens_before"] / s["calls"]),
+                "avg_tokens_after": round(s["tokens_after"] / s["calls"]),
+                "reduction_pct": round((1 - s["tokens_after"] / s["tokens_before"]) * 100, 1) if s["tokens_before"] else 0.0,
+                "truncated": s["truncated"],
+            }
+        return report
@@ -0,0 +1,157 @@
+# Archivo: tools/quant_scorer.py
+
+import re
+import math
+from typing import Dict, Iterable, List, Optional
+
+# Mismas escalas que pedía el prompt "quant_interpreter_advanced": de -10 a 10
+SCORE_LIMIT = 10.0
+
+# Peso del balance de señales técnicas y del sesgo multi-timeframe en el score técnico
+SIGNAL_BALANCE_WEIGHT = 7.0
+MTF_BIAS_WEIGHT = 2.0
+MTF_ALIGNMENT_BONUS = 1.0
+
+# Régimen de mercado: ADX >= 25 es tendencia clara, <= 20 es lateral; en medio decide la
+# alineación multi-timeframe. Sin ADX se usa el ancho de las Bandas de Bollinger.
+ADX_TRENDING = 25.0
+ADX_RANGING = 20.0
+BOLLINGER_TRENDING_WIDTH = 0.08
+
+# Con pocos textos el score se acerca a 0: n / (n + SHRINKAGE_TEXTS)
+SHRINKAGE_TEXTS = 2
+
+# Léxico de finanzas/cripto (inglés, que es el idioma de NewsAPI, y español) con su peso
+LEXICON = {
+    # Positivas
+    "bullish": 2.0, "bull": 1.0, "surge": 2.0, "surges": 2.0, "soar": 2.0, "soars": 2.0,
+    "rally": 2.0, "rallies": 2.0, "jump": 1.5, "jumps": 1.5, "gain": 1.0, "gains": 1.0,
+    "rise": 1.0, "rises": 1.0, "rising": 1.0, "breakout": 1.5, "record": 1.0, "ath": 2.0,
+    "adoption": 1.0, "approval": 1.5, "approved": 1.5, "approves": 1.5, "upgrade": 1.0,
+    "partnership": 1.0, "inflows": 1.5, "recovery": 1.0, "recovers": 1.0, "rebound": 1.0,
+    "optimism": 1.5, "optimistic": 1.5, "buy": 1.0, "buying": 1.0, "accumulate": 1.0,
+    "accumulation": 1.0, "moon": 2.0, "pump": 1.5, "profit": 1.0, "profits": 1.0,
+    "growth": 1.0, "strong": 0.5, "outperform": 1.0, "etf": 0.5,
+    "alcista": 2.0, "sube": 1.0, "suben": 1.0, "subida": 1.0, "dispara": 2.0, "repunte": 1.0,
+    "récord": 1.0, "ganancia": 1.0, "ganancias": 1.0, "compra": 1.0, "adopción": 1.0,
+    "aprobación": 1.5, "optimismo": 1.5, "entradas": 1.0,
+    # Negativas
+    "bearish": -2.0, "bear": -1.0, "crash": -2.5, "crashes": -2.5, "plunge": -2.0, "plunges": -2.0,
+    "plummet": -2.0, "plummets": -2.0, "dump": -1.5, "drop": -1.0, "drops": -1.0, "fall": -1.0,
+    "falls": -1.0, "decline": -1.0, "declines": -1.0, "sell": -1.0, "selling": -1.0,
+    "selloff": -2.0, "hack": -2.5, "hacked": -2.5, "exploit": -2.0, "scam": -2.0, "fraud": -2.5,
+    "lawsuit": -1.5, "sues": -1.5, "ban": -2.0, "bans": -2.0, "crackdown": -2.0,
+    "liquidation": -1.5, "liquidations": -1.5, "liquidated": -1.5, "outflows": -1.5,
+    "fear": -1.5, "panic": -2.0, "loss": -1.0, "losses": -1.0, "warning": -1.0, "warns": -1.0,
+    "rug": -2.0, "bankrupt": -2.5, "bankruptcy": -2.5, "weak": -0.5, "risk": -0.5,
+    "bajista": -2.0, "cae": -1.0, "caen": -1.0, "caída": -1.0, "desplome": -2.5, "hackeo": -2.5,
+    "estafa": -2.0, "fraude": -2.5, "miedo": -1.5, "pánico": -2.0, "venta": -1.0,
+    "pérdidas": -1.0, "liquidación": -1.5, "liquidaciones": -1.5, "prohibición": -2.0, "salidas": -1.0,
+}
+EMOJI_LEXICON = {"🚀": 1.5, "📈": 1.0, "🐂": 1.0, "💎": 0.5, "📉": -1.0, "🐻": -1.0, "🔻": -1.0, "💀": -1.5}
+# Una negación invierte el signo de las dos palabras siguientes ("not bullish", "no sube")
+NEGATIONS = {"not", "no", "never", "without", "isn't", "aren't", "won't", "don't", "doesn't", "sin", "nunca", "ni"}
+NEGATION_SCOPE = 2
+
+_WORD_PATTERN = re.compile(r"[a-záéíóúüñ']+")
+
+
+def text_polarity(text: str) -> Optional[float]:
+    """Polaridad de un texto entre -1 y 1, o None si no contiene ninguna palabra del léxico."""
+    if not text:
+        return None
+    total, hits, negated_for = 0.0, 0, 0
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if word in NEGATIONS:
+            negated_for = NEGATION_SCOPE
+            continue
+        weight = LEXICON.get(word)
+        if weight is not None:
+            total += -weight if negated_for else weight
+            hits += 1
+        negated_for = max(negated_for - 1, 0)
+    for emoji, weight in EMOJI_LEXICON.items():
+        if (count := text.count(emoji)):
+            total += weight * count
+            hits += count
+    return math.tanh(total / 3) if hits else None
+
+
+def lexicon_score(texts: Iterable[str]) -> float:
+    """
+    Score de -10 a 10 de un conjunto de textos: media de polaridades (los textos neutros
+    cuentan como 0), encogida hacia 0 cuando hay pocos textos.
+    """
+    unique = list(dict.fromkeys(t.strip() for t in texts if isinstance(t, str) and t.strip()))
+    if not unique:
+        return 0.0
+    polarities = [text_polarity(t) or 0.0 for t in unique]
+    mean = sum(polarities) / len(polarities)
+    shrink = len(unique) / (len(unique) + SHRINKAGE_TEXTS)
+    return round(mean * shrink * SCORE_LIMIT, 1)
+
+
+def _clamp(value: float) -> float:
+    return round(max(-SCORE_LIMIT, min(SCORE_LIMIT, value)), 1)
+
+
+def _finite(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def score_technical(tech_data: Dict) -> float:
+    """Balance de señales alcistas/bajistas de generate_trading_signals más el sesgo multi-timeframe."""
+    signals = tech_data.get("signals", {})
+    counts = signals.get("score", {})
+    bullish, bearish = counts.get("bullish", 0), counts.get("bearish", 0)
+    score = (bullish - bearish) / max(bullish + bearish, 1) * SIGNAL_BALANCE_WEIGHT
+
+    mtf = tech_data.get("multi_timeframe", {})
+    direction = {"BULLISH": 1, "BEARISH": -1}.get(mtf.get("overall_bias"), 0)
+    score += direction * (MTF_BIAS_WEIGHT + (MTF_ALIGNMENT_BONUS if mtf.get("alignment") else 0))
+    return _clamp(score)
+
+
+def classify_regime(tech_data: Dict) -> str:
+    """"trending" o "ranging" a partir del ADX y, si falta, de la volatilidad (ancho de Bollinger)."""
+    indicators = tech_data.get("indicators", {})
+    adx = _finite(indicators.get("ADX"))
+    if adx is not None:
+        if adx >= ADX_TRENDING:
+            return "trending"
+        if adx <= ADX_RANGING:
+            return "ranging"
+        return "trending" if tech_data.get("multi_timeframe", {}).get("alignment") else "ranging"
+
+    bollinger = indicators.get("Bollinger", {})
+    upper, middle, lower = (_finite(bollinger.get(k)) for k in ("upper", "middle", "lower"))
+    if upper is not None and lower is not None and middle:
+        return "trending" if (upper - lower) / middle >= BOLLINGER_TRENDING_WIDTH else "ranging"
+    return "trending"
+
+
+def _texts(source: Optional[Dict], key: str, field: Optional[str] = None) -> List[str]:
+    if not isinstance(source, dict) or not source.get("success"):
+        return []
+    items = source.get(key) or []
+    return [item.get(field, "") if field and isinstance(item, dict) else item for item in items]
+
+
+def compute_scores(analysis_data: Dict) -> Dict:
+    """
+    Sustituto local y determinista del intérprete de la IA: recibe el mismo
+    {"technical", "news", "social"} y devuelve los mismos campos.
+    """
+    tech_data = analysis_data.get("technical", {}).get("data", {})
+    social = analysis_data.get("social", {})
+    social_texts = _texts(social.get("twitter"), "tweets") + _texts(social.get("facebook"), "posts")
+    return {
+        "technical_analysis": score_technical(tech_data),
+        "news": lexicon_score(_texts(analysis_data.get("news"), "articles", "title")),
+        "sentiment": lexicon_score(social_texts),
+        "market_regime": classify_regime(tech_data),
+    }
@@ -0,0 +1,354 @@
+# Archivo: tools/replay.py
+
+import os
+import re
+import sys
+import json
+import time
+import base64
+import pickle
+import asyncio
+import hashlib
+import functools
+import importlib
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Parámetros de URL que cambian en cada ejecución o son credenciales: ni forman parte de la clave ni se guardan
+VOLATILE_PARAMS = {"timestamp", "recvwindow", "signature", "sign", "apikey", "api_key", "key", "token", "_"}
+# Cabeceras de respuesta que se conservan (el cuerpo se guarda ya descomprimido)
+KEPT_RESPONSE_HEADERS = {"content-type", "retry-after"}
+
+# Configuración no secreta que se guarda con la grabación para reproducirla tal cual
+CASSETTE_CONFIG_VARS = [
+    "OPENROUTER_BASE_URL", "FACEBOOK_BASE_URL", "BYBIT_TESTNET_MODE",
+    "RAPIDAPI_HOST_TWITTER", "RAPIDAPI_HOST_FACEBOOK", "RAPIDAPI_HOST_BLOOMBERG",
+    "RAPIDAPI_HOST_REDDIT", "RAPIDAPI_HOST_WSJ", "RAPIDAPI_HOST_REUTERS",
+]
+# Credenciales: solo se anota si existían; al reproducir basta con un valor ficticio
+CASSETTE_SECRET_VARS = [
+    "DEEPSEEK_API_KEY", "NEWS_API_KEY", "ETHERSCAN_API_KEY", "BINANCE_API_KEY", "BINANCE_API_SECRET",
+    "BYBIT_API_KEY", "BYBIT_API_SECRET", *(f"RAPID_API_KEY_{i}" for i in range(1, 8)),
+]
+REPLAY_SECRET_PLACEHOLDER = "replay"
+
+# Clientes cuyo HTTP no pasa por httpx/requests (curl_cffi en yfinance, primp en duckduckgo_search):
+# se graba el resultado de la función
+FUNCTION_TARGETS = [
+    ("tools.yahoo_finance_tools", "get_market_data_yf"),
+    ("tools.yahoo_finance_tools", "get_multiple_indices_summary"),
+    ("tools.general_web_query", "search_web_duckduckgo"),
+]
+
+# Latencia inyectada: None = la grabada (por latency_scale), un número = fija, o
+# {sufijo de host o de nombre de función: segundos, "default": s}
+Latency = Union[None, float, Dict[str, float]]
+
+_active: Optional["ServiceCassette"] = None
+_originals: Dict[str, Callable] = {}
+
+
+def _hash(data: Union[bytes, str]) -> str:
+    return hashlib.sha1(data if isinstance(data, bytes) else data.encode("utf-8")).hexdigest()[:16]
+
+
+def _clean_url(url: str) -> str:
+    parts = urlsplit(str(url))
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in VOLATILE_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def _llm_signature(body: bytes) -> str:
+    """Parte estable de una petición a la IA: modelo, modo y prompt de sistema sin cifras (fechas, precios)."""
+    try:
+        payload = json.loads(body)
+    except (ValueError, TypeError):
+        return ""
+    if not isinstance(payload, dict) or "model" not in payload:
+        return ""
+    system = "\n".join(str(m.get("content")) for m in payload.get("messages", []) if m.get("role") == "system")
+    return (f"{payload['model']}|stream={bool(payload.get('stream'))}|tools={bool(payload.get('tools'))}"
+            f"|{_hash(re.sub(r'[0-9]+', '#', system))}")
+
+
+def http_keys(method: str, url: str, body: Optional[bytes]) -> Tuple[str, str]:
+    """(clave exacta, clave laxa) de una petición HTTP. La laxa ignora la query y el cuerpo."""
+    body = body or b""
+    clean = _clean_url(url)
+    parts = urlsplit(clean)
+    exact = f"{method} {clean} {_hash(body)}"
+    loose = f"{method} {parts.netloc}{parts.path} {_llm_signature(body)}"
+    return exact, loose
+
+
+class ServiceCassette:
+    """
+    Graba (mode="record") o reproduce (mode="replay") todas las llamadas a servicios externos
+    en un archivo JSONL: peticiones httpx (incluido el cliente de OpenAI/OpenRouter), peticiones
+    `requests` (pybit, python-binance, NewsAPI, on-chain, scraping) y el resultado de las
+    funciones de FUNCTION_TARGETS. Al reproducir, cada respuesta tarda `latency` (ver Latency).
+
+        with ServiceCassette("fixtures/bot.jsonl", mode="replay", latency_scale=0.5):
+            import ai_dispatcher_v2
+            ...
+
+    Las peticiones se buscan primero por clave exacta y después por clave laxa (mismo endpoint
+    o mismo tipo de llamada a la IA); sin grabación, fallan como un error de conexión.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency: Latency = None, latency_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Modo de grabación desconocido: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._exact: Dict[str, deque] = {}
+        self._loose: Dict[str, deque] = {}
+        self._file = None
+        self._patched_functions: List[Tuple[Callable, Callable]] = []
+        self._stats = {"recorded": 0, "replayed_exact": 0, "replayed_loose": 0, "misses": 0}
+        self.missed: List[str] = []
+
+    # --- Archivo de grabación ---
+
+    @staticmethod
+    def apply_environment(path: str) -> None:
+        """Aplica la configuración guardada en la grabación (antes de importar el bot)."""
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+        if header.get("kind") != "env":
+            return
+        os.environ.update(header.get("config", {}))
+        for name in header.get("secrets", []):
+            os.environ.setdefault(name, REPLAY_SECRET_PLACEHOLDER)
+
+    def _load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("kind") == "env":
+                    continue
+                self._exact.setdefault(entry["key"], deque()).append(entry)
+                self._loose.setdefault(entry["loose"], deque()).append(entry)
+        print(f"▶️ Reproduciendo {sum(len(q) for q in self._exact.values())} respuestas de {self.path}")
+
+    def _write(self, entry: Dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._stats["recorded"] += 1
+
+    def _lookup(self, key: str, loose: str) -> Optional[Dict]:
+        """Siguiente respuesta grabada (la última se repite si se piden más de las grabadas)."""
+        with self._lock:
+            for queue, stat in ((self._exact.get(key), "replayed_exact"), (self._loose.get(loose), "replayed_loose")):
+                if queue:
+                    self._stats[stat] += 1
+                    return queue.popleft() if len(queue) > 1 else queue[0]
+            self._stats["misses"] += 1
+            self.missed.append(key)
+            return None
+
+    def _delay(self, host: str, recorded: float) -> float:
+        if self.latency is None:
+            return recorded * self.latency_scale
+        if isinstance(self.latency, dict):
+            for suffix, seconds in self.latency.items():
+                if suffix != "default" and host.endswith(suffix):
+                    return seconds
+            return self.latency.get("default", recorded * self.latency_scale)
+        return float(self.latency)
+
+    # --- httpx ---
+
+    def _httpx_entry(self, request: httpx.Request, body: bytes) -> Tuple[str, str, Optional[Dict]]:
+        key, loose = http_keys(request.method, str(request.url), body)
+        return key, loose, self._lookup(key, loose) if self.mode == "replay" else None
+
+    def _httpx_response(self, request: httpx.Request, entry: Dict) -> httpx.Response:
+        return httpx.Response(entry["status"], headers=entry["headers"],
+                              content=base64.b64decode(entry["body"]), request=request)
+
+    def _record_http(self, method: str, url: str, key: str, loose: str, status: int,
+                     headers: Dict, content: bytes, elapsed: float) -> None:
+        self._write({
+            "kind": "http", "key": key, "loose": loose, "method": method, "url": _clean_url(url),
+            "status": status, "headers": {k.lower(): v for k, v in headers.items() if k.lower() in KEPT_RESPONSE_HEADERS},
+            "body": base64.b64encode(content).decode("ascii"), "elapsed": round(elapsed, 4),
+        })
+
+    async def handle_httpx_async(self, original: Callable, transport, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        key, loose, entry = self._httpx_entry(request, body)
+        if self.mode == "replay":
+            if entry is None:
+                raise httpx.ConnectError(f"replay: sin grabación para {request.method} {request.url}", request=request)
+            await asyncio.sleep(self._delay(request.url.host, entry["elapsed"]))
+            return self._httpx_response(request, entry)
+
+        started = time.perf_counter()
+        response = await original(transport, request)
+        content = await response.aread()
+        await response.aclose()
+        self._record_http(request.method, str(request.url), key, loose, response.status_code,
+                          response.headers, content, time.perf_counter() - started)
+        headers = {k: v for k, v in response.headers.items() if k.lower() in KEPT_RESPONSE_HEADERS}
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    def handle_httpx(self, original: Callable, transport, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        key, loose, entry = self._httpx_entry(request, body)
+        if self.mode == "replay":
+            if entry is None:
+                raise httpx.ConnectError(f"replay: sin grabación para {request.method} {request.url}", request=request)
+            time.sleep(self._delay(request.url.host, entry["elapsed"]))
+            return self._httpx_response(request, entry)
+
+        started = time.perf_counter()
+        response = original(transport, request)
+        content = response.read()
+        response.close()
+        self._record_http(request.method, str(request.url), key, loose, response.status_code,
+                          response.headers, content, time.perf_counter() - started)
+        headers = {k: v for k, v in response.headers.items() if k.lower() in KEPT_RESPONSE_HEADERS}
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    # --- requests ---
+
+    def handle_requests(self, original: Callable, adapter, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        key, loose = http_keys(request.method, request.url, body)
+        if self.mode == "replay":
+            entry = self._lookup(key, loose)
+            if entry is None:
+                raise requests.ConnectionError(f"replay: sin grabación para {request.method} {request.url}", request=request)
+            time.sleep(self._delay(urlsplit(request.url).hostname or "", entry["elapsed"]))
+            response = requests.Response()
+            response.status_code = entry["status"]
+            response.headers = CaseInsensitiveDict(entry["headers"])
+            response._content = base64.b64decode(entry["body"])
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+            response.url = request.url
+            response.request = request
+            response.connection = adapter
+            return response
+
+        started = time.perf_counter()
+        response = original(adapter, request, **kwargs)
+        self._record_http(request.method, request.url, key, loose, response.status_code,
+                          response.headers, response.content, time.perf_counter() - started)
+        return response
+
+    # --- Funciones sin HTTP interceptable ---
+
+    def _wrap_function(self, qualname: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = f"call {qualname} {_hash(repr((args, sorted(kwargs.items()))))}"
+            loose = f"call {qualname}"
+            if self.mode == "replay":
+                entry = self._lookup(key, loose)
+                if entry is None:
+                    raise ConnectionError(f"replay: sin grabación para {qualname}{args}")
+                time.sleep(self._delay(qualname, entry["elapsed"]))
+                return pickle.loads(base64.b64decode(entry["result"]))
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            self._write({"kind": "call", "key": key, "loose": loose,
+                         "result": base64.b64encode(pickle.dumps(result)).decode("ascii"),
+                         "elapsed": round(time.perf_counter() - started, 4)})
+            return result
+        return wrapper
+
+    @staticmethod
+    def _replace_everywhere(old: Callable, new: Callable) -> None:
+        """Sustituye la función también en los módulos que la importaron con `from ... import`."""
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, "__dict__", None)
+            if not isinstance(namespace, dict):
+                continue
+            for name, value in list(namespace.items()):
+                if value is old:
+                    setattr(module, name, new)
+
+    # --- Activación ---
+
+    def __enter__(self) -> "ServiceCassette":
+        global _active
+        if _active is not None:
+            raise RuntimeError("Ya hay una grabación/reproducción activa.")
+        if self.mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._file.write(json.dumps({
+                "kind": "env",
+                "config": {name: os.environ[name] for name in CASSETTE_CONFIG_VARS if os.getenv(name)},
+                "secrets": [name for name in CASSETTE_SECRET_VARS if os.getenv(name)],
+            }) + "\n")
+            print(f"⏺️ Grabando llamadas externas en {self.path}")
+        _active = self
+        _install_http_patches()
+        for module_name, func_name in FUNCTION_TARGETS:
+            module = importlib.import_module(module_name)
+            original = getattr(module, func_name)
+            wrapper = self._wrap_function(f"{module_name}.{func_name}", original)
+            self._replace_everywhere(original, wrapper)
+            self._patched_functions.append((original, wrapper))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global _active
+        for original, wrapper in self._patched_functions:
+            self._replace_everywhere(wrapper, original)
+        self._patched_functions.clear()
+        _remove_http_patches()
+        _active = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        print(f"⏹️ Grabación/reproducción terminada: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "missed": self.missed[:20]}
+
+
+# Los parches se aplican a las clases de transporte, así cubren todos los clientes (también los ya creados)
+async def _patched_async_transport(transport, request):
+    return await _active.handle_httpx_async(_originals["httpx_async"], transport, request)
+
+
+def _patched_sync_transport(transport, request):
+    return _active.handle_httpx(_originals["httpx_sync"], transport, request)
+
+
+def _patched_requests_send(adapter, request, **kwargs):
+    return _active.handle_requests(_originals["requests"], adapter, request, **kwargs)
+
+
+def _install_http_patches() -> None:
+    _originals["httpx_async"] = httpx.AsyncHTTPTransport.handle_async_request
+    _originals["httpx_sync"] = httpx.HTTPTransport.handle_request
+    _originals["requests"] = HTTPAdapter.send
+    httpx.AsyncHTTPTransport.handle_async_request = _patched_async_transport
+    httpx.HTTPTransport.handle_request = _patched_sync_transport
+    HTTPAdapter.send = _patched_requests_send
+
+
+def _remove_http_patches() -> None:
+    if not _originals:
+        return
+    httpx.AsyncHTTPTransport.handle_async_request = _originals.pop("httpx_async")
+    httpx.HTTPTransport.handle_request = _originals.pop("httpx_sync")
+    HTTPAdapter.send = _originals.pop("requests")
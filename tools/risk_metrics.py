@@ -0,0 +1,108 @@
+# Archivo: tools/risk_metrics.py
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Velas mínimas para que las métricas empíricas sean representativas
+MIN_CANDLES = 100
+
+# Ventana (en velas) para VaR/CVaR y drawdown móviles
+ROLLING_WINDOW = 100
+
+# Velas por operación usadas para las estadísticas de ganancia/pérdida realizadas
+TRADE_HORIZON_BARS = {"1m": 10, "5m": 8, "15m": 12, "1h": 16, "4h": 12, "1d": 8}
+
+
+def historical_var_cvar(returns: np.ndarray, confidence: float = 0.95) -> Dict:
+    """VaR y CVaR históricos (como pérdidas positivas, en fracción) de una serie de rendimientos."""
+    if len(returns) == 0:
+        return {"var": 0.0, "cvar": 0.0}
+    cutoff = np.quantile(returns, 1 - confidence)
+    tail = returns[returns <= cutoff]
+    return {"var": float(max(-cutoff, 0.0)), "cvar": float(max(-tail.mean(), 0.0)) if len(tail) else 0.0}
+
+
+def rolling_var_cvar(returns: np.ndarray, window: int = ROLLING_WINDOW, confidence: float = 0.95) -> Dict:
+    """VaR/CVaR históricos sobre ventanas móviles, calculados para todas las ventanas a la vez."""
+    if len(returns) < window:
+        return {"var": np.array([]), "cvar": np.array([])}
+    windows = np.sort(sliding_window_view(returns, window), axis=1)
+    k = max(int(np.floor(window * (1 - confidence))), 1)
+    return {"var": np.clip(-windows[:, k - 1], 0, None), "cvar": np.clip(-windows[:, :k].mean(axis=1), 0, None)}
+
+
+def rolling_max_drawdown(prices: np.ndarray, window: int = ROLLING_WINDOW) -> np.ndarray:
+    """Máximo drawdown (fracción) dentro de cada ventana móvil de precios."""
+    if len(prices) < window:
+        return np.array([])
+    windows = sliding_window_view(prices, window)
+    peaks = np.maximum.accumulate(windows, axis=1)
+    return ((peaks - windows) / peaks).max(axis=1)
+
+
+def realized_trade_statistics(prices: np.ndarray, horizon: int, direction: Optional[str] = None) -> Dict:
+    """
+    Estadísticas de ganancia/pérdida de mantener el activo `horizon` velas en tramos sin
+    solapamiento, en la dirección de la estrategia (ambas si es neutral).
+    """
+    checkpoints = prices[::horizon]
+    segment_returns = checkpoints[1:] / checkpoints[:-1] - 1
+    if direction == "LONG":
+        outcomes = segment_returns
+    elif direction == "SHORT":
+        outcomes = -segment_returns
+    else:
+        outcomes = np.concatenate([segment_returns, -segment_returns])
+
+    wins, losses = outcomes[outcomes > 0], outcomes[outcomes < 0]
+    if len(wins) == 0 or len(losses) == 0:
+        return {"win_rate": 0.5, "avg_win": 0.0, "avg_loss": 0.0, "samples": int(len(segment_returns))}
+    return {
+        "win_rate": float(len(wins) / len(outcomes)),
+        "avg_win": float(wins.mean()),
+        "avg_loss": float(-losses.mean()),
+        "samples": int(len(segment_returns))
+    }
+
+
+def compute_empirical_risk(price_data: Optional[pd.DataFrame], timeframe: str = "1h",
+                           direction: Optional[str] = None) -> Optional[Dict]:
+    """
+    Métricas de riesgo empíricas a partir de las velas del activo: VaR/CVaR históricos y
+    móviles, drawdown máximo móvil y estadísticas realizadas de ganancia/pérdida.
+    Devuelve None si no hay suficientes velas.
+    """
+    if not isinstance(price_data, pd.DataFrame) or 'close' not in price_data or len(price_data) < MIN_CANDLES:
+        return None
+    prices = price_data['close'].to_numpy(dtype=float)
+    prices = prices[np.isfinite(prices) & (prices > 0)]
+    if len(prices) < MIN_CANDLES:
+        return None
+
+    returns = np.diff(prices) / prices[:-1]
+    # Para un corto, la pérdida es la subida del precio
+    if direction == "SHORT":
+        returns = -returns
+
+    horizon = TRADE_HORIZON_BARS.get(timeframe, 16)
+    window = min(ROLLING_WINDOW, len(returns) // 2)
+    static = historical_var_cvar(returns)
+    rolling = rolling_var_cvar(returns, window)
+    # Para un corto, el drawdown es la subida desde el mínimo: se mide sobre 1/precio
+    drawdowns = rolling_max_drawdown(1 / prices if direction == "SHORT" else prices, window)
+    trades = realized_trade_statistics(prices, horizon, direction)
+
+    return {
+        "var_95": static["var"],
+        "cvar_95": static["cvar"],
+        "rolling_var_95": float(rolling["var"][-1]) if len(rolling["var"]) else static["var"],
+        "rolling_cvar_95": float(rolling["cvar"][-1]) if len(rolling["cvar"]) else static["cvar"],
+        "rolling_max_drawdown_mean": float(drawdowns.mean()) if len(drawdowns) else 0.0,
+        "rolling_max_drawdown_p95": float(np.percentile(drawdowns, 95)) if len(drawdowns) else 0.0,
+        "volatility_pct": float(returns.std() * 100),
+        "window": int(window),
+        "trade_horizon_bars": horizon,
+        **trades
+    }
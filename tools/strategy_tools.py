@@ -6,6 +6,22 @@ from typing import Dict, List, Tuple, Optional
 import talib
 from datetime import datetime, timedelta
 
+from tools.analysis_tools import get_cached_candles, CANDLE_CACHE_TTL
+from tools.grid_simulator import simulate_grid, GRID_FEE_RATE
+from tools.risk_metrics import compute_empirical_risk
+from tools.monte_carlo import (
+    simulate_price_paths, simulate_dca_plan, simulate_martingale_plan, returns_from_frame, resolve_seed,
+    DCA_HORIZON_BARS, MARTINGALE_TRADE_BARS
+)
+
+# Pérdida máxima tolerada (% del capital) por perfil de riesgo
+MAX_LOSS_PCT = {
+    "low": 5,
+    "medium": 10,
+    "high": 20,
+    "degen": 30
+}
+
 class AdvancedStrategyGenerator:
     """Generador de estrategias adaptativo para cualquier capital y timeframe."""
     
@@ -32,6 +48,29 @@ class AdvancedStrategyGenerator:
             "4h": {"hold_time": "1-3 days", "targets": [2.0, 4.0, 6.0]},
             "1d": {"hold_time": "3-14 days", "targets": [5.0, 10.0, 15.0]}
         }
+        
+        # Distribución de capital entre las entradas escalonadas (30-40-30)
+        self.entry_allocations = [30, 40, 30]
+    
+    def apply_tuned_parameters(self, symbol: str, timeframe: str) -> bool:
+        """
+        Sustituye los parámetros fijos por los encontrados en el barrido de parámetros
+        (tools/parameter_sweep.py) para este símbolo/timeframe, si existen.
+        """
+        from tools.parameter_sweep import load_tuned_parameters
+        
+        tuned = load_tuned_parameters(symbol, timeframe)
+        if not tuned:
+            return False
+        
+        self.risk_multipliers.update(tuned.get("risk_multipliers", {}))
+        self.leverage_limits.update(tuned.get("leverage_limits", {}))
+        if tuned.get("targets") and timeframe in self.timeframe_configs:
+            self.timeframe_configs[timeframe]["targets"] = list(tuned["targets"])
+        if tuned.get("entry_allocations"):
+            self.entry_allocations = list(tuned["entry_allocations"])
+        print(f"-> Usando parámetros optimizados para {symbol} en {timeframe}.")
+        return True
     
     def calculate_position_size(self, capital: float, entry: float, stop_loss: float, 
                               risk_level: str = "medium") -> Dict:
@@ -42,39 +81,52 @@ class AdvancedStrategyGenerator:
                 "risk_percentage": 0, "coins": 0, "error": "Entry and Stop-Loss are the same."
             }
 
-        risk_amount = capital * self.risk_multipliers[risk_level]
-        price_risk = abs(entry - stop_loss) / entry
-        
-        # Posición base sin apalancamiento
-        position_size_usd = risk_amount / price_risk
-        
-        # Aplicar límites según capital
-        if capital < 100:
-            max_position = capital * 0.8  # 80% máximo para cuentas pequeñas
-        elif capital < 1000:
-            max_position = capital * 2    # 2x máximo
-        else:
-            max_position = capital * self.leverage_limits[risk_level]
-        
-        position_size_usd = min(position_size_usd, max_position)
-        
-        # --- INICIO DE LA CORRECCIÓN ---
-        # Calcular apalancamiento real necesario
-        leverage_needed = position_size_usd / capital
-        
-        # CORRECCIÓN: El apalancamiento mínimo es 1x. Si se necesita menos, es una operación sin apalancamiento.
-        leverage_used = max(1.0, leverage_needed)
-        
-        # Aplicar el límite máximo de apalancamiento según el perfil de riesgo
-        leverage_used = min(leverage_used, self.leverage_limits[risk_level])
-        # --- FIN DE LA CORRECCIÓN ---
+        sizes = self.calculate_position_sizes(capital, entry, stop_loss, risk_level)
+        return {
+            "position_size_usd": round(float(sizes["position_size_usd"]), 2),
+            "leverage": round(float(sizes["leverage"]), 1),
+            "risk_amount": round(float(sizes["risk_amount"]), 2),
+            "risk_percentage": round(float(sizes["risk_percentage"]), 2),
+            "coins": round(float(sizes["coins"]), 8)
+        }
+    
+    def calculate_position_sizes(self, capitals, entries, stop_losses, risk_levels="medium") -> Dict[str, np.ndarray]:
+        """
+        Versión vectorizada de calculate_position_size: acepta escalares o arrays
+        (capitales, entradas, stops y perfiles de riesgo) que se combinan por broadcasting.
+        Las filas con entrada igual al stop devuelven posición 0 y `valid` = False.
+        """
+        capitals, entries, stop_losses, risk_levels = np.broadcast_arrays(
+            np.asarray(capitals, dtype=float), np.asarray(entries, dtype=float),
+            np.asarray(stop_losses, dtype=float), np.asarray(risk_levels)
+        )
+        risk_pct = np.vectorize(self.risk_multipliers.__getitem__, otypes=[float])(risk_levels)
+        leverage_limit = np.vectorize(self.leverage_limits.__getitem__, otypes=[float])(risk_levels)
+        valid = entries != stop_losses
 
+        risk_amount = np.where(valid, capitals * risk_pct, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price_risk = np.abs(entries - stop_losses) / entries
+            # Posición base sin apalancamiento
+            position_size_usd = np.where(valid, risk_amount / price_risk, 0.0)
+        
+        # Aplicar límites según capital: 80% en cuentas pequeñas, 2x hasta $1000, luego el del perfil
+        max_position = np.where(capitals < 100, capitals * 0.8,
+                                np.where(capitals < 1000, capitals * 2, capitals * leverage_limit))
+        position_size_usd = np.minimum(position_size_usd, max_position)
+        
+        # El apalancamiento mínimo es 1x y el máximo el del perfil de riesgo
+        with np.errstate(divide='ignore', invalid='ignore'):
+            leverage_used = np.minimum(np.maximum(1.0, position_size_usd / capitals), leverage_limit)
+            coins = np.where(entries > 0, position_size_usd / entries, 0.0)
+        
         return {
-            "position_size_usd": round(position_size_usd, 2),
-            "leverage": round(leverage_used, 1),
-            "risk_amount": round(risk_amount, 2),
-            "risk_percentage": round((risk_amount / capital) * 100, 2),
-            "coins": round(position_size_usd / entry, 8) if entry > 0 else 0
+            "position_size_usd": position_size_usd,
+            "leverage": leverage_used,
+            "risk_amount": risk_amount,
+            "risk_percentage": np.where(valid, risk_pct * 100, 0.0),
+            "coins": coins,
+            "valid": valid
         }
     
     def generate_entry_zones(self, current_price: float, trend: str, 
@@ -91,7 +143,7 @@ class AdvancedStrategyGenerator:
         
         for i, level in enumerate(retracement_levels):
             entry_price = current_price * (1 - level/100)
-            allocation = [30, 40, 30][i]  # Distribución 30-40-30
+            allocation = self.entry_allocations[i]
             
             entries.append({
                 "price": round(entry_price, 4),
@@ -162,6 +214,21 @@ class AdvancedStrategyGenerator:
         
         upper_price = current_price * (1 + (atr_pct * range_multiplier) / 100)
         lower_price = current_price * (1 - (atr_pct * range_multiplier) / 100)
+        stop_loss = lower_price * 0.95
+        
+        # Beneficio neto por ciclo compra/venta (paso medio del grid menos comisiones)
+        levels = np.linspace(lower_price, upper_price, num_grids + 1)
+        step_pct = float(np.mean(np.diff(levels) / levels[:-1])) * 100
+        
+        # Reproducir el histórico con el grid centrado en el precio inicial de la serie
+        first_price = float(price_data['close'].iloc[0])
+        backtest = simulate_grid(
+            price_data,
+            lower=first_price * lower_price / current_price,
+            upper=first_price * upper_price / current_price,
+            num_grids=num_grids, capital=capital,
+            stop_loss=first_price * stop_loss / current_price
+        )
         
         return {
             "type": "Neutral Grid",
@@ -169,14 +236,19 @@ class AdvancedStrategyGenerator:
             "lower_limit": round(lower_price, 4),
             "num_grids": num_grids,
             "investment_per_grid": round(capital / num_grids, 2),
-            "expected_profit_per_grid": round((upper_price - lower_price) / num_grids / current_price * 100, 3),
+            "expected_profit_per_grid": round(step_pct - 2 * GRID_FEE_RATE * 100, 3),
+            "backtest": backtest if backtest.get("success") else None,
             "optimal_market": "Rango lateral con volatilidad",
-            "stop_loss": round(lower_price * 0.95, 4)
+            "stop_loss": round(stop_loss, 4)
         }
     
     def generate_dca_strategy(self, current_price: float, capital: float, 
-                            timeframe: str = "1d") -> Dict:
-        """Genera estrategia de Dollar Cost Averaging inteligente."""
+                            timeframe: str = "1d", price_data: Optional[pd.DataFrame] = None,
+                            seed: Optional[int] = None) -> Dict:
+        """
+        Genera estrategia de Dollar Cost Averaging inteligente. Si se aportan velas,
+        estima por Monte Carlo la probabilidad real de ejecución de cada nivel.
+        """
         # Niveles de compra progresivos
         dca_levels = []
         remaining_capital = capital
@@ -200,10 +272,25 @@ class AdvancedStrategyGenerator:
         total_coins = sum(level["amount_usd"] / level["price"] for level in dca_levels)
         avg_price = capital / total_coins
         
+        monte_carlo = None
+        returns = returns_from_frame(price_data)
+        if returns is not None:
+            seed = resolve_seed(seed)
+            paths = simulate_price_paths(returns, current_price, DCA_HORIZON_BARS.get(timeframe, 90), seed=seed)
+            monte_carlo = simulate_dca_plan(
+                paths, [level["price"] for level in dca_levels],
+                [level["amount_usd"] for level in dca_levels], capital
+            )
+            # Con la misma semilla y las mismas velas la simulación se repite exactamente
+            monte_carlo["seed"] = seed
+            for level, fill_pct in zip(dca_levels, monte_carlo["fill_probability_pct"]):
+                level["fill_probability"] = fill_pct
+        
         return {
             "type": "DCA Inteligente",
             "levels": dca_levels,
             "average_price": round(avg_price, 4),
+            "monte_carlo": monte_carlo,
             "profit_targets": [
                 {"price": round(avg_price * 1.10, 4), "action": "Recuperar 50%"},
                 {"price": round(avg_price * 1.20, 4), "action": "Recuperar 30%"},
@@ -214,8 +301,29 @@ class AdvancedStrategyGenerator:
         }
     
     def generate_martingale_recovery(self, initial_loss: float, capital: float,
-                                   win_rate: float = 0.6) -> Dict:
-        """Genera plan de recuperación tipo Martingala modificado."""
+                                   win_rate: float = 0.6, price_data: Optional[pd.DataFrame] = None,
+                                   seed: Optional[int] = None) -> Dict:
+        """
+        Genera plan de recuperación tipo Martingala modificado. Si se aportan velas, las
+        probabilidades de éxito y de ruina salen de una simulación Monte Carlo.
+        """
+        monte_carlo = None
+        returns = returns_from_frame(price_data)
+        if returns is not None:
+            # Escalera completa de apuestas en racha perdedora: es la que determina el riesgo real
+            ladder, loss, bet = [], initial_loss, initial_loss * 0.5
+            while len(ladder) < 10 and min(bet, (capital - loss) * 0.2) >= 1:
+                bet = min(bet, (capital - loss) * 0.2)
+                ladder.append(bet)
+                loss += bet
+                bet *= 1.5
+            if ladder:
+                seed = resolve_seed(seed)
+                paths = simulate_price_paths(returns, 1.0, len(ladder) * MARTINGALE_TRADE_BARS, seed=seed)
+                monte_carlo = simulate_martingale_plan(paths, ladder, initial_loss, capital)
+                if monte_carlo:
+                    monte_carlo["seed"] = seed
+        
         recovery_plan = []
         accumulated_loss = initial_loss
         current_bet = initial_loss * 0.5  # Empezar con 50% de la pérdida
@@ -237,7 +345,8 @@ class AdvancedStrategyGenerator:
                 "bet_size": round(current_bet, 2),
                 "required_gain": round(required_gain_pct, 1),
                 "accumulated_risk": round(accumulated_loss + current_bet, 2),
-                "success_probability": round(win_rate ** (i + 1) * 100, 1)
+                "success_probability": (monte_carlo["success_probability_by_trade_pct"][i] if monte_carlo
+                                        else round(win_rate ** (i + 1) * 100, 1))
             })
             
             if win_rate > 0.5:  # Si ganamos más del 50%
@@ -252,10 +361,17 @@ class AdvancedStrategyGenerator:
             "initial_loss": initial_loss,
             "recovery_trades": recovery_plan,
             "max_risk": round(sum(t["bet_size"] for t in recovery_plan), 2),
-            "break_even_probability": round(win_rate * 100, 1),
+            "break_even_probability": monte_carlo["trade_win_rate_pct"] if monte_carlo else round(win_rate * 100, 1),
+            "monte_carlo": monte_carlo,
             "warning": "Alto riesgo - Solo para traders experimentados"
         }
 
+def _first_frame(price_data: Optional[pd.DataFrame], multi_tf_data: Dict) -> Optional[pd.DataFrame]:
+    """Las velas del timeframe o, si no hay, las primeras velas que traiga multi_tf_data."""
+    if price_data is not None:
+        return price_data
+    return next((data for data in multi_tf_data.values() if isinstance(data, pd.DataFrame) and len(data) > 0), None)
+
 def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict, 
                                      multi_tf_data: Dict, user_profile: Dict) -> Dict:
     """Genera estrategia completa adaptada al perfil del usuario."""
@@ -268,6 +384,9 @@ def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict,
     strategy_type = user_profile.get("strategy_type", "directional")
     timeframe = user_profile.get("timeframe", "1h")
     
+    # Parámetros optimizados por el barrido, si existen para este activo
+    generator.apply_tuned_parameters(tech_data.get("symbol"), timeframe)
+    
     # Datos técnicos
     current_price = tech_data.get("current_price", 0)
     if current_price == 0:
@@ -304,10 +423,14 @@ def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict,
         entry_zone = current_price
         stop_loss = current_price * 0.97
     
+    # Velas del timeframe: las recibidas o, si no, la serie cacheada por el análisis técnico
+    price_data = multi_tf_data.get(timeframe)
+    if not isinstance(price_data, pd.DataFrame):
+        price_data = get_cached_candles(tech_data.get("symbol"), timeframe, max_age=CANDLE_CACHE_TTL)
+    
     # Calcular volatilidad para ajustes
-    if timeframe in multi_tf_data and len(multi_tf_data[timeframe]) > 20:
-        tf_data = multi_tf_data[timeframe]
-        volatility = tf_data['close'].pct_change().std() * 100
+    if price_data is not None and len(price_data) > 20:
+        volatility = price_data['close'].pct_change().std() * 100
     else:
         volatility = 2.0  # Default 2%
     
@@ -317,8 +440,9 @@ def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict,
         "market_regime": scores.get("market_regime", "trending")
     }
     
-    # Generar estrategia según tipo
-    if strategy_type == "directional" or direction != "NEUTRAL":
+    # Generar estrategia según tipo: DCA, martingala y grid se respetan si se piden; la mixta
+    # pasa a direccional cuando el mercado tiene dirección clara
+    if strategy_type == "directional" or (strategy_type not in ("grid", "dca", "martingale") and direction != "NEUTRAL"):
         # Estrategia direccional clásica
         position_calc = generator.calculate_position_size(
             capital, entry_zone, stop_loss, risk_level
@@ -346,12 +470,7 @@ def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict,
     
     elif strategy_type == "grid":
         # Grid Trading
-        grid_data = None
-        for tf, data in multi_tf_data.items():
-            if len(data) > 0:
-                grid_data = data
-                break
-        
+        grid_data = _first_frame(price_data, multi_tf_data)
         if grid_data is not None:
             grid_params = generator.generate_grid_parameters(grid_data, capital)
             strategy.update({
@@ -363,7 +482,8 @@ def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict,
     elif strategy_type == "dca":
         # Dollar Cost Averaging
         dca_strategy = generator.generate_dca_strategy(
-            current_price, capital, timeframe
+            current_price, capital, timeframe,
+            price_data=price_data, seed=user_profile.get("seed")
         )
         strategy.update({
             "type": "DCA Strategy",
@@ -376,7 +496,8 @@ def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict,
         # Asumir pérdida inicial del 10% para ejemplo
         initial_loss = capital * 0.1
         recovery_plan = generator.generate_martingale_recovery(
-            initial_loss, capital, win_rate=0.65
+            initial_loss, capital, win_rate=0.65,
+            price_data=price_data, seed=user_profile.get("seed")
         )
         strategy.update({
             "type": "Martingale Recovery",
@@ -392,8 +513,8 @@ def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict,
         )
         
         # Grid con 40% restante
-        if len(multi_tf_data) > 0:
-            grid_data = list(multi_tf_data.values())[0]
+        grid_data = _first_frame(price_data, multi_tf_data)
+        if grid_data is not None:
             grid_params = generator.generate_grid_parameters(
                 grid_data, capital * 0.4
             )
@@ -421,23 +542,71 @@ def generate_advanced_trading_strategy(scores: Dict, tech_data: Dict,
         capital, risk_level, current_price
     )
     
+    # Parámetros de dimensionado, para poder re-escalar la estrategia sin recalcularla
+    strategy["sizing_inputs"] = {
+        "symbol": tech_data.get("symbol"),
+        "timeframe": timeframe,
+        "entry": round(entry_zone, 4),
+        "stop_loss": round(stop_loss, 4),
+        "risk_level": risk_level,
+        "capital": capital
+    }
+    
     # Métricas de riesgo
     strategy["risk_metrics"] = calculate_risk_metrics(
-        strategy, capital, volatility
+        strategy, capital, volatility,
+        empirical=compute_empirical_risk(price_data, timeframe, direction)
     )
     
     return strategy
 
+class CachedStrategy:
+    """
+    Estrategia ya generada que se guarda por chat y se puede re-escalar a otros capitales
+    (o compararla entre varios) con una sola evaluación vectorizada, sin repetir el análisis.
+    """
+    
+    def __init__(self, asset: str, strategy: Dict):
+        self.asset = asset
+        self.strategy = strategy
+        self.created_at = datetime.now()
+        
+        inputs = strategy.get("sizing_inputs", {})
+        self.entry = inputs.get("entry", 0)
+        self.stop_loss = inputs.get("stop_loss", 0)
+        self.risk_level = inputs.get("risk_level", "medium")
+        self.capital = inputs.get("capital", 0)
+        
+        # Mismos parámetros (optimizados o no) que se usaron al generar la estrategia
+        self.generator = AdvancedStrategyGenerator()
+        self.generator.apply_tuned_parameters(inputs.get("symbol"), inputs.get("timeframe", "1h"))
+    
+    def rescale(self, capitals: List[float], risk_levels: Optional[List[str]] = None) -> List[Dict]:
+        """Dimensiona la posición para cada capital (y perfil, si se indica) de una vez."""
+        capitals = np.atleast_1d(np.asarray(capitals, dtype=float))
+        levels = risk_levels if risk_levels is not None else self.risk_level
+        sizes = self.generator.calculate_position_sizes(capitals, self.entry, self.stop_loss, levels)
+        levels = np.broadcast_to(np.asarray(levels), sizes["position_size_usd"].shape)
+        capitals = np.broadcast_to(capitals, sizes["position_size_usd"].shape)
+        
+        return [
+            {
+                "capital": round(float(capitals[i]), 2),
+                "risk_level": str(levels[i]),
+                "position_size_usd": round(float(sizes["position_size_usd"][i]), 2),
+                "leverage": round(float(sizes["leverage"][i]), 1),
+                "risk_amount": round(float(sizes["risk_amount"][i]), 2),
+                "risk_percentage": round(float(sizes["risk_percentage"][i]), 2),
+                "coins": round(float(sizes["coins"][i]), 8)
+            }
+            for i in range(len(sizes["position_size_usd"]))
+        ]
+
 def generate_contingency_plan(capital: float, risk_level: str, 
                              current_price: float) -> Dict:
     """Genera plan B en caso de que la operación vaya mal."""
     
-    max_loss_pct = {
-        "low": 5,
-        "medium": 10,
-        "high": 20,
-        "degen": 30
-    }[risk_level]
+    max_loss_pct = MAX_LOSS_PCT[risk_level]
     
     max_loss = capital * (max_loss_pct / 100)
     
@@ -468,34 +637,60 @@ def generate_contingency_plan(capital: float, risk_level: str,
     }
 
 def calculate_risk_metrics(strategy: Dict, capital: float, 
-                          volatility: float) -> Dict:
-    """Calcula métricas de riesgo avanzadas."""
-    
-    # Value at Risk (VaR) simplificado
-    var_95 = capital * (volatility / 100) * 1.645  # 95% confianza
-    
-    # Maximum Drawdown esperado
-    if strategy.get("type") == "Grid Trading":
-        expected_dd = capital * 0.15  # Grids tienen menos DD
-    elif strategy.get("type") == "Martingale Recovery":
-        expected_dd = capital * 0.40  # Alto riesgo
+                          volatility: float, empirical: Optional[Dict] = None) -> Dict:
+    """
+    Calcula métricas de riesgo avanzadas. Con `empirical` (ver tools/risk_metrics.py) usa
+    VaR/CVaR históricos, drawdowns móviles y estadísticas realizadas del propio activo;
+    sin él, recurre a la aproximación paramétrica.
+    """
+    
+    if empirical:
+        var_95 = capital * empirical["rolling_var_95"]
+        cvar_95 = capital * empirical["rolling_cvar_95"]
+        
+        # Drawdown: el simulado para grid/martingala si existe, si no el histórico del activo
+        grid_backtest = (strategy.get("grid_setup") or {}).get("backtest")
+        martingale_mc = (strategy.get("recovery_strategy") or {}).get("monte_carlo")
+        if strategy.get("type") == "Grid Trading" and grid_backtest:
+            expected_dd = capital * grid_backtest["max_drawdown_pct"] / 100
+        elif strategy.get("type") == "Martingale Recovery" and martingale_mc:
+            expected_dd = capital * martingale_mc["expected_max_drawdown_pct"] / 100
+        else:
+            expected_dd = capital * empirical["rolling_max_drawdown_mean"]
+        
+        win_rate = empirical["win_rate"]
+        avg_win = empirical["avg_win"] * 100
+        avg_loss = empirical["avg_loss"] * 100
     else:
-        expected_dd = capital * 0.20  # Direccional estándar
-    
-    # Ratio de Kelly simplificado
-    win_rate = 0.55  # Asumiendo 55% win rate con buen análisis
-    avg_win = volatility * 2  # Ganancia promedio
-    avg_loss = volatility  # Pérdida promedio
+        # Value at Risk (VaR) simplificado
+        var_95 = capital * (volatility / 100) * 1.645  # 95% confianza
+        cvar_95 = capital * (volatility / 100) * 2.063  # Cola normal al 95%
+        
+        # Maximum Drawdown esperado
+        if strategy.get("type") == "Grid Trading":
+            expected_dd = capital * 0.15  # Grids tienen menos DD
+        elif strategy.get("type") == "Martingale Recovery":
+            expected_dd = capital * 0.40  # Alto riesgo
+        else:
+            expected_dd = capital * 0.20  # Direccional estándar
+        
+        # Ratio de Kelly simplificado
+        win_rate = 0.55  # Asumiendo 55% win rate con buen análisis
+        avg_win = volatility * 2  # Ganancia promedio
+        avg_loss = volatility  # Pérdida promedio
     
     kelly_pct = ((win_rate * avg_win) - ((1 - win_rate) * avg_loss)) / (avg_win or 1)
     
     return {
         "value_at_risk_95": round(var_95, 2),
+        "conditional_var_95": round(cvar_95, 2),
         "expected_max_drawdown": round(expected_dd, 2),
+        "win_rate": round(win_rate * 100, 1),
         "kelly_criterion": round(kelly_pct * 100, 1),
-        "recommended_allocation": round(min(kelly_pct * capital, capital * 0.25), 2),
+        "recommended_allocation": round(max(min(kelly_pct * capital, capital * 0.25), 0), 2),
         "break_even_trades": calculate_breakeven_trades(strategy),
-        "profit_factor": round(win_rate * avg_win / ((1-win_rate) * avg_loss), 2) if (1-win_rate) * avg_loss != 0 else 0
+        "profit_factor": round(win_rate * avg_win / ((1-win_rate) * avg_loss), 2) if (1-win_rate) * avg_loss != 0 else 0,
+        "risk_source": "empirical" if empirical else "parametric"
     }
 
 def calculate_breakeven_trades(strategy: Dict) -> int:
@@ -0,0 +1,337 @@
+# Archivo: tools/walk_forward.py
+
+import os
+import json
+import argparse
+import traceback
+import numpy as np
+import pandas as pd
+import talib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tools.parameter_sweep import (
+    SharedCandleStore, attach_shared_candles, simulate_trade_returns, evaluate_sizing_grid,
+    TARGET_SCALES, _DEFAULT_GENERATOR
+)
+from tools.risk_metrics import TRADE_HORIZON_BARS
+
+# Carpeta donde se guardan los resultados parciales (uno por símbolo/timeframe/fold)
+WALK_FORWARD_DIR = os.getenv("WALK_FORWARD_DIR", os.path.join(os.getcwd(), "data", "walk_forward"))
+
+# Ventanas por defecto (en velas): ~6 meses in-sample y ~1 mes out-of-sample en 1h
+IN_SAMPLE_BARS = 24 * 180
+OUT_OF_SAMPLE_BARS = 24 * 30
+
+# Ventaja mínima de señales alcistas sobre bajistas (o viceversa) para abrir un trade.
+# generate_trading_signals usa 1 (bull > bear + 1); el optimizador prueba también valores más exigentes.
+SIGNAL_MARGINS = [1, 2, 3]
+
+# Patrones de velas evaluados por detect_chart_patterns y velas durante las que siguen vigentes
+PATTERN_FUNCTIONS = ['CDLDOJI', 'CDLHAMMER', 'CDLSHOOTINGSTAR', 'CDLENGULFING', 'CDLMORNINGSTAR', 'CDLEVENINGSTAR']
+PATTERN_LOOKBACK = 5
+
+# Velas a cada lado para confirmar un pivote de soporte/resistencia (como calculate_support_resistance_zones)
+PIVOT_BARS = 10
+
+# Equity mínima al tomar logaritmos: un fold que arruina la cuenta (equity <= 0) cuenta como
+# una pérdida casi total en vez de producir -inf/nan en el resumen
+MIN_FOLD_EQUITY = 1e-6
+
+
+def _last_pivot(values: np.ndarray, is_pivot: np.ndarray) -> np.ndarray:
+    """Último pivote confirmado en cada vela (se conoce PIVOT_BARS velas después de formarse)."""
+    confirmed = np.full(len(values), np.nan)
+    idx = np.nonzero(is_pivot)[0]
+    idx = idx[idx + PIVOT_BARS < len(values)]
+    confirmed[idx + PIVOT_BARS] = values[idx]
+    return pd.Series(confirmed).ffill().to_numpy()
+
+
+def compute_signal_scores(ohlc: np.ndarray) -> Dict:
+    """
+    Versión vectorizada de generate_trading_signals: cuenta, para cada vela, las señales
+    alcistas y bajistas con los mismos indicadores de talib y los mismos umbrales.
+
+    - Patrones: vigentes durante PATTERN_LOOKBACK velas, como en detect_chart_patterns.
+    - Soportes/resistencias: último pivote de máximos/mínimos confirmado (sin mirar al futuro).
+    - La alineación multi-timeframe no se reproduce: requeriría otras series.
+    """
+    opens, highs, lows, closes = (np.ascontiguousarray(row, dtype=np.float64) for row in ohlc)
+    n = len(closes)
+    bull = np.zeros(n, dtype=np.int16)
+    bear = np.zeros(n, dtype=np.int16)
+
+    # Tendencia principal (Golden/Death Cross)
+    sma50, sma200 = talib.SMA(closes, 50), talib.SMA(closes, 200)
+    bull += sma50 > sma200
+    bear += sma50 < sma200
+
+    # Momentum
+    rsi = talib.RSI(closes, 14)
+    bull += rsi < 30
+    bear += rsi > 70
+    _, _, hist = talib.MACD(closes)
+    bull += hist > 0
+    bear += ~(hist > 0)
+
+    # Volatilidad
+    bb_upper, _, bb_lower = talib.BBANDS(closes, 20)
+    bull += closes < bb_lower
+    bear += closes > bb_upper
+
+    # Patrones: se cuenta el último valor distinto de cero dentro de la ventana
+    for name in PATTERN_FUNCTIONS:
+        result = getattr(talib, name)(opens, highs, lows, closes).astype(float)
+        result[result == 0] = np.nan
+        recent = pd.Series(result).ffill(limit=PATTERN_LOOKBACK - 1).to_numpy()
+        bull += recent > 0
+        bear += recent < 0
+
+    # Soportes y resistencias (1% de proximidad)
+    window = 2 * PIVOT_BARS
+    if n > window:
+        rolling_high = pd.Series(highs).rolling(window).max().shift(-PIVOT_BARS + 1).to_numpy()
+        rolling_low = pd.Series(lows).rolling(window).min().shift(-PIVOT_BARS + 1).to_numpy()
+        support = _last_pivot(lows, lows == rolling_low)
+        resistance = _last_pivot(highs, highs == rolling_high)
+        bull += (support < closes) & (np.abs(closes - support) / closes < 0.01)
+        bear += (resistance >= closes) & (np.abs(closes - resistance) / closes < 0.01)
+
+    # Sin las 200 velas de la SMA larga no hay señal válida (igual que advanced_technical_analysis)
+    warmup = np.isnan(sma200)
+    bull[warmup] = 0
+    bear[warmup] = 0
+    return {"bullish": bull, "bearish": bear}
+
+
+def signal_sides(scores: Dict, margin: int = 1) -> np.ndarray:
+    """Dirección por vela: +1 si COMPRA, -1 si VENTA, 0 si NEUTRAL (con el margen indicado)."""
+    bull, bear = scores["bullish"].astype(int), scores["bearish"].astype(int)
+    return np.where(bull > bear + margin, 1.0, np.where(bear > bull + margin, -1.0, 0.0))
+
+
+def _subset_trades(trades: Dict, start: int, end: int, hold: int) -> Dict:
+    """Trades cuya ventana completa (señal + `hold` velas) cae dentro de [start, end)."""
+    idx = trades["signal_idx"]
+    mask = (idx >= start) & (idx + hold < end)
+    return {key: values[mask] for key, values in trades.items()}
+
+
+def apply_sizing(trades: Dict, risk_multiplier: float, leverage_limit: int) -> Dict:
+    """Curva de capital de unos trades con el dimensionamiento de calculate_position_size."""
+    returns, fill, stop_pct = trades["returns"], trades["fill"], trades["stop_pct"]
+    traded = fill > 0
+    if not traded.any():
+        return {"growth": np.array([]), "trades": 0, "final_equity": 1.0, "max_drawdown_pct": 0.0, "win_rate": 0.0}
+
+    pos_frac = np.minimum(risk_multiplier / stop_pct, leverage_limit)
+    growth = np.clip(1 + pos_frac * fill * returns, 0.0, None)[traded]
+    equity = np.cumprod(growth)
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0))
+    return {
+        "growth": growth,
+        "trades": int(traded.sum()),
+        "final_equity": round(float(equity[-1]), 4),
+        "max_drawdown_pct": round(float(((peak - equity) / peak).max()) * 100, 2),
+        "win_rate": round(float((returns[traded] > 0).mean()) * 100, 1)
+    }
+
+
+def _fold_task(descriptor: Dict, symbol: str, timeframe: str, fold: Dict) -> Dict:
+    """
+    Tarea del pool: optimiza margen de señal, targets y dimensionamiento en el tramo
+    in-sample del fold y evalúa la combinación elegida en el tramo out-of-sample.
+    """
+    ohlc = attach_shared_candles(descriptor)[:, :fold["oos_end"]]
+    hold = TRADE_HORIZON_BARS.get(timeframe, 16)
+    scores = compute_signal_scores(ohlc)
+    entry_split = tuple(_DEFAULT_GENERATOR.entry_allocations)
+
+    best = None
+    for margin in SIGNAL_MARGINS:
+        sides = signal_sides(scores, margin)
+        for scale in TARGET_SCALES:
+            trades = simulate_trade_returns(ohlc, timeframe, scale, entry_split, sides=sides)
+            in_sample = _subset_trades(trades, fold["is_start"], fold["is_end"], hold)
+            profiles = evaluate_sizing_grid(in_sample, _DEFAULT_GENERATOR.risk_multipliers, _DEFAULT_GENERATOR.leverage_limits)
+            medium = profiles.get("medium")
+            if medium and medium["trades"] > 0 and (best is None or medium["objective"] > best["objective"]):
+                best = {"margin": margin, "target_scale": scale, "objective": medium["objective"],
+                        "profiles": profiles, "trades": trades}
+
+    result = {"symbol": symbol, "timeframe": timeframe, **{k: fold[k] for k in ("fold", "oos_start_time")}}
+    if best is None:
+        return {**result, "success": False, "message": "Sin trades in-sample para optimizar."}
+
+    out_of_sample = _subset_trades(best["trades"], fold["is_end"], fold["oos_end"], hold)
+    profiles = {}
+    for level, params in best["profiles"].items():
+        oos = apply_sizing(out_of_sample, params["risk_multiplier"], params["leverage_limit"])
+        profiles[level] = {
+            "risk_multiplier": params["risk_multiplier"],
+            "leverage_limit": params["leverage_limit"],
+            "in_sample": {k: params[k] for k in ("final_equity", "max_drawdown_pct", "trades", "win_rate")},
+            "out_of_sample": {k: v for k, v in oos.items() if k != "growth"},
+            "oos_growth": oos["growth"].round(6).tolist()
+        }
+    return {**result, "success": True, "signal_margin": best["margin"], "target_scale": best["target_scale"],
+            "profiles": profiles}
+
+
+def build_folds(index: pd.DatetimeIndex, in_sample_bars: int = IN_SAMPLE_BARS,
+                out_of_sample_bars: int = OUT_OF_SAMPLE_BARS) -> List[Dict]:
+    """
+    Divide la serie en folds móviles (in-sample seguido de out-of-sample). Los cortes se
+    alinean al reloj (múltiplos de la ventana OOS desde la época), de modo que al añadir
+    velas nuevas los folds ya calculados conservan sus límites y se pueden reutilizar.
+    """
+    if len(index) < in_sample_bars + out_of_sample_bars:
+        return []
+    bar_ns = int(np.median(np.diff(index.asi8)))
+    bar_number = index.asi8 // bar_ns
+    starts = np.nonzero(bar_number % out_of_sample_bars == 0)[0]
+    starts = starts[(starts >= in_sample_bars) & (starts + out_of_sample_bars <= len(index))]
+
+    return [{
+        "fold": i,
+        "is_start": int(start - in_sample_bars),
+        "is_end": int(start),
+        "oos_end": int(start + out_of_sample_bars),
+        "oos_start_time": index[start].strftime("%Y%m%dT%H%M")
+    } for i, start in enumerate(starts)]
+
+
+def _checkpoint_path(run_dir: str, symbol: str, timeframe: str, fold: Dict) -> str:
+    return os.path.join(run_dir, f"{symbol}_{timeframe}_{fold['oos_start_time']}.json")
+
+
+def _load_checkpoint(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_checkpoint(path: str, result: Dict) -> None:
+    """Escritura atómica para que un corte a mitad de escritura no deje un JSON roto."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+
+def summarize_folds(fold_results: List[Dict]) -> Dict:
+    """Encadena los tramos out-of-sample de cada símbolo y resume las estadísticas por perfil."""
+    summary = {}
+    ordered = sorted((r for r in fold_results if r.get("success")), key=lambda r: r["oos_start_time"])
+    levels = list(dict.fromkeys(level for r in ordered for level in r["profiles"]))
+    for level in levels:
+        growth = np.concatenate([np.asarray(r["profiles"][level]["oos_growth"], dtype=float)
+                                 for r in ordered if level in r["profiles"]] or [np.array([])])
+        if len(growth) == 0:
+            continue
+        equity = np.cumprod(growth)
+        peak = np.maximum.accumulate(np.maximum(equity, 1.0))
+        per_trade = growth - 1
+        is_equity = [r["profiles"][level]["in_sample"]["final_equity"] for r in ordered if level in r["profiles"]]
+        oos_equity = [r["profiles"][level]["out_of_sample"]["final_equity"] for r in ordered if level in r["profiles"]]
+        is_log_growth = float(np.mean(np.log(np.maximum(is_equity, MIN_FOLD_EQUITY))))
+        oos_log_growth = float(np.mean(np.log(np.maximum(oos_equity, MIN_FOLD_EQUITY))))
+        summary[level] = {
+            "folds": len(oos_equity),
+            "trades": int(len(growth)),
+            "total_return_pct": round(float(equity[-1] - 1) * 100, 2),
+            "max_drawdown_pct": round(float(((peak - equity) / peak).max()) * 100, 2),
+            "win_rate": round(float((per_trade > 0).mean()) * 100, 1),
+            "sharpe_per_trade": round(float(per_trade.mean() / per_trade.std()), 3) if per_trade.std() > 0 else 0.0,
+            "profitable_folds_pct": round(float(np.mean(np.array(oos_equity) > 1)) * 100, 1),
+            # Rendimiento medio OOS frente a IS por fold (cercano a 1 = poca sobreoptimización)
+            "walk_forward_efficiency": round(oos_log_growth / is_log_growth, 3) if is_log_growth > 0 else None
+        }
+    return summary
+
+
+def run_walk_forward(symbols: List[str], timeframes: List[str], limit: int = 24 * 365 * 3,
+                     in_sample_bars: int = IN_SAMPLE_BARS, out_of_sample_bars: int = OUT_OF_SAMPLE_BARS,
+                     max_workers: Optional[int] = None, output_dir: str = WALK_FORWARD_DIR) -> Dict:
+    """
+    Walk-forward de la lógica de señales y del dimensionamiento: publica las velas en
+    memoria compartida, reparte los folds pendientes en un pool de procesos y guarda
+    cada fold terminado como checkpoint, de modo que una ejecución cortada se reanuda.
+    """
+    from tools.analysis_tools import get_historical_data_extended
+
+    run_dir = os.path.join(output_dir, f"is{in_sample_bars}_oos{out_of_sample_bars}")
+    os.makedirs(run_dir, exist_ok=True)
+
+    fold_results = {}
+    with SharedCandleStore() as store:
+        pending = []
+        for symbol in symbols:
+            pair = symbol.upper() if symbol.upper().endswith('USDT') else f"{symbol.upper()}USDT"
+            for tf in timeframes:
+                df = get_historical_data_extended(pair, interval=tf, limit=limit)
+                folds = build_folds(df.index, in_sample_bars, out_of_sample_bars) if df is not None else []
+                if not folds:
+                    print(f"  ⚠️ Datos insuficientes para {pair} en {tf}. Se omite del walk-forward.")
+                    continue
+
+                results = fold_results.setdefault((pair, tf), [])
+                todo = []
+                for fold in folds:
+                    cached = _load_checkpoint(_checkpoint_path(run_dir, pair, tf, fold))
+                    if cached is not None:
+                        results.append(cached)
+                    else:
+                        todo.append(fold)
+                if todo:
+                    store.add((pair, tf), df)
+                    pending.extend((pair, tf, fold) for fold in todo)
+                print(f"  -> {pair} {tf}: {len(folds)} folds ({len(folds) - len(todo)} reanudados desde checkpoint).")
+
+        if pending:
+            print(f"-> Walk-forward: {len(pending)} folds pendientes en el pool de procesos...")
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = {pool.submit(_fold_task, store.descriptors[(pair, tf)], pair, tf, fold): (pair, tf, fold)
+                           for pair, tf, fold in pending}
+                for future in as_completed(futures):
+                    pair, tf, fold = futures[future]
+                    try:
+                        result = future.result()
+                        _save_checkpoint(_checkpoint_path(run_dir, pair, tf, fold), result)
+                        fold_results[(pair, tf)].append(result)
+                    except Exception as e:
+                        print(f"  ❌ Error en el fold {fold['fold']} de {pair} {tf}: {e}")
+                        traceback.print_exc()
+
+    data = {}
+    for (pair, tf), results in fold_results.items():
+        successful = [r for r in results if r.get("success")]
+        data.setdefault(pair, {})[tf] = {
+            "summary": summarize_folds(results),
+            "folds": [{k: r[k] for k in ("oos_start_time", "signal_margin", "target_scale")} for r in
+                      sorted(successful, key=lambda r: r["oos_start_time"])]
+        }
+
+    report = {"success": bool(data), "generated_at": datetime.now().isoformat(), "data": data}
+    with open(os.path.join(run_dir, "summary.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"  ✅ Resumen del walk-forward guardado en: {run_dir}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward de señales y dimensionamiento")
+    parser.add_argument("--symbols", nargs="+", default=["BTC", "ETH", "SOL"])
+    parser.add_argument("--timeframes", nargs="+", default=["1h"])
+    parser.add_argument("--limit", type=int, default=24 * 365 * 3)
+    parser.add_argument("--in-sample", type=int, default=IN_SAMPLE_BARS)
+    parser.add_argument("--out-of-sample", type=int, default=OUT_OF_SAMPLE_BARS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output-dir", default=WALK_FORWARD_DIR)
+    args = parser.parse_args()
+    run_walk_forward(args.symbols, args.timeframes, limit=args.limit, in_sample_bars=args.in_sample,
+                     out_of_sample_bars=args.out_of_sample, max_workers=args.workers, output_dir=args.output_dir)